@@ -1,5 +1,7 @@
 import streamlit as st
-from core.services import course_manager_service, slugify
+from datetime import datetime
+from core.services import slugify
+from utils.resources import get_course_manager
 import time
 
 # ==============================================================================
@@ -24,11 +26,6 @@ st.set_page_config(
 with open("styles.css") as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-# Khởi tạo session state để lưu trữ dữ liệu giữa các lần tương tác.
-# Logic này đảm bảo state chỉ được khởi tạo một lần duy nhất.
-if "courses" not in st.session_state:
-    st.session_state.courses = course_manager_service.list_courses()
-
 # --- Giao diện Dashboard ---
 # Phần logo và tiêu đề chính, tạo ấn tượng ban đầu.
 st.markdown(
@@ -43,6 +40,11 @@ st.title("PNote Workspace")
 st.text("Chào mừng trở lại! Chọn một khóa học để bắt đầu hoặc tạo một không gian làm việc mới.")
 st.markdown("---")
 
+# Danh sách khóa học (kèm thống kê) lấy từ catalog trong bộ nhớ, nên có thể đọc lại ở mỗi lần
+# rerun mà không truy vấn database; khóa học do phiên khác tạo cũng hiện ra ngay.
+# Đặt sau phần tiêu đề để trang hiện ra ngay, trong lúc kết nối tới database lần đầu.
+st.session_state.courses = get_course_manager().list_courses()
+
 # --- Form Tạo Khóa Học Mới ---
 # Sử dụng expander để có thể thu gọn, tiết kiệm không gian và làm giao diện sạch hơn.
 with st.expander("➕ Tạo khóa học mới", expanded=True):
@@ -66,8 +68,7 @@ with st.expander("➕ Tạo khóa học mới", expanded=True):
                 else:
                     with st.spinner(f"Đang tạo khóa học '{new_course_name_input}'..."):
                         # Lưu cả tên gốc vào metadata để hiển thị đẹp hơn.
-                        course_manager_service.get_or_create_course_collection(safe_name, new_course_name_input)
-                        st.session_state.courses.append({"id": safe_name, "name": new_course_name_input})
+                        get_course_manager().get_or_create_course_collection(safe_name, new_course_name_input)
                         st.success(f"Đã tạo '{new_course_name_input}'!")
                         
                         # Tự động chuyển trang sau khi tạo thành công.
@@ -94,6 +95,8 @@ else:
                 <div class="course-card">
                     <h3>{course['name']}</h3>
                     <p>ID: {course['id']}</p>
+                    <p>📄 {course['source_count']} nguồn · 🧩 {course['chunk_count']} đoạn · ~{course['total_tokens']:,} token</p>
+                    <p>🕒 {datetime.fromtimestamp(course['updated_at']).strftime('%d/%m/%Y %H:%M') if course['updated_at'] else 'Chưa cập nhật'}</p>
                 </div>
                 """,
                 unsafe_allow_html=True
@@ -0,0 +1,146 @@
+# Ghi chú: Benchmark các pipeline chính trên một bộ tài liệu cố định, chạy hoàn toàn cục bộ.
+# Dùng backend "local" (core/llm.py) với độ trễ cấu hình được, nên không cần mạng hay API key
+# và kết quả lặp lại được giữa các lần chạy -> thấy ngay khi hiệu năng bị thụt lùi.
+# Đo:
+# 1. Ingestion: số trang/giây và chunk/giây khi thêm tài liệu (chia chunk, embed, ghi ChromaDB).
+# 2. Chat: độ trễ p50/p95 (truy xuất lai + lắp ráp ngữ cảnh + sinh câu trả lời), không dùng cache.
+# 3. Tóm tắt map-reduce: thời gian, số lời gọi mô hình và số token, lần đầu và sau khi thêm
+#    một tài liệu (kiểm tra tính tăng dần).
+# Chạy từ thư mục gốc của dự án:
+#     python benchmarks/pipeline.py
+#     python benchmarks/pipeline.py --docs 20 --pages 30 --latency 0.2 --token-latency 0.002 --json bench.json
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Bộ từ vựng cố định để sinh tài liệu (seed cố định -> cùng một bộ tài liệu ở mọi lần chạy).
+_VOCABULARY = (
+    "hệ thống dữ liệu mô hình phân tích khái niệm định nghĩa quá trình kết quả nghiên cứu phương pháp "
+    "lịch sử kinh tế xã hội chính sách pháp luật điều khoản hợp đồng nghĩa vụ quyền lợi trách nhiệm "
+    "thuật toán cấu trúc mạng lưới tối ưu hiệu năng bộ nhớ truy vấn chỉ mục vector văn bản tài liệu "
+    "sinh viên giảng viên bài giảng chương mục ví dụ bài tập công thức chứng minh giả thuyết thực nghiệm"
+).split()
+
+def build_corpus(num_docs: int, pages_per_doc: int, seed: int = 42) -> list[tuple[str, list[str]]]:
+    """Sinh bộ tài liệu cố định: danh sách (tên nguồn, các trang)."""
+    rng = random.Random(seed)
+    corpus = []
+    for d in range(num_docs):
+        pages = []
+        for p in range(pages_per_doc):
+            paragraphs = []
+            for _ in range(4):
+                sentences = [" ".join(rng.choice(_VOCABULARY) for _ in range(rng.randint(8, 18))).capitalize() + "."
+                             for _ in range(rng.randint(3, 6))]
+                paragraphs.append(f"Điều {d * 100 + p}. " + " ".join(sentences))
+            pages.append("\n\n".join(paragraphs))
+        corpus.append((f"tai-lieu-{d:03d}", pages))
+    return corpus
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def run(args) -> dict:
+    # Cấu hình phải được đặt trước khi import config / core.
+    os.environ["PNOTE_DATA_DIR"] = args.data_dir
+    os.environ["PNOTE_LLM_BACKEND"] = "local"
+    os.environ["PNOTE_LOCAL_LLM_LATENCY"] = str(args.latency)
+    os.environ["PNOTE_LOCAL_LLM_TOKEN_LATENCY"] = str(args.token_latency)
+    # Không tạo ngân hàng câu hỏi ở chế độ nền: benchmark chỉ đo các pipeline ở trên.
+    os.environ["PNOTE_QUESTION_BANK_AUTO_BUILD"] = "0"
+    from core.services import get_course_manager, get_ai_service
+
+    course_manager, ai_service = get_course_manager(), get_ai_service()
+    course_id = "benchmark"
+    course_manager.get_or_create_course_collection(course_id, "Benchmark")
+    corpus = build_corpus(args.docs + 1, args.pages)
+    corpus, extra_doc = corpus[:-1], corpus[-1]
+
+    # 1. Ingestion
+    start = time.perf_counter()
+    chunks = sum(course_manager.add_document(course_id, pages, name) for name, pages in corpus)
+    ingest_seconds = time.perf_counter() - start
+    pages = args.docs * args.pages
+
+    # 2. Chat (xóa cache câu trả lời trước mỗi câu hỏi để đo trọn đường đi)
+    rng = random.Random(7)
+    latencies = []
+    for i in range(args.questions):
+        question = f"Điều {rng.randrange(args.docs) * 100 + rng.randrange(args.pages)} nói gì về {rng.choice(_VOCABULARY)}?"
+        ai_service.answer_cache.invalidate(course_id)
+        start = time.perf_counter()
+        ai_service.get_chat_answer(course_id, question)
+        latencies.append(time.perf_counter() - start)
+
+    # 3. Tóm tắt: lần đầu, rồi sau khi thêm một tài liệu
+    def summary_usage() -> dict:
+        # Chi phí tóm tắt = các bước map-reduce ("digest") + lời gọi tóm tắt cuối ("summary").
+        usage = ai_service.usage.summary()
+        return {key: sum(usage.get(task, {}).get(key, 0) for task in ("digest", "summary"))
+                for key in ("calls", "prompt_tokens", "response_tokens")}
+
+    def summarize() -> dict:
+        before = summary_usage()
+        start = time.perf_counter()
+        ai_service.summarize_course(course_id)
+        elapsed = time.perf_counter() - start
+        after = summary_usage()
+        return {
+            "seconds": elapsed,
+            "llm_calls": after["calls"] - before["calls"],
+            "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+            "response_tokens": after["response_tokens"] - before["response_tokens"],
+        }
+    summary_cold = summarize()
+    course_manager.add_document(course_id, extra_doc[1], extra_doc[0])
+    summary_incremental = summarize()
+
+    return {
+        "config": {"docs": args.docs, "pages_per_doc": args.pages, "questions": args.questions,
+                   "latency": args.latency, "token_latency": args.token_latency},
+        "ingestion": {"seconds": ingest_seconds, "pages": pages, "chunks": chunks,
+                      "pages_per_second": pages / ingest_seconds, "chunks_per_second": chunks / ingest_seconds},
+        "chat": {"p50_ms": _percentile(latencies, 0.5) * 1000, "p95_ms": _percentile(latencies, 0.95) * 1000,
+                 "mean_ms": statistics.mean(latencies) * 1000},
+        "summary_cold": summary_cold,
+        "summary_incremental": summary_incremental,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion / chat / tóm tắt của PNote với backend cục bộ.")
+    parser.add_argument("--docs", type=int, default=10, help="Số tài liệu trong bộ dữ liệu (mặc định: 10).")
+    parser.add_argument("--pages", type=int, default=20, help="Số trang mỗi tài liệu (mặc định: 20).")
+    parser.add_argument("--questions", type=int, default=50, help="Số câu hỏi chat (mặc định: 50).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Độ trễ cố định mỗi lời gọi mô hình (giây).")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Độ trễ mỗi token phản hồi (giây).")
+    parser.add_argument("--data-dir", help="Thư mục dữ liệu (mặc định: thư mục tạm, xóa sau khi chạy).")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="pnote-bench-") as tmp:
+        args.data_dir = args.data_dir or tmp
+        results = run(args)
+
+    ingestion, chat = results["ingestion"], results["chat"]
+    print(f"Ingestion : {ingestion['pages']} trang, {ingestion['chunks']} chunk trong {ingestion['seconds']:.2f}s "
+          f"-> {ingestion['pages_per_second']:.1f} trang/s, {ingestion['chunks_per_second']:.1f} chunk/s")
+    print(f"Chat      : p50 {chat['p50_ms']:.1f}ms, p95 {chat['p95_ms']:.1f}ms, trung bình {chat['mean_ms']:.1f}ms")
+    for key, label in (("summary_cold", "Tóm tắt (lần đầu)"), ("summary_incremental", "Tóm tắt (+1 tài liệu)")):
+        s = results[key]
+        print(f"{label:<22}: {s['seconds']:.2f}s, {s['llm_calls']} lời gọi, "
+              f"{s['prompt_tokens']} token prompt, {s['response_tokens']} token phản hồi")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
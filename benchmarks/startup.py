@@ -0,0 +1,110 @@
+# Ghi chú: Đo thời gian khởi động của ứng dụng.
+# 1. Thời gian import của các module chính, mỗi lần đo chạy trong một process Python mới
+#    (cache import không ảnh hưởng kết quả).
+# 2. Thời gian render lần đầu của các trang Streamlit (dùng streamlit.testing.AppTest),
+#    cũng trong process mới để đo đúng "cold start".
+# Chạy từ thư mục gốc của dự án:
+#     python benchmarks/startup.py                     # 5 lần đo mỗi mục
+#     python benchmarks/startup.py --repeat 10 --json startup.json
+#     python benchmarks/startup.py --importtime core.services   # các import chậm nhất
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["config", "core.documents", "core.services", "utils.resources", "ui.sidebar"]
+PAGES = ["app.py", "pages/workspace.py"]
+
+_IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+_RENDER_SNIPPET = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({page!r}, default_timeout=120)
+{session_state}
+app.run()
+elapsed = time.perf_counter() - start
+if app.exception:
+    raise SystemExit(str(app.exception[0].value))
+print(elapsed)
+"""
+
+def _run(snippet: str) -> float:
+    """Chạy đoạn mã trong một process mới (thư mục gốc dự án) và trả về số giây nó in ra."""
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or result.stdout.strip())
+    return float(result.stdout.strip().splitlines()[-1])
+
+def _measure(label: str, snippet: str, repeat: int) -> dict:
+    samples = [_run(snippet) for _ in range(repeat)]
+    return {
+        "name": label,
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "max_ms": max(samples) * 1000,
+    }
+
+def measure_imports(modules: list[str], repeat: int) -> list[dict]:
+    """Thời gian import (ms) của từng module trong process mới."""
+    return [_measure(f"import {module}", _IMPORT_SNIPPET.format(module=module), repeat) for module in modules]
+
+def measure_first_render(pages: list[str], repeat: int, course_id: str | None = None) -> list[dict]:
+    """Thời gian từ lúc bắt đầu tới khi trang render xong lần đầu (ms), trong process mới."""
+    session_state = ""
+    if course_id:
+        session_state = (f"app.session_state['current_course_id'] = {course_id!r}\n"
+                         f"app.session_state['current_course_name'] = {course_id!r}")
+    return [_measure(f"render {page}", _RENDER_SNIPPET.format(page=page, session_state=session_state), repeat)
+            for page in pages]
+
+def slowest_imports(module: str, limit: int = 15) -> list[tuple[int, str]]:
+    """Các import tốn thời gian nhất (tính cả import con, micro giây) theo `python -X importtime`."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian import và render lần đầu của PNote.")
+    parser.add_argument("--repeat", type=int, default=5, help="Số lần đo cho mỗi mục (mặc định: 5).")
+    parser.add_argument("--course", help="ID khóa học đặt sẵn khi render trang workspace.")
+    parser.add_argument("--skip-render", action="store_true", help="Chỉ đo thời gian import.")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON (để so sánh giữa các phiên bản).")
+    parser.add_argument("--importtime", metavar="MODULE", help="Liệt kê các import chậm nhất của MODULE rồi thoát.")
+    args = parser.parse_args()
+
+    if args.importtime:
+        for cumulative, name in slowest_imports(args.importtime):
+            print(f"{cumulative / 1000:9.1f} ms  {name}")
+        return
+
+    results = measure_imports(MODULES, args.repeat)
+    if not args.skip_render:
+        results += measure_first_render(PAGES, args.repeat, args.course)
+
+    print(f"{'Mục đo':<32}{'median':>10}{'min':>10}{'max':>10}")
+    for row in results:
+        print(f"{row['name']:<32}{row['median_ms']:>8.1f}ms{row['min_ms']:>8.1f}ms{row['max_ms']:>8.1f}ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
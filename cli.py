@@ -0,0 +1,289 @@
+# Ghi chú: Giao diện dòng lệnh (không cần Streamlit) để nạp tài liệu hàng loạt và bảo trì khóa học.
+# Dùng lại DocumentProcessor / IngestionManager / CourseManager như giao diện web, nên kết quả
+# giống hệt việc thêm tài liệu qua sidebar. Chạy từ thư mục gốc của dự án:
+#     python cli.py ingest luat-dan-su ./tai-lieu/ --urls urls.txt --workers 8
+#     python cli.py ingest luat-dan-su --manifest hoc-ky-1.json --name "Luật Dân sự"
+#     python cli.py rebuild-embeddings luat-dan-su
+#     python cli.py compact --all
+#     python cli.py stats [luat-dan-su]
+#     python cli.py translate luat-dan-su --language English
+#     python cli.py question-bank --all
+#     python cli.py export luat-dan-su luat-dan-su.pnsnap
+#     python cli.py import luat-dan-su.pnsnap --course luat-dan-su-k68 --name "Luật Dân sự K68"
+# Lệnh ingest có thể chạy lại sau khi bị dừng giữa chừng: các file / video đã có trong manifest
+# với cùng nội dung được bỏ qua ngay, không trích xuất lại.
+# Ứng dụng Streamlit đang chạy nhận ra thay đổi do CLI ghi vào manifest ở lượt chat kế tiếp
+# (CourseManager.check_external_changes) nên không cần khởi động lại.
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from datetime import datetime
+from config import INGESTION_MAX_WORKERS
+from core.services import get_course_manager, get_ai_service, slugify
+from core.ingestion import IngestionManager, DONE
+from core.youtube import parse_video_id, expand_playlist_urls
+
+# Phần mở rộng file được hỗ trợ và loại nguồn tương ứng.
+FILE_TYPES = {".pdf": "pdf", ".docx": "docx", ".txt": "txt", ".md": "txt"}
+
+def _is_url(value: str) -> bool:
+    return value.startswith(("http://", "https://"))
+
+def collect_sources(paths: list[str], url_files: list[str], manifests: list[str]) -> list[tuple[str, str]]:
+    """
+    Gom các nguồn cần nạp thành danh sách (loại nguồn, đường dẫn file hoặc URL), bỏ trùng.
+    - `paths`: file, thư mục (duyệt đệ quy) hoặc URL.
+    - `url_files`: file văn bản, mỗi dòng một URL (dòng bắt đầu bằng '#' bị bỏ qua).
+    - `manifests`: file JSON chứa danh sách các chuỗi (đường dẫn / URL) hoặc đối tượng
+      {"path": ...} / {"url": ...}; đường dẫn tương đối tính từ thư mục của manifest.
+    """
+    entries: list[str] = list(paths)
+    for url_file in url_files:
+        with open(url_file, encoding="utf-8") as f:
+            entries.extend(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#"))
+    for manifest in manifests:
+        with open(manifest, encoding="utf-8") as f:
+            items = json.load(f)
+        base = os.path.dirname(os.path.abspath(manifest))
+        for item in items:
+            value = item if isinstance(item, str) else item.get("url") or item.get("path")
+            if value:
+                entries.append(value if _is_url(value) else os.path.join(base, value))
+
+    sources: dict[tuple[str, str], None] = {}
+    urls = [entry for entry in entries if _is_url(entry)]
+    for url in expand_playlist_urls(urls) if urls else []:
+        sources[("url", url)] = None
+    for entry in entries:
+        if _is_url(entry):
+            continue
+        files = [os.path.join(root, name) for root, _, names in os.walk(entry) for name in sorted(names)] if os.path.isdir(entry) else [entry]
+        for path in files:
+            source_type = FILE_TYPES.get(os.path.splitext(path)[1].lower())
+            if source_type:
+                sources[(source_type, path)] = None
+            elif not os.path.isdir(entry):
+                print(f"Bỏ qua {path}: định dạng không được hỗ trợ.", file=sys.stderr)
+    return list(sources)
+
+def _load(source_type: str, location: str) -> tuple[str, str, any, int]:
+    """Đọc một nguồn thành (loại, nhãn, dữ liệu, số byte) theo định dạng của IngestionManager.submit."""
+    if source_type == "url":
+        return source_type, location, location, 0
+    with open(location, "rb") as f:
+        data = f.read()
+    return source_type, os.path.basename(location), data, len(data)
+
+def _already_ingested(manifest, course_id: str, source_type: str, label: str, payload: any) -> bool:
+    """Nguồn đã có trong manifest với cùng nội dung (file: hash của bytes, YouTube: ID video)."""
+    if isinstance(payload, bytes):
+        entry = manifest.get(course_id, slugify(label))
+        return entry is not None and entry["hash"] == hashlib.sha256(payload).hexdigest()
+    video_id = parse_video_id(payload) if source_type == "url" else None
+    return bool(video_id) and manifest.get(course_id, f"youtube-{video_id}") is not None
+
+def cmd_ingest(args) -> int:
+    course_manager = get_course_manager()
+    if course_manager.catalog.get(args.course) is None:
+        course_manager.get_or_create_course_collection(args.course, args.name or args.course)
+        print(f"Đã tạo khóa học '{args.name or args.course}' ({args.course}).")
+
+    sources = collect_sources(args.paths, args.urls, args.manifest)
+    if not sources:
+        print("Không có nguồn tài liệu nào để nạp.", file=sys.stderr)
+        return 1
+    print(f"Nạp {len(sources)} nguồn vào '{args.course}' với {args.workers} worker...")
+
+    ingestion = IngestionManager(course_manager, max_workers=args.workers)
+    pending = deque(sources)
+    active: deque = deque()
+    done = skipped = failed = chunks = total_bytes = 0
+    start = time.perf_counter()
+    try:
+        # Mỗi nguồn là một job; giữ tối đa 2 job / worker đang chạy để không phải đọc trước mọi file vào bộ nhớ.
+        while pending or active:
+            while pending and len(active) < args.workers * 2:
+                source_type, label, payload, size = _load(*pending.popleft())
+                if _already_ingested(course_manager.manifest, args.course, source_type, label, payload):
+                    skipped += 1
+                    print(f"  = {label} (không đổi, bỏ qua)")
+                    continue
+                total_bytes += size
+                active.append(ingestion.submit(args.course, [(source_type, label, payload)]))
+            finished = [job_id for job_id in active if ingestion.get_job(job_id).done]
+            if not finished:
+                time.sleep(0.1)
+                continue
+            for job_id in finished:
+                active.remove(job_id)
+                source = ingestion.get_job(job_id).sources[0]
+                if source.status == DONE:
+                    done += 1
+                    chunks += source.chunks
+                    print(f"  ✓ {source.label} — {source.chunks} đoạn")
+                else:
+                    failed += 1
+                    print(f"  ✗ {source.label}: {source.error}", file=sys.stderr)
+    finally:
+        ingestion.shutdown()
+
+    elapsed = time.perf_counter() - start
+    print(f"Xong trong {elapsed:.1f}s: {done} thành công, {skipped} bỏ qua, {failed} lỗi, {chunks} đoạn.")
+    if elapsed > 0:
+        print(f"Tốc độ: {done / elapsed:.2f} nguồn/s, {chunks / elapsed:.1f} đoạn/s, {total_bytes / elapsed / 1e6:.2f} MB/s")
+    return 1 if failed else 0
+
+def _course_ids(args) -> list[str]:
+    course_manager = get_course_manager()
+    if args.all:
+        return [stats.id for stats in course_manager.catalog.list_courses()]
+    if not args.course:
+        raise SystemExit("Cần chỉ định khóa học hoặc --all.")
+    if course_manager.catalog.get(args.course) is None:
+        raise SystemExit(f"Không tìm thấy khóa học '{args.course}'.")
+    return [args.course]
+
+def cmd_rebuild_embeddings(args) -> int:
+    course_manager = get_course_manager()
+    for course_id in _course_ids(args):
+        start = time.perf_counter()
+        count = course_manager.rebuild_embeddings(course_id)
+        print(f"{course_id}: tính lại embedding cho {count} đoạn trong {time.perf_counter() - start:.1f}s "
+              f"({course_manager.embedder.backend.name}).")
+    return 0
+
+def cmd_compact(args) -> int:
+    course_manager = get_course_manager()
+    for course_id in _course_ids(args):
+        report = course_manager.compact_course(course_id)
+        print(f"{course_id}: xóa {report['orphans_removed']} đoạn mồ côi (giữ lại {report['orphans_kept']} đoạn của nguồn "
+              f"không có trong manifest), {report['near_duplicates_removed']} đoạn gần trùng "
+              f"({report['tokens_removed']} token), chỉ mục BM25 +{report['lexical_added']} / -{report['lexical_removed']}, "
+              f"còn {report['chunks']} đoạn.")
+    return 0
+
+def cmd_translate(args) -> int:
+    ai_service = get_ai_service()
+    failed = 0
+    for course_id in _course_ids(args):
+        start = time.perf_counter()
+        report = ai_service.translate_course(course_id, args.language)
+        failed += report["failed"]
+        print(f"{course_id}: dịch {report['translated']} nguồn, {report['cached']} nguồn đã có bản dịch, "
+              f"{report['failed']} lỗi trong {time.perf_counter() - start:.1f}s ({args.language}).")
+    return 1 if failed else 0
+
+def cmd_question_bank(args) -> int:
+    builder = get_ai_service().question_bank
+    failed = 0
+    for course_id in _course_ids(args):
+        start = time.perf_counter()
+        report = builder.build(course_id)
+        failed += report["groups_failed"]
+        print(f"{course_id}: +{report['questions_added']} câu hỏi từ {report['groups_added']} nhóm mới, "
+              f"{report['groups_failed']} nhóm lỗi, xóa {report['groups_removed']} nhóm cũ, "
+              f"còn {sum(builder.count(course_id).values())} câu hỏi trong {time.perf_counter() - start:.1f}s.")
+    return 1 if failed else 0
+
+def cmd_export(args) -> int:
+    course_manager = get_course_manager()
+    if course_manager.catalog.get(args.course) is None:
+        raise SystemExit(f"Không tìm thấy khóa học '{args.course}'.")
+    start = time.perf_counter()
+    count = course_manager.export_course(args.course, args.path)
+    print(f"Đã xuất {count} đoạn của '{args.course}' vào {args.path} "
+          f"({os.path.getsize(args.path) / 1e6:.1f} MB) trong {time.perf_counter() - start:.1f}s.")
+    return 0
+
+def cmd_import(args) -> int:
+    if args.course and slugify(args.course) != args.course:
+        raise SystemExit(f"ID khóa học không hợp lệ, hãy dùng '{slugify(args.course)}'.")
+    start = time.perf_counter()
+    try:
+        report = get_course_manager().import_course(args.path, args.course, args.name)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    note = " (đã embed lại do khác mô hình embedding)" if report["reembedded"] else ""
+    print(f"Đã nhập {report['chunks']} đoạn vào '{report['name']}' ({report['course_id']}) "
+          f"trong {time.perf_counter() - start:.1f}s{note}.")
+    return 0
+
+def _format_time(timestamp: float | None) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M") if timestamp else "-"
+
+def cmd_stats(args) -> int:
+    course_manager = get_course_manager()
+    if args.course:
+        stats = course_manager.catalog.get(args.course)
+        if stats is None:
+            raise SystemExit(f"Không tìm thấy khóa học '{args.course}'.")
+        print(f"{stats.name} ({stats.id}): {stats.chunk_count} đoạn, {stats.source_count} nguồn, {stats.total_tokens} token")
+        for name, entry in sorted(course_manager.manifest.load(args.course).items()):
+            print(f"  {name:<50} {entry['chunk_count']:>6} đoạn {entry.get('token_count', 0):>9} token  {_format_time(entry['ingested_at'])}")
+        return 0
+    courses = course_manager.catalog.list_courses()
+    print(f"{'KHÓA HỌC':<40} {'ĐOẠN':>8} {'NGUỒN':>7} {'TOKEN':>10}  CẬP NHẬT")
+    for stats in sorted(courses, key=lambda s: s.id):
+        print(f"{stats.id:<40} {stats.chunk_count:>8} {stats.source_count:>7} {stats.total_tokens:>10}  {_format_time(stats.updated_at)}")
+    print(f"Tổng: {len(courses)} khóa học, {sum(s.chunk_count for s in courses)} đoạn.")
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Nạp tài liệu hàng loạt và bảo trì các khóa học của PNote.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="Nạp file, thư mục, URL vào một khóa học (tạo khóa học nếu chưa có).")
+    ingest.add_argument("course", help="ID khóa học (vd: luat-dan-su).")
+    ingest.add_argument("paths", nargs="*", help="File, thư mục (duyệt đệ quy) hoặc URL.")
+    ingest.add_argument("--urls", action="append", default=[], help="File danh sách URL, mỗi dòng một URL.")
+    ingest.add_argument("--manifest", action="append", default=[], help="File JSON liệt kê các nguồn cần nạp.")
+    ingest.add_argument("--name", help="Tên hiển thị khi tạo khóa học mới.")
+    ingest.add_argument("--workers", type=int, default=INGESTION_MAX_WORKERS,
+                        help=f"Số process trích xuất song song (mặc định: {INGESTION_MAX_WORKERS}).")
+    ingest.set_defaults(handler=cmd_ingest)
+
+    for name, handler, help_text in (
+        ("rebuild-embeddings", cmd_rebuild_embeddings, "Tính lại embedding (vd: sau khi đổi mô hình embedding)."),
+        ("compact", cmd_compact, "Xóa đoạn mồ côi và đoạn gần trùng, đồng bộ và gộp chỉ mục BM25."),
+        ("question-bank", cmd_question_bank, "Tạo / làm mới ngân hàng câu hỏi quiz (chỉ sinh câu hỏi cho phần tài liệu mới)."),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("course", nargs="?", help="ID khóa học.")
+        command.add_argument("--all", action="store_true", help="Áp dụng cho mọi khóa học.")
+        command.set_defaults(handler=handler)
+
+    translate = commands.add_parser("translate", help="Dịch trước mọi nguồn của khóa học sang một ngôn ngữ.")
+    translate.add_argument("course", nargs="?", help="ID khóa học.")
+    translate.add_argument("--all", action="store_true", help="Áp dụng cho mọi khóa học.")
+    translate.add_argument("--language", required=True, help="Ngôn ngữ đích (vd: English, Tiếng Việt).")
+    translate.set_defaults(handler=cmd_translate)
+
+    export = commands.add_parser("export", help="Xuất một khóa học ra file snapshot (kèm embedding).")
+    export.add_argument("course", help="ID khóa học.")
+    export.add_argument("path", help="File snapshot cần ghi.")
+    export.set_defaults(handler=cmd_export)
+
+    import_ = commands.add_parser("import", help="Nhập file snapshot thành một khóa học mới, không embed lại.")
+    import_.add_argument("path", help="File snapshot.")
+    import_.add_argument("--course", help="ID khóa học mới (mặc định: ID trong snapshot).")
+    import_.add_argument("--name", help="Tên hiển thị (mặc định: tên trong snapshot).")
+    import_.set_defaults(handler=cmd_import)
+
+    stats = commands.add_parser("stats", help="Thống kê các khóa học, hoặc từng nguồn của một khóa học.")
+    stats.add_argument("course", nargs="?", help="ID khóa học (bỏ trống để liệt kê mọi khóa học).")
+    stats.set_defaults(handler=cmd_stats)
+    return parser
+
+def main() -> int:
+    args = build_parser().parse_args()
+    if args.command == "ingest" and slugify(args.course) != args.course:
+        raise SystemExit(f"ID khóa học không hợp lệ, hãy dùng '{slugify(args.course)}'.")
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
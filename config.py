@@ -12,10 +12,193 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GENERATIVE_MODEL_NAME = 'gemini-pro'
 EMBEDDING_MODEL_NAME = 'models/embedding-001'
 
+# Backend mô hình: "gemini" (mặc định) hoặc "local" (giả lập cục bộ, xác định, không cần API key;
+# dùng cho kiểm thử tải, benchmark và CI).
+LLM_BACKEND = os.getenv("PNOTE_LLM_BACKEND", "gemini")
+# Độ trễ mô phỏng của backend "local": cố định mỗi lời gọi và thêm cho mỗi token phản hồi (giây).
+LOCAL_LLM_LATENCY_SECONDS = float(os.getenv("PNOTE_LOCAL_LLM_LATENCY", "0"))
+LOCAL_LLM_TOKEN_LATENCY_SECONDS = float(os.getenv("PNOTE_LOCAL_LLM_TOKEN_LATENCY", "0"))
+# Số chiều vector của embedding cục bộ.
+LOCAL_EMBEDDING_DIMENSIONS = 256
+
 # --- Cấu hình xử lý văn bản (RAG) ---
 TEXT_CHUNK_SIZE = 800
 TEXT_CHUNK_OVERLAP = 100
-VECTOR_DB_SEARCH_RESULTS = 5
+# Số ứng viên lấy từ tìm kiếm vector trước khi hợp nhất với tìm kiếm từ khóa (BM25).
+VECTOR_DB_SEARCH_RESULTS = 20
+# Lùi ranh giới chunk về cuối đoạn văn/cuối câu gần nhất thay vì cắt giữa câu.
+TEXT_CHUNK_SNAP_TO_BOUNDARIES = True
 
 # --- Cấu hình ứng dụng ---
-CHROMA_DB_PATH = "./pnote_chroma_db"
\ No newline at end of file
+# Có thể đổi thư mục dữ liệu bằng biến môi trường PNOTE_DATA_DIR (vd: benchmark dùng thư mục tạm).
+CHROMA_DB_PATH = os.getenv("PNOTE_DATA_DIR", "./pnote_chroma_db")
+# Danh mục khóa học kèm thống kê (số chunk, số nguồn, số token...), tránh truy vấn ChromaDB mỗi lần.
+COURSE_CATALOG_PATH = os.path.join(CHROMA_DB_PATH, "catalog.json")
+# Kho kết quả AI đã tạo (tóm tắt, quiz, từ khóa) của các khóa học.
+ARTIFACT_STORE_PATH = os.path.join(CHROMA_DB_PATH, "artifacts.sqlite3")
+# Bộ nhớ dịch: bản dịch của từng đoạn văn theo ngôn ngữ đích.
+TRANSLATION_MEMORY_PATH = os.path.join(CHROMA_DB_PATH, "translation_memory.sqlite3")
+# Ngân hàng câu hỏi trắc nghiệm tạo sẵn của các khóa học.
+QUESTION_BANK_PATH = os.path.join(CHROMA_DB_PATH, "question_bank.sqlite3")
+# Lịch sử chat và ghi chú của các khóa học.
+CONVERSATION_STORE_PATH = os.path.join(CHROMA_DB_PATH, "conversations.sqlite3")
+# Số tin nhắn hiển thị trong khung chat (mỗi lần "Xem tin nhắn cũ hơn" tải thêm chừng này).
+CHAT_HISTORY_PAGE_SIZE = 30
+# Ghi chú chỉ được ghi xuống đĩa sau khi ngừng sửa chừng này giây.
+NOTES_SAVE_DEBOUNCE_SECONDS = 2.0
+
+# --- Cấu hình embedding ---
+# Số đoạn văn bản gửi trong một lần gọi API embedding.
+EMBEDDING_BATCH_SIZE = 100
+# Cache vector trên đĩa, đặt cạnh ChromaDB để dùng lại giữa các khóa học và các lần khởi động.
+EMBEDDING_CACHE_PATH = os.path.join(CHROMA_DB_PATH, "embedding_cache.sqlite3")
+# Số vector tối đa trong cache; vượt quá sẽ xóa các vector lâu không dùng nhất (LRU).
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+
+# --- Cấu hình xử lý tài liệu nền (ingestion) ---
+# Số process dùng để trích xuất văn bản song song (PDF, DOCX, URL...).
+INGESTION_MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+# Số job đã hoàn tất được giữ lại trong bộ nhớ để sidebar hiển thị.
+INGESTION_MAX_FINISHED_JOBS = 50
+# Số chunk được embed và ghi vào ChromaDB trong mỗi lô khi thêm tài liệu.
+INGESTION_UPSERT_BATCH_SIZE = 64
+# PDF lớn hơn ngưỡng này được đọc theo kiểu streaming (từng cửa sổ trang) thay vì đọc hết vào bộ nhớ.
+PDF_STREAMING_MIN_BYTES = 5 * 1024 * 1024
+# Số trang trong mỗi tác vụ khi trích xuất PDF song song bằng nhiều process.
+PDF_PAGES_PER_TASK = 16
+# Số chunk được ghi vào ChromaDB trong mỗi lô khi nhập snapshot khóa học (không phải embed nên lô lớn hơn).
+SNAPSHOT_IMPORT_BATCH_SIZE = 2000
+
+# --- Cấu hình tải trang web (URL) ---
+# Timeout (kết nối, đọc) tính bằng giây, để một server treo không chặn cả ứng dụng.
+HTTP_TIMEOUT = (5, 30)
+# Số lần tự thử lại với các lỗi tạm thời (429, 5xx, mất kết nối).
+HTTP_MAX_RETRIES = 3
+# Số URL được tải song song tối đa (cũng là kích thước connection pool).
+HTTP_MAX_CONCURRENCY = 8
+# Thư mục cache phản hồi HTTP (dùng ETag/Last-Modified để tránh tải lại trang không đổi).
+HTTP_CACHE_DIR = os.path.join(CHROMA_DB_PATH, "http_cache")
+
+# --- Cấu hình transcript YouTube ---
+# Thứ tự ưu tiên ngôn ngữ khi lấy transcript.
+YOUTUBE_LANGUAGES = ['vi', 'en']
+# Số video được tải transcript song song tối đa.
+YOUTUBE_MAX_CONCURRENCY = 4
+# Thư mục lưu transcript đã tải, theo (video ID, ngôn ngữ).
+YOUTUBE_TRANSCRIPT_DIR = os.path.join(CHROMA_DB_PATH, "transcripts")
+
+# --- Cấu hình cache câu trả lời chat ---
+# Thời gian sống của một câu trả lời trong cache (giây).
+ANSWER_CACHE_TTL_SECONDS = 6 * 60 * 60
+# Số câu trả lời tối đa được giữ cho mỗi khóa học.
+ANSWER_CACHE_MAX_ENTRIES = 500
+# Độ tương đồng cosine tối thiểu để coi hai câu hỏi là gần như giống nhau.
+ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95
+
+# --- Cấu hình tóm tắt map-reduce (tóm tắt, quiz, từ khóa trên toàn khóa học) ---
+# Số token tối đa của một nhóm văn bản gửi cho mô hình trong mỗi bước map/reduce.
+SUMMARY_GROUP_TOKENS = 6000
+# Số lời gọi mô hình chạy song song tối đa khi tóm tắt.
+SUMMARY_MAX_CONCURRENCY = 4
+# Khoảng cách tối thiểu (giây) giữa hai lời gọi mô hình liên tiếp, để không vượt quota.
+SUMMARY_MIN_REQUEST_INTERVAL = 0.5
+# Thư mục lưu bản tóm tắt trung gian của từng nguồn.
+SUMMARY_STORE_DIR = os.path.join(CHROMA_DB_PATH, "summaries")
+
+# --- Cấu hình truy xuất lai (BM25 + vector) cho chat ---
+# Chỉ mục từ khóa (SQLite FTS5), mỗi khóa học một bảng.
+LEXICAL_INDEX_PATH = os.path.join(CHROMA_DB_PATH, "lexical_index.sqlite3")
+# Số ứng viên lấy từ chỉ mục BM25 trước khi hợp nhất.
+LEXICAL_SEARCH_RESULTS = 20
+# Hằng số k của Reciprocal Rank Fusion (càng lớn thì chênh lệch giữa các hạng càng nhỏ).
+HYBRID_RRF_K = 60
+# Xếp hạng lại kết quả đã hợp nhất theo mức độ bao phủ các từ trong câu hỏi.
+HYBRID_RERANK = True
+# Số chunk cuối cùng được đưa vào prompt chat.
+RETRIEVAL_TOP_K = 4
+
+# --- Cấu hình bộ nhớ hội thoại (câu hỏi nối tiếp trong chat) ---
+# Số lượt hỏi-đáp gần nhất được giữ nguyên; các lượt cũ hơn được rút gọn vào bản tóm tắt.
+MEMORY_RECENT_TURNS = 2
+# Số chunk đã truy xuất gần đây được ghi nhớ để dùng lại cho câu hỏi nối tiếp.
+MEMORY_MAX_CHUNKS = 8
+# Ngân sách token của phần lịch sử hội thoại trong prompt.
+MEMORY_TOKEN_BUDGET = 400
+# Câu hỏi có từ chừng này từ trở xuống (khi đã có lượt trước, vd: "Tại sao?") được coi là câu hỏi nối tiếp.
+MEMORY_FOLLOW_UP_MAX_WORDS = 2
+# Tỉ lệ từ tối thiểu của câu hỏi nối tiếp mà một chunk đã nhớ phải chứa để được dùng lại thay vì truy xuất mới.
+MEMORY_REUSE_MIN_COVERAGE = 0.6
+# Số cuộc hội thoại tối đa được giữ trong bộ nhớ (bỏ cuộc lâu không dùng nhất).
+MEMORY_MAX_CONVERSATIONS = 1000
+
+# --- Cấu hình lắp ráp ngữ cảnh cho prompt ---
+# Ngân sách token của phần ngữ cảnh theo từng tác vụ: lớn hơn thì bao phủ nhiều hơn nhưng chậm hơn.
+CONTEXT_TOKEN_BUDGETS = {
+    "default": 3000,
+    "chat": 1500,
+    "summary": 6000,
+    "quiz": 5000,
+    "keywords": 4000,
+}
+# Hai đoạn có độ tương đồng Jaccard (trên các cụm 3 từ) từ ngưỡng này trở lên được coi là trùng lặp.
+CONTEXT_DUPLICATE_THRESHOLD = 0.8
+
+# --- Cấu hình bộ điều phối lời gọi mô hình (dùng chung cho cả process) ---
+# Số lời gọi mô hình chạy đồng thời tối đa (toàn bộ ứng dụng).
+LLM_MAX_CONCURRENCY = 8
+# Số lời gọi mô hình chạy đồng thời tối đa trong một khóa học.
+LLM_MAX_CONCURRENCY_PER_COURSE = 2
+# Giới hạn số token (prompt + phản hồi) mỗi phút; 0 = không giới hạn.
+LLM_TOKENS_PER_MINUTE = 120_000
+# Số lần thử lại khi gặp lỗi tạm thời (429, 5xx, timeout).
+LLM_MAX_RETRIES = 3
+# Thời gian chờ cơ sở trước lần thử lại đầu tiên (giây), nhân đôi sau mỗi lần.
+LLM_RETRY_BACKOFF_SECONDS = 1.0
+# Số lời gọi chạy nền (vd: tạo ngân hàng câu hỏi) đồng thời tối đa, không chiếm slot của khóa học.
+LLM_BACKGROUND_MAX_CONCURRENCY = 1
+# Phần token mỗi phút dành riêng cho lời gọi chạy nền; phần còn lại dành cho lời gọi tương tác.
+LLM_BACKGROUND_TOKEN_FRACTION = 0.2
+
+# --- Cấu hình đo đạc hiệu năng (trang Hiệu năng) ---
+# Bật/tắt việc ghi số liệu (PNOTE_METRICS=0 để tắt, khi đó gần như không tốn chi phí).
+METRICS_ENABLED = os.getenv("PNOTE_METRICS", "1") != "0"
+# Các ngưỡng (ms) của histogram độ trễ.
+METRICS_LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+# File JSON Lines nhận các bản snapshot khi bấm "Xuất ra file".
+METRICS_EXPORT_PATH = os.path.join(CHROMA_DB_PATH, "metrics.jsonl")
+
+# --- Cấu hình dịch văn bản dài (dịch theo đoạn + bộ nhớ dịch) ---
+# Số token tối đa của mỗi đoạn được gửi đi dịch.
+TRANSLATION_SEGMENT_TOKENS = 400
+# Số đoạn được dịch song song trong một lần dịch (vẫn chịu giới hạn của bộ điều phối).
+TRANSLATION_MAX_CONCURRENCY = 4
+# Số bản dịch tối đa trong bộ nhớ dịch (vượt quá thì xóa bớt các bản lâu không dùng).
+TRANSLATION_MEMORY_MAX_ENTRIES = 200_000
+
+# --- Cấu hình ngân hàng câu hỏi quiz (tạo sẵn ở chế độ nền) ---
+# Tự động tạo / làm mới ngân hàng câu hỏi khi tài liệu của khóa học thay đổi.
+QUESTION_BANK_AUTO_BUILD = os.getenv("PNOTE_QUESTION_BANK_AUTO_BUILD", "1") != "0"
+# Số token tối đa của mỗi nhóm văn bản được gửi đi sinh câu hỏi.
+QUESTION_BANK_GROUP_TOKENS = 1500
+# Số câu hỏi yêu cầu cho mỗi nhóm văn bản.
+QUESTION_BANK_QUESTIONS_PER_GROUP = 5
+# Số nhóm được sinh câu hỏi song song (vẫn chịu giới hạn của bộ điều phối).
+QUESTION_BANK_MAX_CONCURRENCY = 2
+
+# --- Cấu hình lọc nội dung lặp lại khi nạp tài liệu (boilerplate, chunk gần trùng) ---
+# Bật/tắt việc lọc (PNOTE_DEDUP=0 để lưu nguyên văn mọi chunk như trước).
+DEDUP_ENABLED = os.getenv("PNOTE_DEDUP", "1") != "0"
+# Số trang trong mỗi cửa sổ khi tìm các dòng lặp lại (header, footer, menu...).
+BOILERPLATE_WINDOW_PAGES = 20
+# Một dòng phải xuất hiện trên ít nhất chừng này trang mới bị coi là lặp lại...
+BOILERPLATE_MIN_PAGES = 3
+# ...và trên ít nhất tỉ lệ này trong số các trang đã đọc.
+BOILERPLATE_MIN_FRACTION = 0.5
+# Chỉ xét các dòng ngắn hơn ngưỡng này (ký tự); đoạn văn dài không bao giờ bị loại.
+BOILERPLATE_MAX_LINE_CHARS = 120
+# Trang có ít nhất chừng này từ mới được so với các trang trước để phát hiện trang lặp lại (vd: slide).
+BOILERPLATE_MIN_PAGE_WORDS = 30
+# Ngưỡng độ tương đồng Jaccard (ước lượng bằng MinHash) để coi hai chunk là gần trùng.
+NEAR_DUPLICATE_THRESHOLD = 0.9
+# Số từ trong mỗi shingle khi tính MinHash.
+NEAR_DUPLICATE_SHINGLE_WORDS = 3
@@ -0,0 +1,101 @@
+# Ghi chú: Cache câu trả lời chat theo từng khóa học.
+# Sinh viên trong cùng một khóa học thường hỏi những câu gần như giống hệt nhau; thay vì
+# chạy lại truy vấn ChromaDB và gọi mô hình, câu trả lời cũ được dùng lại khi:
+# 1. Câu hỏi trùng khớp sau khi chuẩn hóa (không cần embed, trả về trong vài ms), hoặc
+# 2. Embedding của câu hỏi đủ gần (cosine >= ngưỡng) với một câu hỏi đã trả lời.
+# Mỗi mục có thời hạn (TTL), mỗi khóa học có số mục tối đa (bỏ mục lâu không dùng nhất),
+# và cache của khóa học bị xóa ngay khi tài liệu của khóa học thay đổi.
+
+import re
+import math
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from config import ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY_THRESHOLD
+
+def normalize_question(question: str) -> str:
+    """Chuẩn hóa câu hỏi để so khớp chính xác: chữ thường, gộp khoảng trắng, bỏ dấu câu ở cuối."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?.!… ")
+
+def _unit(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+@dataclass
+class _Entry:
+    vector: list[float] | None
+    answer: str
+    created_at: float
+
+class AnswerCache:
+    """Cache câu trả lời trong bộ nhớ, dùng chung cho mọi phiên làm việc của process."""
+    def __init__(self, ttl: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 threshold: float = ANSWER_CACHE_SIMILARITY_THRESHOLD):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._courses: dict[str, OrderedDict[str, _Entry]] = {}
+        # Tăng mỗi lần khóa học bị invalidate, để không lưu câu trả lời được tạo từ dữ liệu cũ.
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def version(self, course_id: str) -> int:
+        """Phiên bản hiện tại của cache khóa học; truyền lại vào `put` để tránh ghi dữ liệu cũ."""
+        with self._lock:
+            return self._versions.get(course_id, 0)
+
+    def _live_entries(self, course_id: str) -> OrderedDict[str, _Entry]:
+        """Lấy các mục của khóa học, đồng thời bỏ các mục đã hết hạn (gọi khi đang giữ lock)."""
+        entries = self._courses.setdefault(course_id, OrderedDict())
+        deadline = time.time() - self.ttl
+        for key in [key for key, entry in entries.items() if entry.created_at < deadline]:
+            del entries[key]
+        return entries
+
+    def get_exact(self, course_id: str, question: str) -> str | None:
+        """Tìm câu trả lời cho câu hỏi trùng khớp (sau chuẩn hóa)."""
+        key = normalize_question(question)
+        with self._lock:
+            entries = self._live_entries(course_id)
+            if key in entries:
+                entries.move_to_end(key)
+                return entries[key].answer
+        return None
+
+    def get_similar(self, course_id: str, vector: list[float]) -> str | None:
+        """Tìm câu trả lời của câu hỏi có embedding gần nhất, nếu độ tương đồng vượt ngưỡng."""
+        query = _unit(vector)
+        with self._lock:
+            entries = self._live_entries(course_id)
+            best_key, best_score = None, self.threshold
+            for key, entry in entries.items():
+                if entry.vector is None: continue
+                score = sum(a * b for a, b in zip(query, entry.vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            entries.move_to_end(best_key)
+            return entries[best_key].answer
+
+    def put(self, course_id: str, question: str, answer: str, vector: list[float] | None = None, version: int | None = None):
+        """
+        Lưu câu trả lời; vượt quá giới hạn thì bỏ mục lâu không dùng nhất. Nếu khóa học đã
+        bị invalidate kể từ `version` (tài liệu thay đổi trong lúc đang trả lời) thì bỏ qua.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            if version is not None and version != self._versions.get(course_id, 0):
+                return
+            entries = self._live_entries(course_id)
+            entries[key] = _Entry(_unit(vector) if vector else None, answer, time.time())
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, course_id: str):
+        """Xóa toàn bộ cache của khóa học (khi tài liệu thay đổi hoặc khóa học bị xóa)."""
+        with self._lock:
+            self._courses.pop(course_id, None)
+            self._versions[course_id] = self._versions.get(course_id, 0) + 1
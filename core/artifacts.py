@@ -0,0 +1,60 @@
+# Ghi chú: Kho lưu trữ bền vững các kết quả AI đã tạo cho một khóa học (tóm tắt, quiz, từ khóa).
+# Trước đây kết quả chỉ nằm trong st.session_state: mỗi phiên mới, mỗi lần tải lại trang hay
+# mỗi sinh viên khác đều phải gọi lại mô hình. Giờ kết quả được lưu vào SQLite theo khóa
+# (khóa học, công cụ, tham số) cùng với phiên bản nội dung của khóa học (tính từ manifest).
+# Kết quả chỉ được dùng lại khi phiên bản còn khớp, tức là tài liệu của khóa học chưa đổi.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from config import ARTIFACT_STORE_PATH
+
+def artifact_params(params: dict) -> str:
+    """Chuẩn hóa tham số (vd: {"num_questions": 5}) thành chuỗi JSON ổn định để làm khóa."""
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+class ArtifactStore:
+    """Lưu mỗi (khóa học, công cụ, tham số) một kết quả mới nhất, kèm phiên bản nội dung đã dùng để tạo ra nó."""
+    def __init__(self, path: str = ARTIFACT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts (course_id TEXT NOT NULL, tool TEXT NOT NULL, params TEXT NOT NULL, "
+                "version TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (course_id, tool, params))"
+            )
+        return self._conn
+
+    def get(self, course_id: str, version: str, tool: str, params: dict | None = None) -> str | None:
+        """Lấy kết quả đã lưu, hoặc None nếu chưa có hoặc được tạo từ một phiên bản nội dung khác."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT content FROM artifacts WHERE course_id = ? AND tool = ? AND params = ? AND version = ?",
+                (course_id, tool, artifact_params(params or {}), version),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, course_id: str, version: str, tool: str, content: str, params: dict | None = None):
+        """Lưu (hoặc thay thế) kết quả của một công cụ."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (course_id, tool, params, version, content, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (course_id, tool, artifact_params(params or {}), version, content, time.time()),
+            )
+            conn.commit()
+
+    def prune(self, course_id: str, version: str):
+        """Xóa các kết quả không còn khớp với phiên bản nội dung hiện tại (kể cả khi khóa học bị xóa)."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM artifacts WHERE course_id = ? AND version != ?", (course_id, version))
+            conn.commit()
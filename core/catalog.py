@@ -0,0 +1,160 @@
+# Ghi chú: Danh mục (catalog) các khóa học kèm thống kê, dùng chung cho toàn process.
+# Trước đây mỗi phiên mới gọi list_collections() và mỗi câu hỏi gọi collection.count()
+# (nhiều lần) tới ChromaDB. Catalog giữ sẵn trong bộ nhớ, và lưu xuống một file JSON, cho
+# mỗi khóa học: tên hiển thị, số chunk, số nguồn, tổng số token và thời điểm cập nhật.
+# - Khởi động: đọc file JSON, chỉ đối chiếu danh sách collection một lần; chỉ khóa học
+#   chưa có trong file mới phải đếm chunk.
+# - CourseManager cập nhật catalog khi tạo / xóa khóa học và khi tài liệu thay đổi.
+# - CLI (cli.py) và ứng dụng có thể cùng ghi file: file được đọc lại khi đổi trên đĩa, và mỗi lần
+#   ghi đọc lại file rồi gộp thay đổi trong lúc giữ khóa file (core/filelock.py).
+
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass, asdict
+from config import COURSE_CATALOG_PATH
+from core.filelock import file_lock, file_version
+
+@dataclass
+class CourseStats:
+    """Thông tin và thống kê của một khóa học."""
+    id: str
+    name: str
+    chunk_count: int = 0
+    source_count: int = 0
+    total_tokens: int = 0
+    updated_at: float | None = None
+
+class CourseCatalog:
+    """
+    Cache thông tin các khóa học. `client` là client ChromaDB, `manifest` là SourceManifest
+    (nguồn của số nguồn, số token và thời điểm cập nhật).
+    """
+    def __init__(self, client, manifest, path: str = COURSE_CATALOG_PATH):
+        self.client = client
+        self.manifest = manifest
+        self.path = path
+        self._courses: dict[str, CourseStats] | None = None
+        # Phiên bản file lúc đọc / ghi gần nhất; khác đi nghĩa là một process khác đã ghi file.
+        self._version = None
+        self._lock = threading.RLock()
+
+    def _from_manifest(self, course_id: str, name: str, chunk_count: int) -> CourseStats:
+        sources = self.manifest.load(course_id)
+        return CourseStats(
+            id=course_id,
+            name=name,
+            chunk_count=chunk_count,
+            source_count=len(sources),
+            total_tokens=sum(entry.get("token_count", 0) for entry in sources.values()),
+            updated_at=max((entry["ingested_at"] for entry in sources.values()), default=None),
+        )
+
+    @staticmethod
+    def _display_name(collection) -> str:
+        return collection.metadata.get("display_name", collection.name) if collection.metadata else collection.name
+
+    def _read(self) -> dict[str, CourseStats] | None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return {entry["id"]: CourseStats(**entry) for entry in json.load(f)}
+        except (FileNotFoundError, json.JSONDecodeError, TypeError, KeyError):
+            return None
+
+    def _load(self) -> dict[str, CourseStats]:
+        """
+        Nạp catalog (gọi khi đang giữ lock): đọc file, đối chiếu với các collection hiện có.
+        Chỉ đọc lại khi file đã bị process khác (vd: CLI) thay đổi.
+        """
+        version = file_version(self.path)
+        if self._courses is not None and version == self._version:
+            return self._courses
+        saved = self._read() or {}
+        courses = {}
+        for collection in self.client.list_collections():
+            if collection.name in saved:
+                courses[collection.name] = saved[collection.name]
+            else:
+                courses[collection.name] = self._from_manifest(collection.name, self._display_name(collection), collection.count())
+        self._courses, self._version = courses, version
+        if courses.keys() != saved.keys():
+            self._save({course_id: courses.get(course_id) for course_id in courses.keys() ^ saved.keys()})
+        return courses
+
+    def _save(self, changes: dict[str, CourseStats | None]):
+        """
+        Ghi các thay đổi ({ID khóa học: thống kê, hoặc None nếu đã xóa}): đọc lại file trong lúc giữ
+        khóa file và gộp vào, để không ghi đè các khóa học mà process khác vừa thêm.
+        """
+        with file_lock(self.path):
+            courses = self._read()
+            if courses is None:
+                courses = dict(self._courses or {})
+            for course_id, stats in changes.items():
+                if stats is None:
+                    courses.pop(course_id, None)
+                else:
+                    courses[course_id] = stats
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump([asdict(stats) for stats in courses.values()], f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._courses, self._version = courses, file_version(self.path)
+
+    def list_courses(self) -> list[CourseStats]:
+        """Tất cả các khóa học (không truy vấn ChromaDB sau lần nạp đầu tiên)."""
+        with self._lock:
+            return list(self._load().values())
+
+    def get(self, course_id: str) -> CourseStats | None:
+        """
+        Thông tin của một khóa học, hoặc None nếu khóa học không tồn tại. Khóa học chưa có trong
+        catalog nhưng đã có collection (vd: process khác vừa tạo) được thêm vào catalog.
+        """
+        with self._lock:
+            stats = self._load().get(course_id)
+            if stats is None:
+                try:
+                    collection = self.client.get_collection(name=course_id)
+                except ValueError:
+                    return None
+                stats = self._from_manifest(course_id, self._display_name(collection), collection.count())
+                self._save({course_id: stats})
+            return stats
+
+    def add_course(self, course_id: str, name: str):
+        """Ghi nhận một khóa học vừa được tạo (giữ nguyên thống kê nếu đã có)."""
+        with self._lock:
+            if course_id not in self._load():
+                self._save({course_id: CourseStats(course_id, name, updated_at=time.time())})
+
+    def remove_course(self, course_id: str):
+        """Bỏ khóa học đã bị xóa khỏi catalog."""
+        with self._lock:
+            if course_id in self._load():
+                self._save({course_id: None})
+
+    def refresh(self, course_id: str):
+        """Tính lại thống kê của một khóa học sau khi tài liệu của nó thay đổi."""
+        with self._lock:
+            courses = self._load()
+            if course_id not in courses:
+                return
+            try:
+                collection = self.client.get_collection(name=course_id)
+            except ValueError:
+                self.remove_course(course_id)
+                return
+            stats = self._from_manifest(course_id, courses[course_id].name, collection.count())
+            stats.updated_at = time.time()
+            self._save({course_id: stats})
+
+    def invalidate(self):
+        """Bỏ cache, nạp lại toàn bộ từ ChromaDB và manifest ở lần truy cập sau."""
+        with self._lock:
+            self._courses = self._version = None
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,189 @@
+# Ghi chú: Bộ chia văn bản (chunker) dùng chung cho toàn bộ ứng dụng.
+# So với cách cũ (get_encoding mỗi lần gọi + decode lại từng cửa sổ token):
+# 1. Encoder tiktoken chỉ được tải MỘT lần cho mỗi process.
+# 2. Văn bản được encode một lần, sau đó cắt trực tiếp trên chuỗi gốc theo vị trí
+#    ký tự của token, không decode lại phần overlap.
+# 3. Có thể "bắt dính" ranh giới chunk vào cuối đoạn văn / cuối câu.
+# 4. Mỗi chunk kèm metadata (nguồn, trang, vị trí ký tự) để lưu vào ChromaDB.
+# tiktoken chỉ được import khi cần encoder lần đầu (không làm chậm lúc khởi động ứng dụng).
+
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Iterable, Iterator, NamedTuple, TYPE_CHECKING
+from config import TEXT_CHUNK_SIZE, TEXT_CHUNK_OVERLAP, TEXT_CHUNK_SNAP_TO_BOUNDARIES
+
+if TYPE_CHECKING:
+    import tiktoken
+
+ENCODING_NAME = "cl100k_base"
+
+# Ranh giới ưu tiên khi bắt dính: hết đoạn văn, rồi hết câu, rồi xuống dòng.
+_PARAGRAPH_END = re.compile(r"\n\s*\n\s*")
+_SENTENCE_END = re.compile(r"[.!?…:;][\"'”’)\]]*\s+")
+_LINE_END = re.compile(r"\n\s*")
+
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name: str = ENCODING_NAME) -> "tiktoken.Encoding":
+    """Tải encoder tiktoken một lần duy nhất và dùng lại cho mọi lần gọi sau."""
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
+
+def count_tokens(text: str) -> int:
+    """Đếm số token của một đoạn văn bản bằng encoder đã được cache."""
+    return len(get_encoder().encode(text, disallowed_special=()))
+
+class Chunk(NamedTuple):
+    """Một đoạn văn bản đã chia, kèm metadata sẽ được ghi vào ChromaDB."""
+    text: str
+    metadata: dict
+
+class TextChunker:
+    """
+    Chia văn bản thành các cửa sổ `chunk_size` token, chồng lấn `overlap` token.
+    Khi `snap_to_boundaries` bật, điểm kết thúc của mỗi chunk được lùi về ranh giới
+    đoạn/câu gần nhất trong nửa sau của cửa sổ, và điểm bắt đầu của chunk kế tiếp
+    được đẩy tới đầu câu gần nhất trong vùng overlap.
+    """
+    def __init__(self, chunk_size: int = TEXT_CHUNK_SIZE, overlap: int = TEXT_CHUNK_OVERLAP,
+                 snap_to_boundaries: bool = TEXT_CHUNK_SNAP_TO_BOUNDARIES, encoding_name: str = ENCODING_NAME):
+        if overlap >= chunk_size:
+            raise ValueError("overlap phải nhỏ hơn chunk_size.")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.snap_to_boundaries = snap_to_boundaries
+        self.encoding_name = encoding_name
+
+    @property
+    def encoder(self) -> "tiktoken.Encoding":
+        return get_encoder(self.encoding_name)
+
+    def _token_offsets(self, text: str) -> list[int]:
+        """Vị trí ký tự bắt đầu của từng token trong chuỗi gốc."""
+        tokens = self.encoder.encode(text, disallowed_special=())
+        _, offsets = self.encoder.decode_with_offsets(tokens)
+        return offsets
+
+    @staticmethod
+    def _last_boundary(text: str, lo: int, hi: int) -> int | None:
+        """Tìm ranh giới tốt nhất (vị trí sau dấu ngắt) trong text[lo:hi], ưu tiên cái muộn nhất."""
+        for pattern in (_PARAGRAPH_END, _SENTENCE_END, _LINE_END):
+            last = None
+            for match in pattern.finditer(text, lo, hi):
+                last = match.end()
+            if last is not None and last < hi:
+                return last
+        return None
+
+    @staticmethod
+    def _first_boundary(text: str, lo: int, hi: int) -> int | None:
+        """Tìm đầu câu/đoạn sớm nhất trong text[lo:hi]."""
+        for pattern in (_PARAGRAPH_END, _SENTENCE_END, _LINE_END):
+            match = pattern.search(text, lo, hi)
+            if match and match.end() < hi:
+                return match.end()
+        return None
+
+    def spans(self, text: str) -> list[tuple[int, int]]:
+        """Tính các khoảng (char_start, char_end) của từng chunk trên chuỗi gốc."""
+        offsets = self._token_offsets(text)
+        n = len(offsets)
+        spans = []
+        start_tok, start_char = 0, 0
+        while start_tok < n:
+            end_tok = min(start_tok + self.chunk_size, n)
+            end_char = offsets[end_tok] if end_tok < n else len(text)
+            if end_tok < n and self.snap_to_boundaries:
+                snapped = self._last_boundary(text, (start_char + end_char) // 2, end_char)
+                if snapped:
+                    end_char = snapped
+                    end_tok = bisect_left(offsets, end_char)
+            spans.append((start_char, end_char))
+            if end_tok >= n:
+                break
+
+            # Chunk kế tiếp lùi lại `overlap` token, nhưng luôn tiến lên ít nhất một token.
+            start_tok = max(end_tok - self.overlap, start_tok + 1)
+            start_char = offsets[start_tok]
+            if self.snap_to_boundaries:
+                snapped = self._first_boundary(text, start_char, end_char)
+                if snapped:
+                    start_char = snapped
+                    start_tok = bisect_right(offsets, start_char) - 1
+        return spans
+
+    def split(self, text: str) -> list[str]:
+        """Chia văn bản, chỉ trả về nội dung các chunk."""
+        return [text[start:end] for start, end in self.spans(text)]
+
+    def chunk(self, text: str, source_name: str, page_starts: list[int] | None = None) -> list[Chunk]:
+        """
+        Chia văn bản thành các Chunk kèm metadata.
+
+        Args:
+            text (str): Văn bản cần chia.
+            source_name (str): Tên nguồn, được ghi vào metadata của mọi chunk.
+            page_starts (list[int] | None): Vị trí ký tự bắt đầu của từng trang (nếu có),
+                                            dùng để suy ra số trang của chunk.
+
+        Returns:
+            list[Chunk]: Các chunk không rỗng theo đúng thứ tự trong văn bản.
+        """
+        chunks = []
+        for start, end in self.spans(text):
+            if not text[start:end].strip():
+                continue
+            metadata = {"source": source_name, "chunk_index": len(chunks), "char_start": start, "char_end": end}
+            if page_starts:
+                metadata["page"] = max(1, bisect_right(page_starts, start))
+            chunks.append(Chunk(text[start:end], metadata))
+        return chunks
+
+    def chunk_pages(self, pages: list[str | tuple[str, dict]], source_name: str) -> list[Chunk]:
+        """Chia một tài liệu nhiều trang (vd: PDF), ghi số trang bắt đầu của mỗi chunk."""
+        return list(self.iter_chunks(pages, source_name))
+
+    def iter_chunks(self, pages: Iterable[str | tuple[str, dict]], source_name: str, window_chars: int | None = None) -> Iterator[Chunk]:
+        """
+        Phiên bản streaming của chunk_pages: nhận các trang từ một generator và trả về
+        chunk ngay khi chúng đã được xác định. Chỉ giữ trong bộ nhớ một cửa sổ khoảng
+        `window_chars` ký tự (mặc định ~32 lần chunk_size) cộng với trang đang đọc.
+        Các trang được nối bằng "\n", nên vị trí ký tự khớp với "\n".join(pages).
+        Mỗi trang có thể là một cặp (văn bản, metadata), vd: segment transcript kèm mốc
+        thời gian; metadata của trang chứa điểm bắt đầu chunk sẽ được gộp vào chunk.
+        """
+        window_chars = window_chars or self.chunk_size * 32
+        buffer, base, chunk_index = "", 0, 0
+        page_starts: list[int] = []
+        page_metadata: dict[int, dict] = {}
+
+        def emit(spans):
+            nonlocal chunk_index
+            for start, end in spans:
+                text = buffer[start:end]
+                if not text.strip():
+                    continue
+                page = max(1, bisect_right(page_starts, base + start))
+                metadata = {"source": source_name, "chunk_index": chunk_index,
+                            "char_start": base + start, "char_end": base + end, "page": page}
+                metadata.update(page_metadata.get(page, {}))
+                chunk_index += 1
+                yield Chunk(text, metadata)
+
+        for page in pages:
+            if isinstance(page, tuple):
+                page, metadata = page
+                page_metadata[len(page_starts) + 1] = metadata
+            if page_starts:
+                buffer += "\n"
+            page_starts.append(base + len(buffer))
+            buffer += page
+            if len(buffer) < window_chars:
+                continue
+            # Mọi chunk trừ chunk cuối đã có đủ văn bản phía sau -> trả về và bỏ khỏi buffer.
+            spans = self.spans(buffer)
+            if len(spans) > 1:
+                yield from emit(spans[:-1])
+                cut = spans[-1][0]
+                buffer, base = buffer[cut:], base + cut
+        yield from emit(self.spans(buffer))
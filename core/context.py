@@ -0,0 +1,179 @@
+# Ghi chú: Lắp ráp ngữ cảnh (context) cho prompt theo ngân sách token.
+# Trước đây mọi prompt chỉ nối các chunk bằng "\n---\n" mà không đo kích thước, nên phần
+# overlap giữa các chunk liền kề bị gửi hai lần và prompt lúc thì quá dài, lúc bị cắt cụt.
+# ContextBuilder:
+# 1. Gộp các chunk chồng lấn / liền kề của cùng một nguồn dựa vào char_start/char_end.
+# 2. Bỏ các đoạn gần như trùng lặp (Jaccard trên các cụm 3 từ).
+# 3. Xếp các đoạn (theo thứ tự liên quan) cho tới khi chạm ngân sách token của từng tác vụ.
+# UsageTracker ghi lại số token ngữ cảnh / prompt / phản hồi của từng tác vụ để cân đối
+# giữa độ trễ và độ bao phủ.
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Iterable, NamedTuple
+from config import CONTEXT_TOKEN_BUDGETS, CONTEXT_DUPLICATE_THRESHOLD
+from core.chunking import get_encoder, count_tokens
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+class BuiltContext(NamedTuple):
+    """Ngữ cảnh đã lắp ráp: văn bản, số token, và số đoạn được dùng / bị bỏ."""
+    text: str
+    tokens: int
+    pieces: int
+    dropped: int
+
+def _shingles(text: str, size: int = 3) -> set[tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def merge_chunks(chunks: list[tuple[str, dict]]) -> list[tuple[str, dict]]:
+    """
+    Gộp các chunk chồng lấn hoặc liền kề của cùng một nguồn thành một đoạn liên tục.
+    Đầu vào theo thứ tự liên quan; mỗi đoạn gộp giữ vị trí của chunk liên quan nhất trong nó.
+    Chunk không có char_start/char_end (dữ liệu cũ) được giữ nguyên.
+    """
+    ranked: list[tuple[int, str, dict]] = []
+    by_source: dict[str, list[tuple[int, str, dict]]] = {}
+    for rank, (text, metadata) in enumerate(chunks):
+        if "char_start" in metadata and "char_end" in metadata:
+            by_source.setdefault(metadata.get("source", ""), []).append((rank, text, metadata))
+        else:
+            ranked.append((rank, text, metadata))
+
+    for items in by_source.values():
+        items.sort(key=lambda item: item[2]["char_start"])
+        rank, text, metadata = items[0]
+        metadata = dict(metadata)
+        for next_rank, next_text, next_metadata in items[1:]:
+            start, end = next_metadata["char_start"], next_metadata["char_end"]
+            if start <= metadata["char_end"]:
+                if end > metadata["char_end"]:
+                    text += next_text[metadata["char_end"] - start:]
+                    metadata["char_end"] = end
+                rank = min(rank, next_rank)
+                continue
+            ranked.append((rank, text, metadata))
+            rank, text, metadata = next_rank, next_text, dict(next_metadata)
+        ranked.append((rank, text, metadata))
+
+    ranked.sort(key=lambda item: item[0])
+    return [(text, metadata) for _, text, metadata in ranked]
+
+class ContextBuilder:
+    """
+    Lắp ráp ngữ cảnh cho prompt, giới hạn theo ngân sách token của từng tác vụ.
+    Nếu có `usage`, số token ngữ cảnh của mỗi lần lắp ráp được ghi vào đó.
+    """
+    def __init__(self, budgets: dict[str, int] = CONTEXT_TOKEN_BUDGETS,
+                 duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD, separator: str = "\n---\n",
+                 usage: "UsageTracker | None" = None):
+        self.budgets = budgets
+        self.duplicate_threshold = duplicate_threshold
+        self.separator = separator
+        self.usage = usage
+
+    def budget(self, task: str) -> int:
+        """Ngân sách token của tác vụ (dùng mục "default" nếu tác vụ không được cấu hình)."""
+        return self.budgets.get(task, self.budgets["default"])
+
+    @staticmethod
+    def truncate(text: str, max_tokens: int) -> str:
+        """Cắt văn bản còn tối đa `max_tokens` token."""
+        encoder = get_encoder()
+        tokens = encoder.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
+
+    def build(self, chunks: str | Iterable[tuple[str, dict]], task: str) -> BuiltContext:
+        """
+        Lắp ráp ngữ cảnh cho một tác vụ.
+
+        Args:
+            chunks (str | Iterable): Một văn bản duy nhất (vd: bản cô đọng của khóa học), hoặc
+                                     các cặp (nội dung chunk, metadata) theo thứ tự liên quan.
+            task (str): Tên tác vụ ("chat", "summary", "quiz", ...), quyết định ngân sách token.
+
+        Returns:
+            BuiltContext: Văn bản ngữ cảnh và thống kê token.
+        """
+        context = self._assemble(chunks, self.budget(task))
+        if self.usage:
+            self.usage.record_context(task, context.tokens)
+        return context
+
+    def _assemble(self, chunks: str | Iterable[tuple[str, dict]], budget: int) -> BuiltContext:
+        if isinstance(chunks, str):
+            text = self.truncate(chunks, budget)
+            return BuiltContext(text, count_tokens(text), 1, 0)
+
+        merged = merge_chunks(list(chunks))
+        separator_tokens = count_tokens(self.separator)
+        selected: list[str] = []
+        seen: list[set] = []
+        used, dropped = 0, 0
+        for text, _ in merged:
+            shingles = _shingles(text)
+            if any(len(shingles & other) / len(shingles | other) >= self.duplicate_threshold for other in seen):
+                dropped += 1
+                continue
+            cost = count_tokens(text) + (separator_tokens if selected else 0)
+            if used + cost > budget:
+                if selected:
+                    # Đoạn này quá dài; vẫn thử các đoạn sau (có thể ngắn hơn và vừa ngân sách).
+                    dropped += 1
+                    continue
+                # Đoạn liên quan nhất luôn được giữ, cắt bớt cho vừa ngân sách.
+                text = self.truncate(text, budget)
+                cost = count_tokens(text)
+            selected.append(text)
+            seen.append(shingles)
+            used += cost
+        return BuiltContext(self.separator.join(selected), used, len(selected), dropped)
+
+@dataclass
+class TaskUsage:
+    """Số token tích lũy của một tác vụ."""
+    calls: int = 0
+    contexts: int = 0
+    context_tokens: int = 0
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+
+class UsageTracker:
+    """Ghi lại số token ngữ cảnh, prompt và phản hồi của từng tác vụ trong process."""
+    def __init__(self):
+        self._usage: dict[str, TaskUsage] = {}
+        self._lock = threading.Lock()
+
+    def record_context(self, task: str, context_tokens: int):
+        """Ghi số token ngữ cảnh của một lần lắp ráp prompt."""
+        with self._lock:
+            usage = self._usage.setdefault(task, TaskUsage())
+            usage.contexts += 1
+            usage.context_tokens += context_tokens
+
+    def record(self, task: str, prompt_tokens: int, response_tokens: int):
+        """Ghi số token prompt / phản hồi của một lần gọi mô hình."""
+        with self._lock:
+            usage = self._usage.setdefault(task, TaskUsage())
+            usage.calls += 1
+            usage.prompt_tokens += prompt_tokens
+            usage.response_tokens += response_tokens
+
+    def summary(self) -> dict[str, dict]:
+        """Thống kê theo tác vụ: số lần gọi, tổng số token và số token trung bình mỗi lần."""
+        with self._lock:
+            return {
+                task: {
+                    "calls": usage.calls,
+                    "prompt_tokens": usage.prompt_tokens,
+                    "response_tokens": usage.response_tokens,
+                    "avg_context_tokens": usage.context_tokens / max(usage.contexts, 1),
+                    "avg_prompt_tokens": usage.prompt_tokens / max(usage.calls, 1),
+                    "avg_response_tokens": usage.response_tokens / max(usage.calls, 1),
+                }
+                for task, usage in self._usage.items()
+            }
@@ -0,0 +1,155 @@
+# Ghi chú: Lưu trữ bền vững lịch sử chat và ghi chú của từng khóa học (SQLite cạnh ChromaDB).
+# Cả hai thuộc về một phiên làm việc (session_id, xem utils/state.py): hai người dùng mở cùng một
+# khóa học không thấy tin nhắn hay ghi chú cá nhân của nhau.
+# Trước đây cả hai chỉ nằm trong st.session_state: mất khi tải lại trang, và khung chat vẽ lại
+# toàn bộ lịch sử (không giới hạn) ở mỗi lần rerun -> càng học lâu càng chậm.
+# - Tin nhắn chỉ được ghi thêm (append-only), đọc theo trang từ cuối lên (chỉ phần đang hiển thị).
+# - Ghi chú được lưu có trì hoãn (debounce): nhiều lần sửa liên tiếp chỉ tạo một lần ghi, và
+#   nội dung không đổi thì không ghi lại.
+
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from config import CONVERSATION_STORE_PATH, CHAT_HISTORY_PAGE_SIZE, NOTES_SAVE_DEBOUNCE_SECONDS
+
+class ConversationStore:
+    """Tin nhắn chat và ghi chú theo (khóa học, phiên); một đối tượng dùng chung cho mọi phiên trong process."""
+    def __init__(self, path: str = CONVERSATION_STORE_PATH, debounce: float = NOTES_SAVE_DEBOUNCE_SECONDS):
+        self.path = path
+        self.debounce = debounce
+        self._lock = threading.RLock()
+        self._conn: sqlite3.Connection | None = None
+        # Ghi chú đang chờ ghi xuống đĩa và bộ hẹn giờ tương ứng, theo (khóa học, phiên).
+        self._pending_notes: dict[tuple[str, str], str] = {}
+        self._timers: dict[tuple[str, str], threading.Timer] = {}
+        # Không để mất ghi chú đang chờ khi process dừng.
+        atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, course_id TEXT NOT NULL, "
+                "session_id TEXT NOT NULL DEFAULT '', role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes (course_id TEXT NOT NULL, session_id TEXT NOT NULL DEFAULT '', "
+                "content TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (course_id, session_id))"
+            )
+            self._migrate(self._conn)
+            self._conn.execute("DROP INDEX IF EXISTS idx_messages_course")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (course_id, session_id, id)")
+        return self._conn
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection):
+        """
+        Nâng cấp file cũ (chỉ khóa theo khóa học) lên khóa theo (khóa học, phiên). Dữ liệu cũ được
+        giữ với session_id rỗng: nó dùng chung cho mọi người nên không gán cho phiên nào.
+        """
+        if "session_id" not in {row[1] for row in conn.execute("PRAGMA table_info(messages)")}:
+            conn.execute("ALTER TABLE messages ADD COLUMN session_id TEXT NOT NULL DEFAULT ''")
+        if "session_id" not in {row[1] for row in conn.execute("PRAGMA table_info(notes)")}:
+            conn.executescript(
+                "ALTER TABLE notes RENAME TO notes_old; "
+                "CREATE TABLE notes (course_id TEXT NOT NULL, session_id TEXT NOT NULL DEFAULT '', "
+                "content TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (course_id, session_id)); "
+                "INSERT INTO notes (course_id, content, updated_at) SELECT course_id, content, updated_at FROM notes_old; "
+                "DROP TABLE notes_old;"
+            )
+        conn.commit()
+
+    # --- Tin nhắn ---
+    def append_message(self, course_id: str, session_id: str, role: str, content: str) -> int:
+        """Ghi thêm một tin nhắn vào cuộc trò chuyện của phiên, trả về ID của nó."""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "INSERT INTO messages (course_id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (course_id, session_id, role, content, time.time()),
+            )
+            conn.commit()
+            return cursor.lastrowid
+
+    def recent_messages(self, course_id: str, session_id: str, limit: int = CHAT_HISTORY_PAGE_SIZE,
+                        before_id: int | None = None) -> list[dict]:
+        """
+        Lấy tối đa `limit` tin nhắn mới nhất của phiên (cũ hơn `before_id` nếu có), theo thứ tự thời gian.
+
+        Returns:
+            list[dict]: Mỗi tin nhắn gồm id, role, content và created_at.
+        """
+        query = "SELECT id, role, content, created_at FROM messages WHERE course_id = ? AND session_id = ?"
+        params: list = [course_id, session_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [{"id": id_, "role": role, "content": content, "created_at": created_at}
+                for id_, role, content, created_at in reversed(rows)]
+
+    def count_messages(self, course_id: str, session_id: str) -> int:
+        """Tổng số tin nhắn của phiên trong khóa học."""
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(*) FROM messages WHERE course_id = ? AND session_id = ?", (course_id, session_id)).fetchone()[0]
+
+    # --- Ghi chú ---
+    def get_notes(self, course_id: str, session_id: str) -> str | None:
+        """Ghi chú của phiên trong khóa học (kể cả phần chưa kịp ghi xuống đĩa), hoặc None nếu chưa có."""
+        key = (course_id, session_id)
+        with self._lock:
+            if key in self._pending_notes:
+                return self._pending_notes[key]
+            row = self._connect().execute(
+                "SELECT content FROM notes WHERE course_id = ? AND session_id = ?", key).fetchone()
+        return row[0] if row else None
+
+    def save_notes(self, course_id: str, session_id: str, content: str):
+        """Lên lịch lưu ghi chú sau `debounce` giây; lần sửa mới hơn sẽ thay thế lần đang chờ."""
+        key = (course_id, session_id)
+        with self._lock:
+            if self.get_notes(course_id, session_id) == content:
+                return
+            self._pending_notes[key] = content
+            if key not in self._timers:
+                timer = threading.Timer(self.debounce, self.flush, args=(key,))
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+
+    def flush(self, key: tuple[str, str] | None = None):
+        """Ghi ngay các ghi chú đang chờ (của một cặp (khóa học, phiên), hoặc tất cả)."""
+        with self._lock:
+            keys = [key] if key is not None else list(self._pending_notes)
+            rows = []
+            for k in keys:
+                timer = self._timers.pop(k, None)
+                if timer is not None:
+                    timer.cancel()
+                if k in self._pending_notes:
+                    rows.append((*k, self._pending_notes.pop(k), time.time()))
+            if rows:
+                conn = self._connect()
+                conn.executemany("INSERT OR REPLACE INTO notes (course_id, session_id, content, updated_at) VALUES (?, ?, ?, ?)", rows)
+                conn.commit()
+
+    def remove_course(self, course_id: str):
+        """Xóa lịch sử chat và ghi chú (của mọi phiên) khi khóa học bị xóa."""
+        with self._lock:
+            for key in [key for key in self._pending_notes.keys() | self._timers.keys() if key[0] == course_id]:
+                timer = self._timers.pop(key, None)
+                if timer is not None:
+                    timer.cancel()
+                self._pending_notes.pop(key, None)
+            conn = self._connect()
+            conn.execute("DELETE FROM messages WHERE course_id = ?", (course_id,))
+            conn.execute("DELETE FROM notes WHERE course_id = ?", (course_id,))
+            conn.commit()
@@ -0,0 +1,168 @@
+# Ghi chú: Lọc nội dung lặp lại khi nạp tài liệu, để collection không phình to vì văn bản trùng.
+# Slide PDF và trang web thường lặp lại header, footer, menu điều hướng, thậm chí cả slide.
+# 1. BoilerplateStripper: các dòng ngắn xuất hiện trên nhiều trang của cùng tài liệu (so sánh
+#    sau khi bỏ khác biệt về khoảng trắng, hoa/thường và chữ số, vd: "Trang 3" ~ "Trang 4")
+#    được loại khỏi các trang trước khi chia chunk; trang lặp lại một trang trước đó (vd: slide
+#    lặp lại, mọi shingle đều có trong trang trước) bị làm rỗng. Slide dựng dần (trang sau thêm
+#    ý mới) được giữ nguyên. Chạy theo cửa sổ trang nên vẫn streaming.
+# 2. MinHash / LSH: mỗi chunk có một chữ ký MinHash (one-permutation hashing trên các shingle
+#    từ, băm bằng crc32). Chunk gần trùng (độ tương đồng Jaccard ước lượng >= ngưỡng) với một
+#    chunk khác của cùng tài liệu thì không được lưu lại. Chỉ so trong cùng tài liệu: nội dung
+#    của một tài liệu không bao giờ chỉ nằm trong chunk của tài liệu khác (có thể bị xóa / sửa).
+
+import re
+import zlib
+import struct
+from collections import Counter
+from typing import Iterable, Iterator
+from config import (
+    NEAR_DUPLICATE_THRESHOLD, NEAR_DUPLICATE_SHINGLE_WORDS, BOILERPLATE_WINDOW_PAGES,
+    BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_FRACTION, BOILERPLATE_MAX_LINE_CHARS, BOILERPLATE_MIN_PAGE_WORDS
+)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_DIGITS = re.compile(r"\d+")
+
+# Chữ ký gồm 64 ô; LSH chia thành 16 dải x 4 ô: hai chunk có Jaccard 0.9 gần như chắc chắn
+# trùng ít nhất một dải, còn hai chunk khác hẳn nhau hiếm khi phải so sánh.
+SIGNATURE_SIZE = 64
+LSH_BANDS = 16
+_ROWS = SIGNATURE_SIZE // LSH_BANDS
+_EMPTY = 0xFFFFFFFF
+
+def _line_key(line: str) -> str:
+    return _DIGITS.sub("#", " ".join(line.split()).casefold())
+
+class BoilerplateStripper:
+    """
+    Loại các dòng lặp lại trên nhiều trang. Một dòng (ngắn hơn `max_line_chars`) bị coi là
+    boilerplate khi đã xuất hiện trên ít nhất `min_pages` trang và trên ít nhất `min_fraction`
+    số trang đã đọc. Các trang được xử lý theo cửa sổ `window` trang; số lần xuất hiện được cộng
+    dồn qua các cửa sổ. Tài liệu chỉ có một trang (vd: văn bản dán vào) không bị thay đổi.
+    Trang (đã bỏ dòng lặp lại, có ít nhất `min_page_words` từ) gần trùng với một trang trước đó
+    và không có shingle nào mới (so sánh sau khi bỏ khác biệt về chữ số) được thay bằng trang
+    rỗng, để số trang của các trang sau không đổi.
+    """
+    def __init__(self, window: int = BOILERPLATE_WINDOW_PAGES, min_pages: int = BOILERPLATE_MIN_PAGES,
+                 min_fraction: float = BOILERPLATE_MIN_FRACTION, max_line_chars: int = BOILERPLATE_MAX_LINE_CHARS,
+                 min_page_words: int = BOILERPLATE_MIN_PAGE_WORDS, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.window = window
+        self.min_pages = min_pages
+        self.min_fraction = min_fraction
+        self.max_line_chars = max_line_chars
+        self.min_page_words = min_page_words
+        self.lines_removed = 0
+        self.chars_removed = 0
+        self.pages_removed = 0
+        self._pages = LSHIndex(threshold)
+        self._page_shingles: dict[str, frozenset[int]] = {}
+        self._counts: Counter = Counter()
+        self._pages_seen = 0
+
+    def _keys(self, text: str) -> set[str]:
+        return {_line_key(line) for line in text.splitlines() if line.strip() and len(line) <= self.max_line_chars}
+
+    def _flush(self, buffer: list) -> Iterator[str | tuple[str, dict]]:
+        threshold = max(self.min_pages, self.min_fraction * self._pages_seen)
+        repeated = {key for key, count in self._counts.items() if count >= threshold}
+        for page in buffer:
+            text, metadata = page if isinstance(page, tuple) else (page, None)
+            if repeated:
+                lines = []
+                for line in text.splitlines(keepends=True):
+                    if line.strip() and len(line) <= self.max_line_chars and _line_key(line) in repeated:
+                        self.lines_removed += 1
+                        self.chars_removed += len(line)
+                    else:
+                        lines.append(line)
+                text = "".join(lines)
+            if len(_WORD.findall(text)) >= self.min_page_words:
+                shingles = _shingles(_DIGITS.sub("#", text))
+                signature = _signature(shingles)
+                if any(shingles <= self._page_shingles[key] for key in self._pages.matches(signature)):
+                    self.pages_removed += 1
+                    self.chars_removed += len(text)
+                    text = ""
+                else:
+                    key = str(len(self._page_shingles))
+                    self._page_shingles[key] = shingles
+                    self._pages.add(key, signature)
+            yield (text, metadata) if metadata is not None else text
+
+    def strip(self, pages: Iterable[str | tuple[str, dict]]) -> Iterator[str | tuple[str, dict]]:
+        """Trả về các trang (giữ nguyên thứ tự, số trang và metadata) đã bỏ các dòng lặp lại."""
+        buffer = []
+        for page in pages:
+            buffer.append(page)
+            self._counts.update(self._keys(page[0] if isinstance(page, tuple) else page))
+            self._pages_seen += 1
+            if len(buffer) >= self.window:
+                yield from self._flush(buffer)
+                buffer = []
+        yield from self._flush(buffer)
+
+def _shingles(text: str, shingle_words: int = NEAR_DUPLICATE_SHINGLE_WORDS) -> frozenset[int]:
+    """Hash crc32 của các shingle (`shingle_words` từ liên tiếp, không phân biệt hoa/thường)."""
+    words = _WORD.findall(text.casefold())
+    if not words:
+        return frozenset()
+    return frozenset(zlib.crc32(" ".join(words[i:i + shingle_words]).encode("utf-8"))
+                     for i in range(max(1, len(words) - shingle_words + 1)))
+
+def minhash(text: str, shingle_words: int = NEAR_DUPLICATE_SHINGLE_WORDS) -> tuple[int, ...]:
+    """
+    Chữ ký MinHash của văn bản (one-permutation hashing): mỗi shingle được băm một lần,
+    6 bit thấp chọn ô, phần còn lại là giá trị; mỗi ô giữ giá trị nhỏ nhất. Ô rỗng mượn giá trị
+    của ô kế tiếp không rỗng, để văn bản ngắn vẫn có chữ ký đầy đủ.
+    """
+    return _signature(_shingles(text, shingle_words))
+
+def _signature(shingles: frozenset[int]) -> tuple[int, ...]:
+    bins = [_EMPTY] * SIGNATURE_SIZE
+    for h in shingles:
+        index, value = h & (SIGNATURE_SIZE - 1), h >> 6
+        if value < bins[index]:
+            bins[index] = value
+    if shingles:
+        filled = list(bins)
+        for i in range(SIGNATURE_SIZE):
+            j = i
+            while filled[j] == _EMPTY:
+                j = (j + 1) % SIGNATURE_SIZE
+            bins[i] = filled[j] if filled[i] == _EMPTY else filled[i]
+    return tuple(bins)
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Độ tương đồng Jaccard ước lượng từ hai chữ ký (tỉ lệ ô bằng nhau)."""
+    if a[0] == _EMPTY or b[0] == _EMPTY:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / SIGNATURE_SIZE
+
+def _buckets(signature: tuple[int, ...]) -> list[int]:
+    return [zlib.crc32(struct.pack(f"<{_ROWS}I", *signature[band * _ROWS:(band + 1) * _ROWS])) for band in range(LSH_BANDS)]
+
+class LSHIndex:
+    """Chỉ mục LSH trong bộ nhớ (các chunk của tài liệu đang nạp / đang dọn dẹp, hoặc các trang của tài liệu)."""
+    def __init__(self, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.signatures: dict[str, tuple[int, ...]] = {}
+        self._buckets: dict[tuple[int, int], list[str]] = {}
+
+    def add(self, key: str, signature: tuple[int, ...]):
+        self.signatures[key] = signature
+        for band, bucket in enumerate(_buckets(signature)):
+            self._buckets.setdefault((band, bucket), []).append(key)
+
+    def matches(self, signature: tuple[int, ...]) -> Iterator[str]:
+        """Khóa của các mục gần trùng với chữ ký."""
+        seen = set()
+        for band, bucket in enumerate(_buckets(signature)):
+            for key in self._buckets.get((band, bucket), ()):
+                if key not in seen:
+                    seen.add(key)
+                    if similarity(signature, self.signatures[key]) >= self.threshold:
+                        yield key
+
+    def find(self, signature: tuple[int, ...]) -> str | None:
+        """Khóa của một mục gần trùng với chữ ký, hoặc None."""
+        return next(self.matches(signature), None)
@@ -0,0 +1,229 @@
+# Ghi chú: Module trích xuất văn bản thô từ các nguồn (PDF, DOCX, URL, YouTube, Text).
+# Được tách khỏi core/services.py để có thể chạy trong process con (process pool)
+# mà không phải khởi tạo ChromaDB hay mô hình AI ở mỗi process.
+# Các thư viện phân tích (pypdf, python-docx, bs4) chỉ được import khi loại nguồn tương ứng
+# được dùng lần đầu, để việc import module này không làm chậm lúc khởi động ứng dụng.
+
+import io
+import os
+import re
+import shutil
+import hashlib
+import tempfile
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Iterator, TYPE_CHECKING
+from unicodedata import normalize
+from importlib.util import find_spec
+from config import PDF_PAGES_PER_TASK
+from core.fetcher import PageFetcher, FetchResult, get_fetcher
+from core.youtube import parse_video_id, get_transcript_service, segments_to_pages
+
+if TYPE_CHECKING:
+    from pypdf import PdfReader
+
+# Dùng parser lxml (nhanh hơn nhiều) nếu đã được cài, nếu không thì dùng parser có sẵn.
+HTML_PARSER = "lxml" if find_spec("lxml") else "html.parser"
+
+def slugify(value: str) -> str:
+    """
+    Chuyển đổi chuỗi Unicode (bao gồm Tiếng Việt) thành một chuỗi an toàn
+    để dùng làm ID hoặc tên file, tránh lỗi khi tương tác với hệ thống.
+    Đây là một hàm cực kỳ quan trọng để đảm bảo tính ổn định của hệ thống.
+
+    Args:
+        value (str): Chuỗi đầu vào cần xử lý.
+
+    Returns:
+        str: Chuỗi an toàn, đã được chuyển thành chữ thường, không dấu,
+             và thay thế khoảng trắng bằng dấu gạch ngang.
+    """
+    value = normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    value = re.sub(r'[^\w\s-]', '', value).strip().lower()
+    value = re.sub(r'[-\s]+', '-', value)
+    return value
+
+class DocumentProcessor:
+    """
+    Lớp này chịu trách nhiệm duy nhất cho việc trích xuất văn bản thô
+    từ các nguồn khác nhau (PDF, DOCX, URL, YouTube, Text).
+    Mỗi phương thức đều có error handling riêng để đảm bảo sự ổn định.
+    """
+    def __init__(self, fetcher: PageFetcher | None = None):
+        self._fetcher = fetcher
+
+    @property
+    def fetcher(self) -> PageFetcher:
+        """PageFetcher dùng để tải URL (mặc định là fetcher dùng chung của process)."""
+        return self._fetcher or get_fetcher()
+
+    def extract_text(self, source_type: str, source_data: any) -> tuple[str | None, str]:
+        """
+        Phương thức chính để trích xuất văn bản.
+
+        Args:
+            source_type (str): Loại nguồn ('pdf', 'docx', 'txt', 'url', 'text').
+            source_data (any): Dữ liệu nguồn (file object, chuỗi URL, chuỗi văn bản).
+
+        Returns:
+            tuple[str | None, str]: Một tuple chứa (nội dung văn bản, tên nguồn đã được xử lý).
+                                     Trả về (None, thông báo lỗi) nếu thất bại.
+        """
+        try:
+            if not source_data:
+                return None, "Nguồn dữ liệu rỗng."
+            
+            if source_type == 'pdf':
+                safe_name = slugify(source_data.name)
+                text = "".join(page + "\n" for page in self.iter_pdf_pages(source_data) if page)
+                return text, safe_name
+            
+            elif source_type == 'docx':
+                safe_name = slugify(source_data.name)
+                import docx
+                doc = docx.Document(source_data)
+                text = "\n".join([para.text for para in doc.paragraphs if para.text])
+                return text, safe_name
+            
+            elif source_type == 'txt':
+                # File văn bản thuần (.txt, .md), vd: khi nạp cả thư mục bằng cli.py.
+                safe_name = slugify(source_data.name)
+                return source_data.read().decode('utf-8', errors='replace'), safe_name
+
+            elif source_type == 'text':
+                # Mỗi đoạn văn bản dán có tên riêng theo nội dung, để không ghi đè lên đoạn dán trước đó.
+                digest = hashlib.sha256(source_data.encode('utf-8')).hexdigest()[:8]
+                return source_data, f"pasted-text-{digest}"
+                
+            elif source_type == 'url':
+                video_id = parse_video_id(source_data)
+                if video_id:
+                    segments = get_transcript_service().get(video_id)
+                    text = " ".join([item['text'] for item in segments])
+                    return text, f"youtube-{video_id}"
+
+                result = self.fetcher.fetch(source_data)
+                return self._web_page_text(result)
+                
+        except Exception as e:
+            return None, f"Lỗi khi xử lý nguồn: {str(e)}"
+        return None, "Loại nguồn không được hỗ trợ."
+
+    def extract_pages(self, source_type: str, source_data: any) -> tuple[list[str | tuple[str, dict]] | None, str]:
+        """
+        Giống extract_text nhưng giữ lại ranh giới trang của PDF (và mốc thời gian của
+        transcript YouTube) để ghi vào metadata của từng chunk. Các nguồn khác trả về
+        một "trang" duy nhất.
+        """
+        if source_type == 'pdf' and source_data:
+            try:
+                # Giữ cả trang rỗng (vd: trang scan) để số trang không bị lệch.
+                pages = list(self.iter_pdf_pages(source_data))
+                if not any(pages):
+                    return None, "Không trích xuất được văn bản từ file PDF."
+                return pages, slugify(source_data.name)
+            except Exception as e:
+                return None, f"Lỗi khi xử lý nguồn: {str(e)}"
+        if source_type == 'url' and source_data and parse_video_id(source_data):
+            # Transcript YouTube: mỗi segment là một "trang" kèm mốc thời gian.
+            video_id = parse_video_id(source_data)
+            try:
+                pages = segments_to_pages(get_transcript_service().get(video_id))
+                return (pages or None), f"youtube-{video_id}"
+            except Exception as e:
+                return None, f"Lỗi khi xử lý nguồn: {str(e)}"
+        text, source_name = self.extract_text(source_type, source_data)
+        return ([text] if text else None), source_name
+
+    def _web_page_text(self, result: FetchResult) -> tuple[str, str]:
+        """
+        Trích xuất nội dung chính của trang web. Chỉ duyệt cây HTML một lần: bỏ các thẻ
+        không phải nội dung, ưu tiên <article>/<main> nếu có, rồi lấy text của phần đó.
+        Nếu trang không đổi (HTTP 304), dùng lại văn bản đã trích xuất lần trước.
+        """
+        if result.extracted:
+            return result.extracted["text"], result.extracted["title"]
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(result.content, HTML_PARSER)
+        for tag in soup(["script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "footer", "header", "aside"]):
+            tag.decompose()
+        root = soup.find("article") or soup.find("main") or soup.find(attrs={"role": "main"}) or soup.body or soup
+        text = root.get_text(separator="\n", strip=True)
+        title = slugify(soup.title.string.strip() if soup.title and soup.title.string else result.url)
+        self.fetcher.remember_extracted(result.url, title, text)
+        return text, title
+
+    def extract_urls(self, urls: list[str]) -> list[tuple[str | None, str]]:
+        """
+        Trích xuất nhiều trang web cùng lúc: tải song song qua fetcher dùng chung,
+        sau đó phân tích từng trang. Kết quả theo đúng thứ tự, cùng định dạng với extract_text.
+        """
+        results = []
+        for url, result in zip(urls, self.fetcher.fetch_many(urls)):
+            if isinstance(result, Exception):
+                results.append((None, f"Lỗi khi tải {url}: {result}"))
+                continue
+            try:
+                results.append(self._web_page_text(result))
+            except Exception as e:
+                results.append((None, f"Lỗi khi xử lý nguồn: {str(e)}"))
+        return results
+
+    def iter_pdf_pages(self, source_data: any, executor: Executor | None = None,
+                       pages_per_task: int = PDF_PAGES_PER_TASK) -> Iterator[str]:
+        """
+        Đọc lần lượt từng trang PDF (generator), mỗi trang chỉ gọi extract_text() một lần.
+        Trang rỗng được trả về dưới dạng "" để giữ đúng số trang.
+
+        Nếu có `executor` (process pool) và file đủ lớn, các khoảng trang được trích xuất
+        song song trong các process con. Số tác vụ đang chạy bị giới hạn, nên bộ nhớ chỉ
+        chứa một "cửa sổ" trang thay vì toàn bộ cuốn sách.
+
+        Args:
+            source_data (any): File object, bytes hoặc đường dẫn tới file PDF.
+            executor (Executor | None): Process pool dùng để trích xuất song song.
+            pages_per_task (int): Số trang trong mỗi tác vụ gửi sang process con.
+        """
+        if isinstance(source_data, bytes):
+            source_data = io.BytesIO(source_data)
+        from pypdf import PdfReader
+        reader = PdfReader(source_data)
+        num_pages = len(reader.pages)
+        if executor is None or num_pages <= pages_per_task:
+            for page in reader.pages:
+                yield page.extract_text() or ""
+            return
+
+        # Process con cần một đường dẫn để tự mở file: ghi ra file tạm nếu nguồn là file object.
+        path, temp_path = source_data if isinstance(source_data, str) else None, None
+        if path is None:
+            source_data.seek(0)
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                shutil.copyfileobj(source_data, tmp)
+                path = temp_path = tmp.name
+        try:
+            ranges = iter([(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)])
+            max_in_flight = max(2, getattr(executor, "_max_workers", 2) * 2)
+            pending = deque(executor.submit(_extract_pdf_page_range, path, start, stop) for start, stop in islice(ranges, max_in_flight))
+            while pending:
+                pages = pending.popleft().result()
+                for start, stop in islice(ranges, 1):
+                    pending.append(executor.submit(_extract_pdf_page_range, path, start, stop))
+                yield from pages
+        finally:
+            if temp_path:
+                os.remove(temp_path)
+
+# Cache PdfReader trong mỗi process con, để các khoảng trang liên tiếp của cùng
+# một file không phải phân tích lại cấu trúc PDF từ đầu.
+_worker_reader: "tuple[str, PdfReader] | None" = None
+
+def _extract_pdf_page_range(path: str, start: int, stop: int) -> list[str]:
+    """Chạy trong process con: trích xuất văn bản các trang [start, stop) của file PDF."""
+    global _worker_reader
+    if _worker_reader is None or _worker_reader[0] != path:
+        from pypdf import PdfReader
+        _worker_reader = (path, PdfReader(path))
+    reader = _worker_reader[1]
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
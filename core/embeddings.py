@@ -0,0 +1,155 @@
+# Ghi chú: Tầng embedding dùng chung cho CourseManager (khi thêm tài liệu) và AIService
+# (khi truy vấn). Trước đây ChromaDB tự embed bằng hàm mặc định ở mỗi lần add/query;
+# giờ mọi vector đều đi qua đây để:
+# 1. Dùng đúng mô hình cấu hình trong config.EMBEDDING_MODEL_NAME (có thể thay backend).
+# 2. Gọi API theo lô (batch) thay vì từng đoạn một.
+# 3. Tái sử dụng vector qua một cache trên đĩa (hash -> vector, giới hạn kích thước, LRU),
+#    dùng chung giữa các khóa học và giữa các lần khởi động lại.
+
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from array import array
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from config import (
+    GEMINI_API_KEY, EMBEDDING_MODEL_NAME, EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+)
+
+# Loại tác vụ embedding (Gemini tối ưu vector khác nhau cho tài liệu và câu hỏi).
+TASK_DOCUMENT = "retrieval_document"
+TASK_QUERY = "retrieval_query"
+
+@lru_cache(maxsize=None)
+def get_genai():
+    """Import và cấu hình google.generativeai một lần, ở lần gọi API đầu tiên."""
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+class EmbeddingBackend(ABC):
+    """Giao diện chung cho một nhà cung cấp embedding. Lớp con cần cài đặt `_embed_batch`."""
+    name = "base"
+
+    def __init__(self, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.batch_size = batch_size
+
+    def embed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        """Embed một danh sách văn bản, tự chia thành các lô theo `batch_size`."""
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[i:i + self.batch_size], task_type))
+        return vectors
+
+    @abstractmethod
+    def _embed_batch(self, texts: list[str], task_type: str) -> list[list[float]]:
+        """Embed một lô văn bản (không quá `batch_size`)."""
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """Embedding qua Gemini API với mô hình trong config.EMBEDDING_MODEL_NAME."""
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, batch_size: int = EMBEDDING_BATCH_SIZE):
+        super().__init__(batch_size)
+        self.model_name = model_name
+        self.name = f"gemini:{model_name}"
+
+    def _embed_batch(self, texts: list[str], task_type: str) -> list[list[float]]:
+        result = get_genai().embed_content(model=self.model_name, content=texts, task_type=task_type)
+        return result["embedding"]
+
+class EmbeddingCache:
+    """
+    Cache vector trên đĩa bằng SQLite. Mỗi lần đọc trúng sẽ cập nhật `last_used`;
+    khi vượt quá `max_entries`, các vector lâu không dùng nhất sẽ bị xóa (LRU).
+    """
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        return self._conn
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Lấy các vector có trong cache, trả về {key: vector}."""
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            # SQLite giới hạn số tham số trong một câu lệnh, nên truy vấn theo từng lô.
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch):
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                conn.commit()
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        """Lưu các vector mới vào cache và dọn bớt nếu vượt quá giới hạn."""
+        if not items: return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                # Xóa dư ra 10% để không phải dọn dẹp ở mỗi lần ghi.
+                excess = count - int(self.max_entries * 0.9)
+                conn.execute("DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+            conn.commit()
+
+class EmbeddingMismatchError(ValueError):
+    """Collection của khóa học được tạo bằng mô hình embedding khác (hoặc số chiều khác) với embedder hiện tại."""
+
+class Embedder:
+    """
+    Điểm truy cập duy nhất để lấy embedding: tra cache trước, chỉ gửi các đoạn
+    chưa có vector lên backend (theo lô), rồi ghi kết quả ngược lại vào cache.
+    """
+    def __init__(self, backend: EmbeddingBackend | None = None, cache: EmbeddingCache | None = None):
+        self.backend = backend or GeminiEmbeddingBackend()
+        self.cache = cache or EmbeddingCache()
+        self._dimensions: int | None = None
+
+    def dimensions(self) -> int:
+        """Số chiều vector của backend hiện tại (embed thử một lần rồi ghi nhớ)."""
+        if self._dimensions is None:
+            self._dimensions = len(self.embed_query("PNote"))
+        return self._dimensions
+
+    def _key(self, text: str, task_type: str) -> str:
+        # Key gồm cả backend và loại tác vụ, vì cùng một đoạn văn có vector khác nhau theo từng mô hình.
+        return hashlib.sha256(f"{self.backend.name}|{task_type}|{text}".encode("utf-8")).hexdigest()
+
+    def embed(self, texts: list[str], task_type: str = TASK_DOCUMENT) -> list[list[float]]:
+        """Embed danh sách văn bản, giữ nguyên thứ tự đầu vào."""
+        keys = [self._key(text, task_type) for text in texts]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            new_vectors = dict(zip(missing, self.backend.embed(list(missing.values()), task_type)))
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed các chunk tài liệu trước khi lưu vào ChromaDB."""
+        return self.embed(texts, TASK_DOCUMENT)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed một câu hỏi để truy vấn ChromaDB."""
+        return self.embed([text], TASK_QUERY)[0]
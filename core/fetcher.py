@@ -0,0 +1,162 @@
+# Ghi chú: Tầng tải trang web cho nguồn URL.
+# - Dùng chung MỘT requests.Session (connection pooling, keep-alive) cho mỗi process.
+# - Luôn có timeout và tự thử lại (backoff) với các lỗi tạm thời (429, 5xx, mất kết nối).
+# - Cache phản hồi trên đĩa, gửi kèm If-None-Match / If-Modified-Since để server trả
+#   304 khi trang không đổi; khi đó dùng lại cả nội dung lẫn văn bản đã trích xuất.
+# - Có thể tải nhiều URL song song (fetch_many).
+# Mọi thứ đều cấu hình qua constructor, nên có thể chạy với một HTTP server giả lập cục bộ.
+# requests chỉ được import khi tạo Session lần đầu (không làm chậm lúc khởi động ứng dụng).
+
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from config import HTTP_CACHE_DIR, HTTP_TIMEOUT, HTTP_MAX_RETRIES, HTTP_MAX_CONCURRENCY
+
+if TYPE_CHECKING:
+    import requests
+
+USER_AGENT = "Mozilla/5.0 (compatible; PNote/2.0)"
+
+@dataclass
+class FetchResult:
+    """Kết quả tải một URL. `extracted` là văn bản đã trích xuất từ lần trước (nếu trang không đổi)."""
+    url: str
+    content: bytes
+    headers: dict = field(default_factory=dict)
+    from_cache: bool = False
+    extracted: dict | None = None
+
+def build_session(max_retries: int = HTTP_MAX_RETRIES, pool_size: int = HTTP_MAX_CONCURRENCY) -> "requests.Session":
+    """Tạo một Session có connection pool và chính sách thử lại cho các lỗi tạm thời."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+class PageFetcher:
+    """
+    Tải trang web qua Session dùng chung, có cache trên đĩa theo ETag/Last-Modified.
+    Mỗi URL được lưu thành hai file trong `cache_dir`: <hash>.json (header, validator,
+    văn bản đã trích xuất) và <hash>.body (nội dung gốc).
+    """
+    def __init__(self, cache_dir: str | None = HTTP_CACHE_DIR, timeout: float | tuple = HTTP_TIMEOUT,
+                 session: "requests.Session | None" = None):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self._session = session
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        """Session dùng chung, được tạo ở lần tải đầu tiên."""
+        with self._session_lock:
+            if self._session is None:
+                self._session = build_session()
+            return self._session
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json"), os.path.join(self.cache_dir, f"{key}.body")
+
+    def _load(self, url: str) -> tuple[dict, bytes] | None:
+        if not self.cache_dir: return None
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, url: str, meta: dict):
+        meta_path, _ = self._paths(url)
+        tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def _store(self, url: str, response: "requests.Response"):
+        if not self.cache_dir: return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        _, body_path = self._paths(url)
+        tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp_path, body_path)
+        self._write_meta(url, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type", ""),
+            "fetched_at": time.time(),
+            "extracted": None,
+        })
+
+    def fetch(self, url: str) -> FetchResult:
+        """
+        Tải một URL. Nếu đã có bản cache kèm ETag/Last-Modified, gửi yêu cầu có điều kiện;
+        server trả 304 thì dùng lại bản cache (kèm văn bản đã trích xuất, nếu có).
+        Ném ra requests.RequestException nếu tải thất bại sau khi đã thử lại.
+        """
+        cached = self._load(url)
+        headers = {}
+        if cached:
+            meta, _ = cached
+            if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            meta, body = cached
+            return FetchResult(url, body, {"Content-Type": meta.get("content_type", "")}, from_cache=True, extracted=meta.get("extracted"))
+        response.raise_for_status()
+        if response.headers.get("ETag") or response.headers.get("Last-Modified"):
+            self._store(url, response)
+        return FetchResult(url, response.content, dict(response.headers))
+
+    def remember_extracted(self, url: str, title: str, text: str):
+        """Lưu văn bản đã trích xuất vào cache, để lần tải sau (nhận 304) không phải phân tích lại HTML."""
+        cached = self._load(url)
+        if not cached: return
+        meta, _ = cached
+        meta["extracted"] = {"title": title, "text": text}
+        self._write_meta(url, meta)
+
+    def fetch_many(self, urls: list[str], max_workers: int = HTTP_MAX_CONCURRENCY) -> list[FetchResult | Exception]:
+        """Tải nhiều URL song song. Kết quả theo đúng thứ tự đầu vào; URL lỗi trả về Exception."""
+        def fetch_one(url):
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                return e
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+            return list(pool.map(fetch_one, urls))
+
+_default_fetcher: PageFetcher | None = None
+_default_fetcher_lock = threading.Lock()
+
+def get_fetcher() -> PageFetcher:
+    """PageFetcher dùng chung cho toàn process (chia sẻ connection pool)."""
+    global _default_fetcher
+    with _default_fetcher_lock:
+        if _default_fetcher is None:
+            _default_fetcher = PageFetcher()
+        return _default_fetcher
@@ -0,0 +1,45 @@
+# Ghi chú: Khóa file giữa các process cho các file JSON dùng chung (catalog, manifest).
+# Ứng dụng Streamlit và CLI (cli.py) có thể ghi cùng một file: mỗi lần ghi phải đọc lại file
+# trên đĩa và gộp thay đổi trong lúc giữ khóa, nếu không process này sẽ ghi đè mất dữ liệu
+# process kia vừa thêm. Khóa là một file "<đường dẫn>.lock" bên cạnh, dùng flock (POSIX)
+# hoặc msvcrt.locking (Windows).
+
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Giữ khóa độc quyền (giữa các process) trên `path` trong khối `with`."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def file_version(path: str) -> tuple[int, int, int] | None:
+    """
+    Phiên bản của file trên đĩa (inode, thời điểm sửa đổi, kích thước), hoặc None nếu file chưa
+    tồn tại; dùng để biết khi nào phải đọc lại. Ghi kiểu os.replace luôn đổi inode.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
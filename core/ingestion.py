@@ -0,0 +1,248 @@
+# Ghi chú: Hệ thống xử lý tài liệu chạy nền (background ingestion).
+# - Bước trích xuất văn bản (PDF, DOCX, URL...) chạy song song trong một process pool.
+# - Bước chia chunk / embed / ghi vào ChromaDB chạy tuần tự trong MỘT worker thread,
+#   để không có hai luồng cùng ghi vào một collection.
+# - PDF lớn được xử lý theo kiểu streaming: các trang được đọc (song song) và ghi theo
+#   từng lô, nên bộ nhớ không phải chứa toàn bộ văn bản của cuốn sách.
+# Các job sống ở cấp process (không nằm trong st.session_state), nên công việc vẫn
+# được hoàn tất và lưu lại kể cả khi người dùng rerun hoặc rời khỏi trang.
+
+import io
+import queue
+import threading
+import time
+import uuid
+import hashlib
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from config import INGESTION_MAX_WORKERS, INGESTION_MAX_FINISHED_JOBS, PDF_STREAMING_MIN_BYTES
+from core.documents import DocumentProcessor, slugify
+from core.metrics import get_metrics
+from core.youtube import parse_video_id, get_transcript_service, segments_to_pages
+
+# --- Trạng thái của từng nguồn tài liệu trong một job ---
+PENDING = "pending"
+EXTRACTING = "extracting"
+INDEXING = "indexing"
+DONE = "done"
+FAILED = "failed"
+
+def _extract_in_worker(source_type: str, label: str, payload: any) -> tuple[list[str] | None, str, float]:
+    """
+    Hàm chạy trong process con. File được truyền dưới dạng bytes (vì đối tượng
+    UploadedFile của Streamlit không pickle được) và được bọc lại thành file object.
+    Trả về (các trang, tên nguồn hoặc thông báo lỗi, thời gian trích xuất tính bằng ms).
+    """
+    start = time.perf_counter()
+    if isinstance(payload, bytes):
+        source_data = io.BytesIO(payload)
+        source_data.name = label
+    else:
+        source_data = payload
+    pages, source_name = DocumentProcessor().extract_pages(source_type, source_data)
+    return pages, source_name, (time.perf_counter() - start) * 1000
+
+@dataclass
+class SourceStatus:
+    """Tiến độ xử lý của một nguồn tài liệu trong job."""
+    label: str
+    source_type: str
+    status: str = PENDING
+    chunks: int = 0
+    error: str | None = None
+
+@dataclass
+class IngestionJob:
+    """Một lần bấm "Xử lý và Thêm": gồm nhiều nguồn tài liệu cho cùng một khóa học."""
+    job_id: str
+    course_id: str
+    sources: list[SourceStatus]
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    @property
+    def done(self) -> bool:
+        return all(s.status in (DONE, FAILED) for s in self.sources)
+
+    @property
+    def progress(self) -> float:
+        if not self.sources: return 1.0
+        return sum(s.status in (DONE, FAILED) for s in self.sources) / len(self.sources)
+
+    @property
+    def failures(self) -> list[SourceStatus]:
+        return [s for s in self.sources if s.status == FAILED]
+
+class IngestionManager:
+    """
+    Quản lý các job xử lý tài liệu. Giao diện chỉ cần gọi `submit` để nhận job ID,
+    sau đó định kỳ gọi `get_job` / `jobs_for_course` để hiển thị tiến độ.
+    """
+    def __init__(self, course_manager, max_workers: int = INGESTION_MAX_WORKERS):
+        self.course_manager = course_manager
+        self.metrics = getattr(course_manager, "metrics", None) or get_metrics()
+        self.max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._jobs: dict[str, IngestionJob] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: threading.Thread | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Khởi tạo process pool khi cần. Dùng 'spawn' để process con không kế thừa các thread của Streamlit/ChromaDB."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _ensure_writer(self):
+        """Khởi động worker thread ghi dữ liệu (chỉ một thread cho toàn process)."""
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._writer_loop, name="pnote-ingestion-writer", daemon=True)
+            self._writer.start()
+
+    def submit(self, course_id: str, sources: list[tuple[str, str, any]]) -> str:
+        """
+        Tạo một job mới và đưa các nguồn vào hàng đợi xử lý.
+
+        Args:
+            course_id (str): ID khóa học nhận tài liệu.
+            sources (list): Danh sách (source_type, nhãn hiển thị, dữ liệu). Với file,
+                            dữ liệu là bytes và nhãn là tên file; với URL/text là chuỗi.
+
+        Returns:
+            str: ID của job, dùng để theo dõi tiến độ.
+        """
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex[:8],
+            course_id=course_id,
+            sources=[SourceStatus(label=label, source_type=source_type) for source_type, label, _ in sources],
+        )
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune_finished_jobs()
+        self._ensure_writer()
+
+        for index, (source_type, label, payload) in enumerate(sources):
+            job.sources[index].status = EXTRACTING
+            if source_type == 'pdf' and isinstance(payload, bytes) and len(payload) >= PDF_STREAMING_MIN_BYTES:
+                # PDF lớn: không trích xuất cả file một lần mà đọc từng cửa sổ trang ngay trong
+                # worker thread (các khoảng trang vẫn được trích xuất song song trong process pool).
+                self._queue.put((job, index, partial(self._index_streaming_pdf, job, index, label, payload)))
+                continue
+            video_id = parse_video_id(payload) if source_type == 'url' else None
+            if video_id:
+                # Video YouTube: tải transcript (có cache) trong thread pool riêng, giới hạn số luồng.
+                future = get_transcript_service().submit(video_id)
+                future.add_done_callback(lambda f, job=job, index=index, video_id=video_id: self._queue.put(
+                    (job, index, partial(self._index_transcript, job, index, video_id, f))))
+                continue
+            try:
+                future = self._get_executor().submit(_extract_in_worker, source_type, label, payload)
+            except BrokenProcessPool:
+                # Process pool bị hỏng (vd: process con bị kill) -> tạo lại và thử một lần nữa.
+                self._executor = None
+                future = self._get_executor().submit(_extract_in_worker, source_type, label, payload)
+            # Hash của file gốc được ghi vào manifest, để lần thêm lại file không đổi được bỏ qua ngay.
+            source_hash = hashlib.sha256(payload).hexdigest() if isinstance(payload, bytes) else None
+            future.add_done_callback(lambda f, job=job, index=index, source_hash=source_hash: self._queue.put(
+                (job, index, partial(self._index_source, job, index, f, source_hash))))
+        return job.job_id
+
+    def shutdown(self):
+        """Dừng process pool (dùng cho các tiến trình chạy một lần như CLI)."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _writer_loop(self):
+        """Vòng lặp của worker thread: nhận kết quả trích xuất và ghi vào ChromaDB."""
+        while True:
+            job, index, handler = self._queue.get()
+            try:
+                handler()
+            finally:
+                if job.done and job.finished_at is None:
+                    job.finished_at = time.time()
+                self._queue.task_done()
+
+    def _fail(self, job: IngestionJob, source: SourceStatus, error: str):
+        """Đánh dấu nguồn bị lỗi và đếm lỗi theo khóa học / loại nguồn."""
+        source.status, source.error = FAILED, error
+        self.metrics.increment("errors", course=job.course_id, tool="ingest", source_type=source.source_type)
+
+    def _index_source(self, job: IngestionJob, index: int, future: Future, source_hash: str | None = None):
+        source = job.sources[index]
+        try:
+            pages, source_name, extract_ms = future.result()
+            self.metrics.observe("ingest.extract", extract_ms, course=job.course_id, source_type=source.source_type)
+        except Exception as e:
+            self._fail(job, source, f"Lỗi khi trích xuất: {e}")
+            return
+        if not pages:
+            self._fail(job, source, source_name)
+            return
+        source.status = INDEXING
+        try:
+            source.chunks = self.course_manager.add_document(job.course_id, pages, source_name, source_hash=source_hash)
+            source.status = DONE
+        except Exception as e:
+            self._fail(job, source, f"Lỗi khi lưu vào cơ sở dữ liệu: {e}")
+
+    def _index_transcript(self, job: IngestionJob, index: int, video_id: str, future: Future):
+        source = job.sources[index]
+        try:
+            pages = segments_to_pages(future.result())
+        except Exception as e:
+            self._fail(job, source, f"Lỗi khi tải transcript YouTube: {e}")
+            return
+        if not pages:
+            self._fail(job, source, "Video không có transcript.")
+            return
+        source.status = INDEXING
+        try:
+            source.chunks = self.course_manager.add_document(job.course_id, pages, f"youtube-{video_id}")
+            source.status = DONE
+        except Exception as e:
+            self._fail(job, source, f"Lỗi khi lưu vào cơ sở dữ liệu: {e}")
+
+    def _index_streaming_pdf(self, job: IngestionJob, index: int, label: str, payload: bytes):
+        source = job.sources[index]
+        source.status = INDEXING
+        try:
+            pages = DocumentProcessor().iter_pdf_pages(payload, executor=self._get_executor())
+            source.chunks = self.course_manager.add_document(
+                job.course_id, pages, slugify(label), source_hash=hashlib.sha256(payload).hexdigest()
+            )
+            source.status = DONE
+        except Exception as e:
+            self._fail(job, source, f"Lỗi khi xử lý file PDF: {e}")
+
+    def _prune_finished_jobs(self):
+        """Chỉ giữ lại một số lượng giới hạn các job đã xong (gọi khi đang giữ lock)."""
+        finished = sorted((j for j in self._jobs.values() if j.done), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - INGESTION_MAX_FINISHED_JOBS)]:
+            del self._jobs[job.job_id]
+
+    def get_job(self, job_id: str) -> IngestionJob | None:
+        """Lấy thông tin một job theo ID."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs_for_course(self, course_id: str) -> list[IngestionJob]:
+        """Liệt kê các job của một khóa học, mới nhất trước."""
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if j.course_id == course_id]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def has_active_jobs(self, course_id: str) -> bool:
+        """Kiểm tra khóa học có job nào đang chạy hay không."""
+        return any(not j.done for j in self.jobs_for_course(course_id))
+
+    def clear_finished(self, course_id: str):
+        """Xóa các job đã hoàn tất của khóa học khỏi danh sách theo dõi."""
+        with self._lock:
+            for job_id in [j.job_id for j in self._jobs.values() if j.course_id == course_id and j.done]:
+                del self._jobs[job_id]
@@ -0,0 +1,181 @@
+# Ghi chú: Tầng mô hình ngôn ngữ (LLM) có thể thay thế.
+# AIService và Embedder không gọi thẳng Gemini nữa mà đi qua một LLMBackend:
+# - GeminiBackend: gọi Gemini API như trước (sinh văn bản + embedding).
+# - LocalBackend: bản thay thế chạy cục bộ, không cần mạng hay API key, cho kết quả
+#   xác định (cùng prompt -> cùng câu trả lời) và độ trễ cấu hình được. Dùng để kiểm thử
+#   tải, chạy benchmark (benchmarks/pipeline.py) hoặc CI.
+# Chọn backend bằng biến môi trường PNOTE_LLM_BACKEND ("gemini" hoặc "local").
+
+import re
+import json
+import time
+import zlib
+import math
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Iterator, NamedTuple
+from config import (
+    GENERATIVE_MODEL_NAME, LLM_BACKEND, LOCAL_LLM_LATENCY_SECONDS, LOCAL_LLM_TOKEN_LATENCY_SECONDS,
+    LOCAL_EMBEDDING_DIMENSIONS
+)
+from core.embeddings import EmbeddingBackend, GeminiEmbeddingBackend, get_genai
+from core.chunking import count_tokens
+
+class Generation(NamedTuple):
+    """
+    Một phản hồi (hoặc một phần phản hồi khi streaming) của mô hình. Số token có thể là
+    None nếu backend không báo; khi streaming, số token chỉ có ở phần cuối cùng.
+    """
+    text: str
+    prompt_tokens: int | None = None
+    response_tokens: int | None = None
+
+class LLMBackend(ABC):
+    """Giao diện chung cho một nhà cung cấp mô hình: sinh văn bản (thường / streaming) và embedding."""
+    name = "base"
+
+    @abstractmethod
+    def generate(self, prompt: str) -> Generation:
+        """Sinh toàn bộ câu trả lời cho `prompt`."""
+
+    def stream(self, prompt: str) -> Iterator[Generation]:
+        """Mặc định: sinh toàn bộ rồi trả về một lần."""
+        yield self.generate(prompt)
+
+    @abstractmethod
+    def embedding_backend(self) -> EmbeddingBackend:
+        """Backend embedding đi cùng nhà cung cấp này."""
+
+class GeminiBackend(LLMBackend):
+    """Gemini API (google.generativeai), mô hình được tạo ở lần gọi đầu tiên."""
+    def __init__(self, model_name: str = GENERATIVE_MODEL_NAME):
+        self.model_name = model_name
+        self.name = f"gemini:{model_name}"
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = get_genai().GenerativeModel(self.model_name)
+            return self._model
+
+    @staticmethod
+    def _usage(response) -> tuple[int | None, int | None]:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None)
+
+    def generate(self, prompt: str) -> Generation:
+        response = self.model.generate_content(prompt)
+        return Generation(response.text, *self._usage(response))
+
+    def stream(self, prompt: str) -> Iterator[Generation]:
+        for chunk in self.model.generate_content(prompt, stream=True):
+            # usage_metadata của mỗi phần là số token lũy kế của cả lượt gọi (đầy đủ ở phần cuối cùng);
+            # LLMScheduler chỉ dùng giá trị mới nhất.
+            yield Generation(chunk.text, *self._usage(chunk))
+
+    def embedding_backend(self) -> EmbeddingBackend:
+        return GeminiEmbeddingBackend()
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SENTENCE = re.compile(r"[^.!?\n]+[.!?]?")
+_QUIZ_COUNT = re.compile(r"tạo ra (\d+) câu hỏi")
+_KEYWORD_COUNT = re.compile(r"xác định (\d+) từ khóa")
+_CONTEXT = re.compile(r"---(.*)---", re.DOTALL)
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    Embedding cục bộ bằng "hashing trick": mỗi từ được băm (crc32) vào một chiều với dấu ±,
+    rồi chuẩn hóa. Văn bản có nhiều từ chung sẽ có vector gần nhau, đủ để kiểm thử truy xuất.
+    """
+    def __init__(self, dimensions: int = LOCAL_EMBEDDING_DIMENSIONS, latency: float = 0.0):
+        super().__init__()
+        self.dimensions = dimensions
+        self.latency = latency
+        self.name = f"local:hash-{dimensions}"
+
+    def _vector(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for word in _WORD.findall(text.lower()):
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dimensions] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def _embed_batch(self, texts: list[str], task_type: str) -> list[list[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+class LocalBackend(LLMBackend):
+    """
+    Mô hình giả lập, xác định: câu trả lời chỉ phụ thuộc vào prompt. Nhận diện các prompt của
+    AIService để trả về đúng định dạng (JSON cho quiz, mỗi dòng một từ khóa...), còn lại trả về
+    vài câu đầu của phần ngữ cảnh dưới dạng gạch đầu dòng.
+
+    Args:
+        latency (float): Độ trễ cố định mỗi lời gọi (giây), mô phỏng thời gian tới token đầu tiên.
+        token_latency (float): Độ trễ thêm cho mỗi token phản hồi (giây).
+    """
+    def __init__(self, latency: float = LOCAL_LLM_LATENCY_SECONDS, token_latency: float = LOCAL_LLM_TOKEN_LATENCY_SECONDS,
+                 embedding_dimensions: int = LOCAL_EMBEDDING_DIMENSIONS):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.embedding_dimensions = embedding_dimensions
+        self.name = "local"
+
+    @staticmethod
+    def _context(prompt: str) -> str:
+        match = _CONTEXT.search(prompt)
+        return (match.group(1) if match else prompt).strip()
+
+    def _respond(self, prompt: str) -> str:
+        context = self._context(prompt)
+        if prompt.startswith("Translate the following text to"):
+            header, _, text = prompt.partition("\n\n")
+            language = header[len("Translate the following text to "):].split(".")[0]
+            return f"[{language}] {text}"
+        words = [word for word in _WORD.findall(context.lower()) if len(word) > 2]
+        if match := _QUIZ_COUNT.search(prompt):
+            terms = [word for word, _ in Counter(words).most_common(int(match.group(1)) + 3)] or ["?"]
+            return json.dumps([
+                {"question": f"Khái niệm nào sau đây xuất hiện trong tài liệu? ({i + 1})",
+                 "options": [terms[(i + k) % len(terms)] for k in range(4)],
+                 "answer": terms[i % len(terms)]}
+                for i in range(int(match.group(1)))
+            ], ensure_ascii=False)
+        if match := _KEYWORD_COUNT.search(prompt):
+            return "\n".join(word for word, _ in Counter(words).most_common(int(match.group(1))))
+        sentences = [s.strip() for s in _SENTENCE.findall(context) if s.strip()]
+        return "\n".join(f"- {sentence}" for sentence in sentences[:3]) or "Tôi không tìm thấy thông tin này trong tài liệu."
+
+    def generate(self, prompt: str) -> Generation:
+        text = self._respond(prompt)
+        response_tokens = count_tokens(text)
+        time.sleep(self.latency + self.token_latency * response_tokens)
+        return Generation(text, count_tokens(prompt), response_tokens)
+
+    def stream(self, prompt: str) -> Iterator[Generation]:
+        text = self._respond(prompt)
+        time.sleep(self.latency)
+        parts = re.findall(r"\S+\s*", text) or [text]
+        for i in range(0, len(parts), 8):
+            part = "".join(parts[i:i + 8])
+            time.sleep(self.token_latency * count_tokens(part))
+            last = i + 8 >= len(parts)
+            yield Generation(part, count_tokens(prompt) if last else None, count_tokens(text) if last else None)
+
+    def embedding_backend(self) -> EmbeddingBackend:
+        return LocalEmbeddingBackend(self.embedding_dimensions)
+
+_BACKENDS = {"gemini": GeminiBackend, "local": LocalBackend}
+
+def create_llm_backend(name: str = LLM_BACKEND) -> LLMBackend:
+    """Tạo backend theo tên ("gemini" hoặc "local")."""
+    try:
+        return _BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Backend LLM không hợp lệ: {name!r} (chọn một trong {', '.join(_BACKENDS)}).") from None
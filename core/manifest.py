@@ -0,0 +1,115 @@
+# Ghi chú: Sổ ghi nhận (manifest) các nguồn tài liệu đã được thêm vào mỗi khóa học.
+# Mỗi khóa học có một file JSON riêng nằm cạnh ChromaDB, lưu cho từng nguồn:
+# hash nội dung, tên nguồn, số chunk, số token, danh sách ID chunk và thời điểm thêm.
+# Nhờ đó việc thêm lại một tài liệu không đổi gần như không tốn chi phí, và một
+# tài liệu đã chỉnh sửa chỉ cần thay thế những chunk thực sự khác biệt.
+# Ứng dụng và CLI có thể cùng ghi manifest của một khóa học: file được đọc lại khi đổi trên đĩa,
+# và mỗi lần ghi đọc lại file rồi gộp thay đổi trong lúc giữ khóa file (core/filelock.py).
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Callable
+from config import CHROMA_DB_PATH
+from core.filelock import file_lock, file_version
+
+def content_hash(text: str) -> str:
+    """Tính hash SHA-256 của một chuỗi văn bản (dùng cho cả tài liệu và chunk)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class SourceManifest:
+    """
+    Lưu trữ manifest của các khóa học dưới dạng file JSON, có cache trong bộ nhớ (đọc lại khi
+    file bị process khác thay đổi). Việc ghi file là atomic (ghi ra file tạm rồi os.replace) để
+    không bao giờ để lại một manifest hỏng nếu process bị dừng giữa chừng.
+    """
+    def __init__(self, root: str = os.path.join(CHROMA_DB_PATH, "manifests")):
+        self.root = root
+        self._cache: dict[str, dict] = {}
+        self._versions: dict[str, tuple | None] = {}
+        self._lock = threading.RLock()
+
+    def _path(self, course_id: str) -> str:
+        return os.path.join(self.root, f"{course_id}.json")
+
+    def _read(self, course_id: str) -> dict[str, dict]:
+        try:
+            with open(self._path(course_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def load(self, course_id: str) -> dict[str, dict]:
+        """Đọc manifest của khóa học: {tên nguồn: thông tin nguồn}. Không được sửa trực tiếp kết quả."""
+        with self._lock:
+            version = file_version(self._path(course_id))
+            if course_id not in self._cache or self._versions[course_id] != version:
+                self._cache[course_id], self._versions[course_id] = self._read(course_id), version
+            return self._cache[course_id]
+
+    def _update(self, course_id: str, change: Callable[[dict[str, dict]], None]):
+        """
+        Đọc lại manifest trên đĩa trong lúc giữ khóa file, áp dụng `change` rồi ghi lại, để không
+        ghi đè các nguồn mà process khác (vd: CLI) vừa thêm.
+        """
+        path = self._path(course_id)
+        with self._lock, file_lock(path):
+            sources = self._read(course_id)
+            change(sources)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(sources, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._cache[course_id], self._versions[course_id] = sources, file_version(path)
+
+    def get(self, course_id: str, source_name: str) -> dict | None:
+        """Lấy thông tin một nguồn trong manifest, hoặc None nếu chưa có."""
+        return self.load(course_id).get(source_name)
+
+    def version(self, course_id: str) -> str:
+        """Phiên bản nội dung của khóa học: hash của các cặp (tên nguồn, hash nguồn), đổi khi tài liệu thay đổi."""
+        with self._lock:
+            sources = sorted((name, entry["hash"]) for name, entry in self.load(course_id).items())
+        return content_hash(json.dumps(sources, ensure_ascii=False))
+
+    def record(self, course_id: str, source_name: str, source_hash: str, chunk_ids: list[str], token_count: int = 0):
+        """Ghi nhận (hoặc cập nhật) một nguồn sau khi đã lưu các chunk của nó."""
+        entry = {
+            "hash": source_hash,
+            "source_name": source_name,
+            "chunk_count": len(chunk_ids),
+            "chunk_ids": chunk_ids,
+            "token_count": token_count,
+            "ingested_at": time.time(),
+        }
+        self._update(course_id, lambda sources: sources.__setitem__(source_name, entry))
+
+    def remove_chunks(self, course_id: str, removed: dict[str, int]):
+        """Bỏ các chunk đã xóa ({ID chunk: số token}) khỏi các nguồn, giữ nguyên hash và thời điểm thêm."""
+        def change(sources: dict[str, dict]):
+            for entry in sources.values():
+                dropped = [chunk_id for chunk_id in entry["chunk_ids"] if chunk_id in removed]
+                if dropped:
+                    entry["chunk_ids"] = [chunk_id for chunk_id in entry["chunk_ids"] if chunk_id not in removed]
+                    entry["chunk_count"] = len(entry["chunk_ids"])
+                    entry["token_count"] = max(0, entry.get("token_count", 0) - sum(removed[chunk_id] for chunk_id in dropped))
+        self._update(course_id, change)
+
+    def restore(self, course_id: str, sources: dict[str, dict]):
+        """Ghi đè toàn bộ manifest của khóa học (vd: khi nhập từ snapshot), chỉ ghi file một lần."""
+        def change(current: dict[str, dict]):
+            current.clear()
+            current.update(sources)
+        self._update(course_id, change)
+
+    def remove_course(self, course_id: str):
+        """Xóa manifest khi khóa học bị xóa."""
+        with self._lock, file_lock(self._path(course_id)):
+            self._cache.pop(course_id, None)
+            self._versions.pop(course_id, None)
+            try:
+                os.remove(self._path(course_id))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,149 @@
+# Ghi chú: Bộ nhớ hội thoại gọn nhẹ cho chat, giúp hiểu các câu hỏi nối tiếp.
+# Trước đây mỗi câu hỏi được truy xuất độc lập, nên câu như "giải thích thêm ý 2" lấy về các
+# chunk không liên quan. Với mỗi cuộc hội thoại, module này giữ:
+# 1. Vài lượt hỏi-đáp gần nhất, và một bản tóm tắt cuốn chiếu (trích ý chính, không gọi mô hình)
+#    của các lượt cũ hơn, luôn nằm trong một ngân sách token cố định -> prompt không phình ra
+#    dù cuộc hội thoại dài bao nhiêu.
+# 2. Các chunk vừa được truy xuất (theo ID): câu hỏi nối tiếp dùng lại chúng thay vì truy vấn lại,
+#    nhưng chỉ khi chúng chứa đủ các từ của chính câu hỏi mới; nếu không thì truy xuất mới (với câu
+#    hỏi đã ghép câu hỏi trước) và bổ sung các chunk đã nhớ có liên quan.
+# Câu hỏi nối tiếp là câu rất ngắn ("Tại sao?") hoặc có từ chỉ dẫn tới lượt trước ("ý 2",
+# "điều đó", "nó", "giải thích thêm", "còn ..."); câu hỏi độc lập được truy xuất như bình thường.
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from config import (
+    MEMORY_RECENT_TURNS, MEMORY_MAX_CHUNKS, MEMORY_TOKEN_BUDGET, MEMORY_FOLLOW_UP_MAX_WORDS, MEMORY_MAX_CONVERSATIONS,
+    MEMORY_REUSE_MIN_COVERAGE
+)
+from core.chunking import count_tokens
+from core.retrieval import RetrievedChunk, tokenize_query, term_coverage
+
+# Chỉ các mẫu thực sự trỏ về lượt trước: đại từ/chỉ định ("ý 2", "điều đó", "nó") và câu nối tiếp
+# ("giải thích thêm", "còn ...", "tell me more"). Các từ phổ biến như "ví dụ", "tại sao", "this" thì không.
+_FOLLOW_UP = re.compile(
+    r"^\s*(còn|vậy còn|thế còn|and|what about|how about)\b|"
+    r"\b((giải thích|nói|kể|trình bày|phân tích) (thêm|rõ hơn|kỹ hơn|chi tiết hơn)|(chi tiết|cụ thể|rõ) hơn|tiếp tục|"
+    r"ý (\d+|này|đó|trên|vừa rồi)|(điều|cái|phần|khái niệm|ví dụ) (này|đó|trên|vừa rồi|vừa nêu)|"
+    r"vừa rồi|ở trên|nêu trên|nó|tell me more|more about (it|that|this)|explain (it|that|this)|elaborate|go on|"
+    r"point \d+|the (above|previous|last) (one|point|answer)|why (is|was) (that|it))\b",
+    re.IGNORECASE,
+)
+_SENTENCE = re.compile(r"[^.!?\n]+[.!?]?")
+
+def _brief(text: str, max_words: int = 40) -> str:
+    """Câu đầu tiên của văn bản, tối đa `max_words` từ."""
+    sentence = next((s.strip(" -*\t") for s in _SENTENCE.findall(text) if s.strip(" -*\t")), "")
+    words = sentence.split()
+    return " ".join(words[:max_words]) + (" ..." if len(words) > max_words else "")
+
+@dataclass
+class ConversationState:
+    """Trạng thái gọn của một cuộc hội thoại."""
+    course_id: str
+    summary: list[str] = field(default_factory=list)
+    turns: list[tuple[str, str]] = field(default_factory=list)
+    chunks: OrderedDict[str, RetrievedChunk] = field(default_factory=OrderedDict)
+
+class ConversationMemory:
+    """Bộ nhớ của các cuộc hội thoại trong process (bỏ cuộc hội thoại lâu không dùng nhất khi đầy)."""
+    def __init__(self, recent_turns: int = MEMORY_RECENT_TURNS, max_chunks: int = MEMORY_MAX_CHUNKS,
+                 token_budget: int = MEMORY_TOKEN_BUDGET, follow_up_max_words: int = MEMORY_FOLLOW_UP_MAX_WORDS,
+                 max_conversations: int = MEMORY_MAX_CONVERSATIONS, reuse_min_coverage: float = MEMORY_REUSE_MIN_COVERAGE):
+        self.recent_turns = recent_turns
+        self.max_chunks = max_chunks
+        self.token_budget = token_budget
+        self.follow_up_max_words = follow_up_max_words
+        self.max_conversations = max_conversations
+        self.reuse_min_coverage = reuse_min_coverage
+        self._states: OrderedDict[str, ConversationState] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: str, course_id: str) -> ConversationState:
+        """Lấy (hoặc tạo) trạng thái của cuộc hội thoại."""
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state is None or state.course_id != course_id:
+                state = self._states[conversation_id] = ConversationState(course_id)
+            self._states.move_to_end(conversation_id)
+            while len(self._states) > self.max_conversations:
+                self._states.popitem(last=False)
+            return state
+
+    def is_follow_up(self, state: ConversationState, question: str) -> bool:
+        """Câu hỏi có phụ thuộc vào lượt trước không (rất ngắn, hoặc có từ chỉ dẫn tới lượt trước)."""
+        if not state.turns:
+            return False
+        return len(question.split()) <= self.follow_up_max_words or bool(_FOLLOW_UP.search(question))
+
+    @staticmethod
+    def retrieval_query(state: ConversationState, question: str) -> str:
+        """Câu truy vấn dùng để truy xuất cho câu hỏi nối tiếp: ghép với câu hỏi trước đó."""
+        return f"{state.turns[-1][0]} {question}" if state.turns else question
+
+    def _covering(self, state: ConversationState, text: str, top_k: int, min_coverage: float) -> list[RetrievedChunk]:
+        """Các chunk đã nhớ chứa ít nhất `min_coverage` (và > 0) các từ của `text`, xếp theo độ bao phủ."""
+        terms = tokenize_query(text)
+        with self._lock:
+            scored = [(term_coverage(terms, chunk.text), chunk) for chunk in state.chunks.values()]
+        scored = [(coverage, chunk) for coverage, chunk in scored if coverage > 0 and coverage >= min_coverage]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [chunk._replace(score=coverage) for coverage, chunk in scored[:top_k]]
+
+    def reusable_chunks(self, state: ConversationState, question: str, top_k: int) -> list[RetrievedChunk]:
+        """
+        Các chunk đã nhớ đủ để trả lời câu hỏi nối tiếp mà không cần truy xuất lại. Điểm tính trên
+        các từ của chính câu hỏi mới (không ghép câu hỏi trước, vốn luôn khớp với chunk cũ); danh
+        sách rỗng nghĩa là câu hỏi cần thông tin mới.
+        """
+        return self._covering(state, question, top_k, self.reuse_min_coverage)
+
+    def merge(self, state: ConversationState, query: str, results: list[RetrievedChunk], top_k: int) -> list[RetrievedChunk]:
+        """
+        Gộp kết quả truy xuất mới với tối đa top_k // 2 chunk đã nhớ có chung từ với `query` (câu
+        hỏi đã ghép), giữ tổng số chunk không quá `top_k` để prompt không dài hơn.
+        """
+        fresh = {result.chunk_id for result in results}
+        remembered = [chunk for chunk in self._covering(state, query, top_k, 0.0) if chunk.chunk_id not in fresh][:top_k // 2]
+        return results[:top_k - len(remembered)] + remembered
+
+    def remember_chunks(self, state: ConversationState, chunks: list[RetrievedChunk]):
+        """Ghi nhớ các chunk vừa dùng (giữ tối đa `max_chunks` chunk gần nhất)."""
+        with self._lock:
+            for chunk in chunks:
+                state.chunks[chunk.chunk_id] = chunk
+                state.chunks.move_to_end(chunk.chunk_id)
+            while len(state.chunks) > self.max_chunks:
+                state.chunks.popitem(last=False)
+
+    def record_turn(self, state: ConversationState, question: str, answer: str):
+        """
+        Ghi nhận một lượt hỏi-đáp. Lượt cũ hơn `recent_turns` được rút gọn vào bản tóm tắt,
+        và bản tóm tắt bỏ dần các ý cũ nhất để không vượt quá ngân sách token.
+        """
+        with self._lock:
+            state.turns.append((question, answer))
+            while len(state.turns) > self.recent_turns:
+                old_question, old_answer = state.turns.pop(0)
+                state.summary.append(f"{old_question} → {_brief(old_answer, 20)}")
+            while state.summary and count_tokens(self._render(state)) > self.token_budget:
+                state.summary.pop(0)
+
+    def _render(self, state: ConversationState) -> str:
+        lines = [f"- {item}" for item in state.summary]
+        lines += [f"Người dùng: {question}\nPNote: {_brief(answer)}" for question, answer in state.turns]
+        return "\n".join(lines)
+
+    def render(self, state: ConversationState) -> str:
+        """Lịch sử hội thoại dạng gọn để đưa vào prompt (rỗng nếu chưa có lượt nào)."""
+        with self._lock:
+            return self._render(state)
+
+    def forget_chunks(self, course_id: str):
+        """Bỏ các chunk đã nhớ của khóa học (gọi khi tài liệu của khóa học thay đổi)."""
+        with self._lock:
+            for state in self._states.values():
+                if state.course_id == course_id:
+                    state.chunks.clear()
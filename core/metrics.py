@@ -0,0 +1,150 @@
+# Ghi chú: Lớp đo đạc (instrumentation) nhẹ cho các đường xử lý chính.
+# Ghi lại trong bộ nhớ của process, theo từng khóa học và từng công cụ:
+# - Histogram độ trễ của từng bước (trích xuất, chia chunk, embed, ghi/truy vấn ChromaDB,
+#   truy xuất, gọi mô hình...).
+# - Bộ đếm: số token, số chunk, lượt trúng/trượt cache, số lỗi.
+# Khi tắt (PNOTE_METRICS=0), mọi hàm ghi trả về ngay và timer là một context manager rỗng dùng
+# chung, nên gần như không tốn chi phí. Xem số liệu ở trang pages/performance.py, hoặc ghi ra
+# file JSON Lines (export) để phân tích sau.
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Iterable, Iterator
+from config import METRICS_ENABLED, METRICS_LATENCY_BUCKETS_MS, METRICS_EXPORT_PATH
+
+_NOOP = nullcontext()
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, v) for k, v in labels.items() if v is not None)))
+
+class Histogram:
+    """Histogram theo các ngưỡng cố định (ms), kèm tổng, số mẫu và giá trị lớn nhất."""
+    def __init__(self, buckets: list[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Ước lượng phân vị `q` (0..1) bằng ngưỡng trên của bucket chứa nó."""
+        if not self.count:
+            return 0.0
+        target, cumulative = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+class Metrics:
+    """Kho số liệu trong bộ nhớ, an toàn khi dùng từ nhiều thread."""
+    def __init__(self, enabled: bool = METRICS_ENABLED, buckets: list[float] = METRICS_LATENCY_BUCKETS_MS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._histograms: dict[tuple, Histogram] = {}
+        self._counters: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, name: str, value_ms: float, **labels):
+        """Ghi một mẫu độ trễ (ms) vào histogram `name`."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value_ms)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        """Cộng `amount` vào bộ đếm `name`."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def timer(self, name: str, **labels):
+        """Context manager đo thời gian của một khối lệnh (không làm gì khi đã tắt)."""
+        return self._timer(name, labels) if self.enabled else _NOOP
+
+    @contextmanager
+    def _timer(self, name: str, labels: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000, **labels)
+
+    def timed_iter(self, iterable: Iterable, name: str, **labels) -> Iterator:
+        """
+        Bọc một iterator/generator: cộng dồn thời gian nằm trong chính nó (không tính thời gian
+        người dùng xử lý từng phần tử) và ghi một mẫu khi duyệt xong.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator, elapsed = iter(iterable), 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    return
+                elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe(name, elapsed * 1000, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        Trạng thái hiện tại của mọi số liệu.
+
+        Returns:
+            dict: {"timestamp", "uptime_seconds", "latencies": [...], "counters": [...]}; mỗi phần tử có
+                  "name", "labels" và các giá trị (count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms hoặc value).
+        """
+        with self._lock:
+            latencies = [{
+                "name": name, "labels": dict(labels), "count": h.count, "mean_ms": h.total / h.count if h.count else 0.0,
+                "p50_ms": h.percentile(0.5), "p95_ms": h.percentile(0.95), "p99_ms": h.percentile(0.99), "max_ms": h.max,
+            } for (name, labels), h in self._histograms.items()]
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self._counters.items()]
+        now = time.time()
+        return {"timestamp": now, "uptime_seconds": now - self.started_at,
+                "latencies": sorted(latencies, key=lambda m: (m["name"], sorted(m["labels"].items()))),
+                "counters": sorted(counters, key=lambda m: (m["name"], sorted(m["labels"].items())))}
+
+    def export(self, path: str = METRICS_EXPORT_PATH) -> str:
+        """Ghi thêm một bản snapshot (một dòng JSON) vào file, trả về đường dẫn file."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot(), ensure_ascii=False) + "\n")
+        return path
+
+    def reset(self):
+        """Xóa mọi số liệu đã ghi."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+_metrics = Metrics()
+
+def get_metrics() -> Metrics:
+    """Kho số liệu dùng chung của process."""
+    return _metrics
@@ -0,0 +1,322 @@
+# Ghi chú: Ngân hàng câu hỏi trắc nghiệm của mỗi khóa học, được tạo sẵn ở chế độ nền.
+# Trước đây mỗi lần bấm "Bắt đầu Tạo Quiz" là một lời gọi mô hình với ~20 chunk đầu tiên:
+# sinh viên phải chờ, thường nhận lại cùng các câu hỏi, và đôi khi JSON không phân tích được.
+# 1. Văn bản của từng nguồn được chia thành các nhóm (theo số token); mỗi nhóm được gửi đi
+#    sinh vài câu hỏi. Phản hồi được kiểm tra chặt (đủ 4 lựa chọn khác nhau, đáp án nằm trong
+#    các lựa chọn), chỉ các câu hợp lệ mới được lưu vào SQLite, kèm tên nguồn.
+# 2. Mỗi nhóm được nhận diện bằng hash nội dung: khi tài liệu được thêm / sửa, lần làm mới chỉ
+#    sinh câu hỏi cho các nhóm mới và xóa câu hỏi của các nhóm không còn tồn tại.
+# 3. Tạo quiz = lấy ngẫu nhiên N câu từ ngân hàng (lọc theo nguồn / chủ đề), không gọi mô hình.
+#    Chỉ câu hỏi của các nguồn chưa đổi kể từ lần làm mới gần nhất (cùng hash trong manifest) được
+#    lấy, nên khóa học được tạo lại với cùng ID không nhận câu hỏi cũ.
+
+import os
+import re
+import json
+import time
+import queue
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+from config import (
+    QUESTION_BANK_PATH, QUESTION_BANK_GROUP_TOKENS, QUESTION_BANK_QUESTIONS_PER_GROUP, QUESTION_BANK_MAX_CONCURRENCY,
+    QUESTION_BANK_AUTO_BUILD
+)
+from core.chunking import TextChunker
+from core.manifest import content_hash
+from core.metrics import Metrics, get_metrics
+
+QUESTION_PROMPT = """Bạn là một chuyên gia tạo câu hỏi thi. Dựa vào "NGỮ CẢNH", hãy tạo ra {count} câu hỏi trắc nghiệm (MCQ) để kiểm tra kiến thức. Trả lời dưới dạng một danh sách JSON. Mỗi đối tượng JSON phải có các key: "question", "options" (một danh sách 4 lựa chọn khác nhau), và "answer" (đáp án đúng, giống hệt một trong các lựa chọn). NGỮ CẢNH: --- {text} --- DANH SÁCH JSON:"""
+
+_JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+_ANSWER_LETTERS = "ABCD"
+
+def validate_question(record) -> dict | None:
+    """Chuẩn hóa một câu hỏi do mô hình sinh ra, hoặc None nếu không hợp lệ."""
+    if not isinstance(record, dict):
+        return None
+    question, options, answer = record.get("question"), record.get("options"), record.get("answer")
+    if not isinstance(question, str) or not question.strip() or not isinstance(options, list) or not isinstance(answer, str):
+        return None
+    options = [option.strip() for option in options if isinstance(option, str) and option.strip()]
+    if len(options) != 4 or len({option.casefold() for option in options}) != 4:
+        return None
+    answer = answer.strip()
+    # Một số phản hồi ghi đáp án dạng "B" hoặc "B. ..." thay vì nội dung lựa chọn.
+    if answer not in options and answer[:1].upper() in _ANSWER_LETTERS and (len(answer) == 1 or answer[1] in ".):"):
+        answer = options[_ANSWER_LETTERS.index(answer[0].upper())]
+    if answer not in options:
+        return None
+    return {"question": question.strip(), "options": options, "answer": answer}
+
+def parse_questions(text: str) -> list[dict]:
+    """Tìm danh sách JSON trong phản hồi của mô hình (kể cả khi có ```json hay lời dẫn) và giữ các câu hợp lệ."""
+    match = _JSON_ARRAY.search(text or "")
+    if not match:
+        return []
+    try:
+        records = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return []
+    if not isinstance(records, list):
+        return []
+    return [question for question in map(validate_question, records) if question]
+
+class QuestionBank:
+    """
+    Lưu câu hỏi của các khóa học trong SQLite. Bảng `question_groups` ghi nhận các nhóm văn bản
+    đã được sinh câu hỏi (kể cả khi không có câu nào hợp lệ), bảng `questions` chứa các câu hỏi,
+    bảng `question_sources` ghi hash của từng nguồn ở lần làm mới gần nhất.
+    """
+    def __init__(self, path: str = QUESTION_BANK_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS question_groups (course_id TEXT NOT NULL, group_hash TEXT NOT NULL, "
+                "source TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (course_id, group_hash))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS questions (course_id TEXT NOT NULL, group_hash TEXT NOT NULL, source TEXT NOT NULL, "
+                "question TEXT NOT NULL, options TEXT NOT NULL, answer TEXT NOT NULL, PRIMARY KEY (course_id, group_hash, question))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_source ON questions (course_id, source)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS question_sources (course_id TEXT NOT NULL, source TEXT NOT NULL, "
+                "source_hash TEXT NOT NULL, PRIMARY KEY (course_id, source))"
+            )
+        return self._conn
+
+    def _current_sources(self, conn: sqlite3.Connection, course_id: str, versions: dict[str, str]) -> list[str]:
+        """Các nguồn có hash lúc làm mới gần nhất trùng với hash hiện tại (`versions`: {tên nguồn: hash})."""
+        rows = conn.execute("SELECT source, source_hash FROM question_sources WHERE course_id = ?", (course_id,))
+        return [source for source, source_hash in rows if versions.get(source) == source_hash]
+
+    def set_sources(self, course_id: str, versions: dict[str, str]):
+        """Ghi nhận hash của các nguồn mà ngân hàng câu hỏi vừa được làm mới theo."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM question_sources WHERE course_id = ?", (course_id,))
+            conn.executemany("INSERT INTO question_sources (course_id, source, source_hash) VALUES (?, ?, ?)",
+                             [(course_id, source, source_hash) for source, source_hash in versions.items()])
+            conn.commit()
+
+    def groups(self, course_id: str) -> set[str]:
+        """Hash của các nhóm văn bản đã được sinh câu hỏi."""
+        with self._lock:
+            rows = self._connect().execute("SELECT group_hash FROM question_groups WHERE course_id = ?", (course_id,))
+            return {group_hash for group_hash, in rows}
+
+    def add_group(self, course_id: str, source: str, group_hash: str, questions: list[dict]):
+        """Lưu các câu hỏi của một nhóm và đánh dấu nhóm đã xong."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO question_groups (course_id, group_hash, source, created_at) VALUES (?, ?, ?, ?)",
+                         (course_id, group_hash, source, time.time()))
+            conn.executemany(
+                "INSERT OR REPLACE INTO questions (course_id, group_hash, source, question, options, answer) VALUES (?, ?, ?, ?, ?, ?)",
+                [(course_id, group_hash, source, q["question"], json.dumps(q["options"], ensure_ascii=False), q["answer"])
+                 for q in questions],
+            )
+            conn.commit()
+
+    def prune(self, course_id: str, keep: set[str]) -> int:
+        """Xóa các nhóm (và câu hỏi) không còn trong tài liệu của khóa học, trả về số nhóm đã xóa."""
+        stale = list(self.groups(course_id) - keep)
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(stale), 500):
+                batch = stale[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                for table in ("questions", "question_groups"):
+                    conn.execute(f"DELETE FROM {table} WHERE course_id = ? AND group_hash IN ({placeholders})", [course_id, *batch])
+            conn.commit()
+        return len(stale)
+
+    def remove_course(self, course_id: str):
+        """Xóa toàn bộ ngân hàng câu hỏi của khóa học."""
+        with self._lock:
+            conn = self._connect()
+            for table in ("questions", "question_groups", "question_sources"):
+                conn.execute(f"DELETE FROM {table} WHERE course_id = ?", (course_id,))
+            conn.commit()
+
+    def count(self, course_id: str, versions: dict[str, str]) -> dict[str, int]:
+        """Số câu hỏi (không trùng) theo từng nguồn chưa đổi (`versions`: {tên nguồn: hash hiện tại})."""
+        with self._lock:
+            conn = self._connect()
+            current = set(self._current_sources(conn, course_id, versions))
+            rows = conn.execute(
+                "SELECT source, COUNT(DISTINCT question) FROM questions WHERE course_id = ? GROUP BY source", (course_id,))
+            return {source: count for source, count in rows if source in current}
+
+    def sample(self, course_id: str, count: int, versions: dict[str, str], sources: list[str] | None = None,
+               topic: str | None = None) -> list[dict]:
+        """
+        Lấy ngẫu nhiên tối đa `count` câu hỏi khác nhau.
+
+        Args:
+            course_id (str): ID khóa học.
+            count (int): Số câu hỏi cần lấy.
+            versions (dict[str, str]): Hash hiện tại của các nguồn; chỉ lấy câu hỏi của nguồn chưa đổi
+                                       kể từ lần làm mới gần nhất.
+            sources (list[str] | None): Chỉ lấy câu hỏi của các nguồn này.
+            topic (str | None): Chỉ lấy câu hỏi có chứa chủ đề này (trong câu hỏi hoặc các lựa chọn).
+
+        Returns:
+            list[dict]: Các câu hỏi {"question", "options", "answer", "source"}.
+        """
+        with self._lock:
+            conn = self._connect()
+            allowed = self._current_sources(conn, course_id, versions)
+            if sources:
+                allowed = [source for source in allowed if source in sources]
+            if not allowed:
+                return []
+            query = ("SELECT question, options, answer, source FROM questions WHERE course_id = ? "
+                     f"AND source IN ({','.join('?' * len(allowed))}) GROUP BY question")
+            params = [course_id, *allowed]
+            if not topic:
+                query += " ORDER BY RANDOM() LIMIT ?"
+                params.append(count)
+            rows = conn.execute(query, params).fetchall()
+        if topic:
+            # LIKE của SQLite chỉ không phân biệt hoa/thường với chữ ASCII, nên lọc bằng Python.
+            needle = topic.casefold()
+            rows = [row for row in rows if needle in row[0].casefold() or needle in row[1].casefold()]
+            rows = random.sample(rows, min(count, len(rows)))
+        return [{"question": question, "options": json.loads(options), "answer": answer, "source": source}
+                for question, options, answer, source in rows]
+
+class QuestionBankBuilder:
+    """
+    Tạo và làm mới ngân hàng câu hỏi ở chế độ nền (một worker thread cho cả process).
+    `generate(prompt, course_id)` gọi mô hình và trả về văn bản (được AIService cung cấp).
+    Với `auto_build`, mỗi thay đổi của khóa học xếp lịch làm mới ngân hàng câu hỏi.
+    """
+    def __init__(self, course_manager, generate: Callable[[str, str | None], str], bank: QuestionBank | None = None,
+                 group_tokens: int = QUESTION_BANK_GROUP_TOKENS, questions_per_group: int = QUESTION_BANK_QUESTIONS_PER_GROUP,
+                 max_workers: int = QUESTION_BANK_MAX_CONCURRENCY, metrics: Metrics | None = None,
+                 auto_build: bool = QUESTION_BANK_AUTO_BUILD):
+        self.course_manager = course_manager
+        self.auto_build = auto_build
+        self.generate = generate
+        self.bank = bank or QuestionBank()
+        self.chunker = TextChunker(chunk_size=group_tokens, overlap=0, snap_to_boundaries=True)
+        self.questions_per_group = questions_per_group
+        self.max_workers = max_workers
+        self.metrics = metrics or get_metrics()
+        self._queue: queue.Queue = queue.Queue()
+        self._pending: set[str] = set()
+        self._building: set[str] = set()
+        self._lock = threading.Lock()
+        self._worker: threading.Thread | None = None
+
+    def schedule(self, course_id: str):
+        """Đưa khóa học vào hàng đợi làm mới (bỏ qua nếu đã có trong hàng đợi)."""
+        with self._lock:
+            if course_id in self._pending:
+                return
+            self._pending.add(course_id)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._worker_loop, name="pnote-question-bank", daemon=True)
+                self._worker.start()
+        self._queue.put(course_id)
+
+    def course_changed(self, course_id: str):
+        """
+        Listener của CourseManager: khóa học bị xóa (không còn nguồn nào) thì xóa ngân hàng câu hỏi
+        ngay, kể cả khi không tự động làm mới; ngược lại xếp lịch làm mới nếu bật `auto_build`.
+        """
+        if not self.course_manager.manifest.load(course_id):
+            self.bank.remove_course(course_id)
+        elif self.auto_build:
+            self.schedule(course_id)
+
+    def _versions(self, course_id: str) -> dict[str, str]:
+        return {source_name: entry["hash"] for source_name, entry in self.course_manager.manifest.load(course_id).items()}
+
+    def count(self, course_id: str) -> dict[str, int]:
+        """Số câu hỏi dùng được (theo nội dung hiện tại) của khóa học, theo từng nguồn."""
+        return self.bank.count(course_id, self._versions(course_id))
+
+    def sample(self, course_id: str, count: int, sources: list[str] | None = None, topic: str | None = None) -> list[dict]:
+        """Lấy ngẫu nhiên tối đa `count` câu hỏi của các nguồn chưa đổi kể từ lần làm mới gần nhất."""
+        return self.bank.sample(course_id, count, self._versions(course_id), sources, topic)
+
+    def is_building(self, course_id: str) -> bool:
+        """Khóa học đang chờ hoặc đang được làm mới ngân hàng câu hỏi."""
+        with self._lock:
+            return course_id in self._pending or course_id in self._building
+
+    def _worker_loop(self):
+        while True:
+            course_id = self._queue.get()
+            with self._lock:
+                # Bỏ khỏi hàng đợi trước khi chạy: thay đổi xảy ra trong lúc làm mới sẽ được xếp lượt mới.
+                self._pending.discard(course_id)
+                self._building.add(course_id)
+            try:
+                self.build(course_id)
+            except Exception as e:
+                self.metrics.increment("errors", course=course_id, tool="question_bank", error=type(e).__name__)
+            finally:
+                with self._lock:
+                    self._building.discard(course_id)
+                self._queue.task_done()
+
+    def _groups(self, course_id: str) -> dict[str, tuple[str, str]]:
+        """Các nhóm văn bản hiện có của khóa học: {hash nhóm: (tên nguồn, văn bản)}."""
+        groups = {}
+        for source_name in sorted(self.course_manager.manifest.load(course_id)):
+            for text in self.chunker.split(self.course_manager.source_text(course_id, source_name)):
+                if text.strip():
+                    groups.setdefault(content_hash(text), (source_name, text))
+        return groups
+
+    def _questions(self, course_id: str, text: str) -> list[dict]:
+        prompt = QUESTION_PROMPT.format(count=self.questions_per_group, text=text)
+        return parse_questions(self.generate(prompt, course_id))
+
+    def build(self, course_id: str) -> dict:
+        """
+        Làm mới ngân hàng câu hỏi của một khóa học: chỉ sinh câu hỏi cho các nhóm văn bản mới
+        (song song) và xóa các nhóm không còn tồn tại. Nhóm bị lỗi sẽ được thử lại ở lần sau.
+
+        Returns:
+            dict: Số nhóm mới, số câu hỏi mới, số nhóm lỗi và số nhóm đã xóa.
+        """
+        versions = self._versions(course_id)
+        if not versions:
+            self.bank.remove_course(course_id)
+            return {"groups_added": 0, "questions_added": 0, "groups_failed": 0, "groups_removed": 0}
+        groups = self._groups(course_id)
+        done = self.bank.groups(course_id)
+        missing = {group_hash: group for group_hash, group in groups.items() if group_hash not in done}
+        report = {"groups_added": 0, "questions_added": 0, "groups_failed": 0}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._questions, course_id, text): (group_hash, source_name)
+                       for group_hash, (source_name, text) in missing.items()}
+            for future in as_completed(futures):
+                group_hash, source_name = futures[future]
+                try:
+                    questions = future.result()
+                except Exception as e:
+                    self.metrics.increment("errors", course=course_id, tool="question_bank", error=type(e).__name__)
+                    report["groups_failed"] += 1
+                    continue
+                self.bank.add_group(course_id, source_name, group_hash, questions)
+                report["groups_added"] += 1
+                report["questions_added"] += len(questions)
+        report["groups_removed"] = self.bank.prune(course_id, set(groups))
+        # Hash của các nguồn lúc bắt đầu: nguồn đổi trong lúc làm mới vẫn bị ẩn cho tới lần làm mới sau.
+        self.bank.set_sources(course_id, versions)
+        return report
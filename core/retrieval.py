@@ -0,0 +1,205 @@
+# Ghi chú: Truy xuất lai (hybrid) cho chat: kết hợp tìm kiếm từ khóa (BM25) và vector.
+# Tìm kiếm vector thường bỏ sót các thuật ngữ chính xác (số điều luật, công thức, tên riêng
+# Tiếng Việt...). Module này:
+# 1. Duy trì một chỉ mục BM25 cho mỗi khóa học (bảng SQLite FTS5 riêng), được cập nhật dần
+#    bởi CourseManager.add_document và bị xóa khi xóa khóa học.
+# 2. Hợp nhất kết quả vector và BM25 bằng Reciprocal Rank Fusion (RRF).
+# 3. (Tùy chọn) Xếp hạng lại theo mức độ bao phủ các từ trong câu hỏi.
+# Nhờ vậy chỉ cần ít chunk hơn (prompt nhỏ hơn, sinh câu trả lời nhanh hơn) mà vẫn đúng ý.
+
+import os
+import re
+import json
+import hashlib
+import sqlite3
+import threading
+from typing import NamedTuple
+from config import (
+    LEXICAL_INDEX_PATH, VECTOR_DB_SEARCH_RESULTS, LEXICAL_SEARCH_RESULTS, HYBRID_RRF_K, HYBRID_RERANK,
+    RETRIEVAL_TOP_K
+)
+from core.metrics import Metrics, get_metrics
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+def tokenize_query(text: str) -> list[str]:
+    """Tách câu hỏi thành các từ (giữ dấu Tiếng Việt), bỏ trùng, giữ thứ tự."""
+    return list(dict.fromkeys(word for word in _WORD.findall(text.lower()) if len(word) > 1 or word.isdigit()))
+
+def term_coverage(terms: list[str], text: str) -> float:
+    """Tỉ lệ các từ trong `terms` xuất hiện trong `text` (0..1)."""
+    if not terms:
+        return 0.0
+    words = set(_WORD.findall(text.lower()))
+    return sum(term in words for term in terms) / len(terms)
+
+class RetrievedChunk(NamedTuple):
+    """Một chunk được truy xuất, kèm điểm số sau khi hợp nhất/xếp hạng lại."""
+    chunk_id: str
+    text: str
+    metadata: dict
+    score: float
+
+class LexicalIndex:
+    """
+    Chỉ mục BM25 dựa trên SQLite FTS5. Mỗi khóa học là một bảng FTS5 riêng, nên thống kê
+    IDF chỉ tính trong khóa học đó và việc xóa khóa học chỉ là một lệnh DROP TABLE.
+    rowid của mỗi dòng được suy ra từ chunk ID, để xóa/cập nhật theo ID không cần quét bảng.
+    """
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        return self._conn
+
+    @staticmethod
+    def _table(course_id: str) -> str:
+        return '"fts_' + course_id.replace('"', '""') + '"'
+
+    @staticmethod
+    def _rowid(chunk_id: str) -> int:
+        return int(hashlib.sha256(chunk_id.encode("utf-8")).hexdigest()[:15], 16)
+
+    def _ensure_table(self, conn: sqlite3.Connection, course_id: str):
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._table(course_id)} USING fts5("
+            "text, chunk_id UNINDEXED, metadata UNINDEXED, tokenize = 'unicode61 remove_diacritics 0')"
+        )
+
+    def has_course(self, course_id: str) -> bool:
+        with self._lock:
+            row = self._connect().execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"fts_{course_id}",)).fetchone()
+        return row is not None
+
+    def add(self, course_id: str, chunk_ids: list[str], texts: list[str], metadatas: list[dict]):
+        """Thêm (hoặc thay thế) các chunk vào chỉ mục của khóa học."""
+        with self._lock:
+            conn = self._connect()
+            self._ensure_table(conn, course_id)
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self._table(course_id)} (rowid, text, chunk_id, metadata) VALUES (?, ?, ?, ?)",
+                [(self._rowid(chunk_id), text, chunk_id, json.dumps(metadata, ensure_ascii=False))
+                 for chunk_id, text, metadata in zip(chunk_ids, texts, metadatas)],
+            )
+            conn.commit()
+
+    def update_metadata(self, course_id: str, chunk_ids: list[str], metadatas: list[dict]):
+        """Cập nhật metadata (vị trí, trang) của các chunk đã có."""
+        with self._lock:
+            conn = self._connect()
+            self._ensure_table(conn, course_id)
+            conn.executemany(
+                f"UPDATE {self._table(course_id)} SET metadata = ? WHERE rowid = ?",
+                [(json.dumps(metadata, ensure_ascii=False), self._rowid(chunk_id)) for chunk_id, metadata in zip(chunk_ids, metadatas)],
+            )
+            conn.commit()
+
+    def delete(self, course_id: str, chunk_ids: list[str]):
+        """Xóa các chunk khỏi chỉ mục."""
+        with self._lock:
+            conn = self._connect()
+            self._ensure_table(conn, course_id)
+            conn.executemany(f"DELETE FROM {self._table(course_id)} WHERE rowid = ?", [(self._rowid(chunk_id),) for chunk_id in chunk_ids])
+            conn.commit()
+
+    def chunk_ids(self, course_id: str) -> set[str]:
+        """ID của tất cả các chunk đang có trong chỉ mục của khóa học."""
+        if not self.has_course(course_id):
+            return set()
+        with self._lock:
+            return {row[0] for row in self._connect().execute(f"SELECT chunk_id FROM {self._table(course_id)}")}
+
+    def optimize(self, course_id: str):
+        """Gộp các phân đoạn của chỉ mục FTS5 (sau nhiều lần thêm/xóa) để tìm kiếm nhanh hơn và file nhỏ hơn."""
+        if not self.has_course(course_id):
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"INSERT INTO {self._table(course_id)} ({self._table(course_id)}) VALUES ('optimize')")
+            conn.commit()
+
+    def drop_course(self, course_id: str):
+        """Xóa toàn bộ chỉ mục của khóa học."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"DROP TABLE IF EXISTS {self._table(course_id)}")
+            conn.commit()
+
+    def search(self, course_id: str, query: str, limit: int) -> list[RetrievedChunk]:
+        """Tìm các chunk khớp với bất kỳ từ nào trong câu hỏi, xếp hạng theo BM25."""
+        terms = tokenize_query(query)
+        if not terms or not self.has_course(course_id):
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT chunk_id, text, metadata, bm25({self._table(course_id)}) AS score FROM {self._table(course_id)} "
+                f"WHERE {self._table(course_id)} MATCH ? ORDER BY score LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        # bm25() của SQLite trả về số âm (càng nhỏ càng liên quan) -> đổi dấu cho dễ đọc.
+        return [RetrievedChunk(chunk_id, text, json.loads(metadata or "{}"), -score) for chunk_id, text, metadata, score in rows]
+
+class HybridRetriever:
+    """Kết hợp kết quả vector (ChromaDB) và BM25 (LexicalIndex) cho một câu hỏi."""
+    def __init__(self, lexical_index: LexicalIndex, vector_candidates: int = VECTOR_DB_SEARCH_RESULTS,
+                 lexical_candidates: int = LEXICAL_SEARCH_RESULTS, rrf_k: int = HYBRID_RRF_K, rerank: bool = HYBRID_RERANK,
+                 metrics: Metrics | None = None):
+        self.lexical_index = lexical_index
+        self.metrics = metrics or get_metrics()
+        self.vector_candidates = vector_candidates
+        self.lexical_candidates = lexical_candidates
+        self.rrf_k = rrf_k
+        self.rerank = rerank
+
+    def retrieve(self, collection, course_id: str, question: str, query_embedding: list[float],
+                 top_k: int = RETRIEVAL_TOP_K) -> list[RetrievedChunk]:
+        """
+        Truy xuất `top_k` chunk liên quan nhất.
+
+        Args:
+            collection: Collection ChromaDB của khóa học.
+            course_id (str): ID khóa học (để tra chỉ mục BM25).
+            question (str): Câu hỏi gốc (dùng cho BM25 và xếp hạng lại).
+            query_embedding (list[float]): Embedding của câu hỏi (dùng cho tìm kiếm vector).
+            top_k (int): Số chunk trả về.
+        """
+        with self.metrics.timer("chroma.query", course=course_id):
+            vector = collection.query(query_embeddings=[query_embedding], n_results=self.vector_candidates,
+                                      include=["documents", "metadatas"])
+        vector_hits = [RetrievedChunk(chunk_id, text, metadata or {}, 0.0)
+                       for chunk_id, text, metadata in zip(vector["ids"][0], vector["documents"][0], vector["metadatas"][0])]
+        with self.metrics.timer("bm25.search", course=course_id):
+            lexical_hits = self.lexical_index.search(course_id, question, self.lexical_candidates)
+
+        # Reciprocal Rank Fusion: mỗi danh sách đóng góp 1 / (k + hạng).
+        fused: dict[str, list] = {}
+        for hits in (vector_hits, lexical_hits):
+            for rank, hit in enumerate(hits):
+                entry = fused.setdefault(hit.chunk_id, [hit, 0.0])
+                entry[1] += 1.0 / (self.rrf_k + rank + 1)
+        ranked = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)
+
+        if self.rerank:
+            ranked = self._rerank(question, ranked[:top_k * 3])
+        return [hit._replace(score=score) for hit, score in ranked[:top_k]]
+
+    def _rerank(self, question: str, ranked: list[list]) -> list[list]:
+        """
+        Xếp hạng lại nhẹ (không gọi mô hình): cộng thêm điểm theo tỉ lệ từ trong câu hỏi xuất
+        hiện trong chunk, ưu tiên các chunk chứa đúng số hiệu / thuật ngữ được hỏi.
+        """
+        terms = tokenize_query(question)
+        if not terms:
+            return ranked
+        max_score = max(score for _, score in ranked) if ranked else 1.0
+        rescored = []
+        for hit, score in ranked:
+            rescored.append([hit, score / max_score + term_coverage(terms, hit.text)])
+        return sorted(rescored, key=lambda entry: entry[1], reverse=True)
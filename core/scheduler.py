@@ -0,0 +1,311 @@
+# Ghi chú: Bộ điều phối (scheduler) đứng trước backend mô hình, dùng chung cho cả process.
+# Khi nhiều sinh viên cùng bấm "Tạo Tóm Tắt" / "Tạo Quiz" trong một khóa học, trước đây mỗi
+# lần bấm là một lời gọi API song song -> trùng lặp, vượt quota và hiện nguyên văn exception.
+# LLMScheduler:
+# 1. Giới hạn số lời gọi đồng thời (toàn cục và theo từng khóa học).
+# 2. Giới hạn số token mỗi phút (token bucket), ước lượng trước theo prompt, trừ thêm phần phản hồi.
+# 3. Tự thử lại với backoff khi gặp lỗi tạm thời (429, 5xx, timeout, mất kết nối).
+# 4. Gộp các prompt giống hệt nhau đang chạy: mười lần bấm cùng lúc chỉ tạo một lời gọi,
+#    các yêu cầu đi sau nhận lại đúng kết quả (kể cả khi streaming, từng phần một).
+#    Lời gọi streaming chạy trong một thread riêng và đẩy từng phần vào flight, nên slot đồng thời
+#    được trả lại ngay khi lời gọi gốc xong, không phụ thuộc vào tốc độ đọc của giao diện.
+# 5. Lời gọi chạy nền (vd: tạo ngân hàng câu hỏi) đi làn ưu tiên thấp: không chiếm slot của khóa
+#    học, chỉ dùng phần token/phút dành riêng cho chúng, và chỉ bắt đầu khi không có lời gọi
+#    tương tác (chat, tóm tắt...) nào đang chạy hoặc đang chờ.
+# friendly_error() đổi exception thành thông báo dễ hiểu để hiển thị cho người dùng.
+
+import time
+import random
+import hashlib
+import threading
+from typing import Callable, Iterator
+from config import (
+    LLM_MAX_CONCURRENCY, LLM_MAX_CONCURRENCY_PER_COURSE, LLM_TOKENS_PER_MINUTE, LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS, LLM_BACKGROUND_MAX_CONCURRENCY, LLM_BACKGROUND_TOKEN_FRACTION
+)
+from core.chunking import count_tokens
+from core.llm import LLMBackend, Generation
+
+_TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+_TRANSIENT_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded",
+    "GatewayTimeout", "Timeout", "TimeoutError", "ConnectionError", "ConnectTimeout", "ReadTimeout",
+}
+
+def _status_code(error: Exception) -> int | None:
+    """Mã HTTP của lỗi (google.api_core: `.code`, requests: `.response.status_code`), nếu có."""
+    code = getattr(error, "code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+def is_transient(error: Exception) -> bool:
+    """Lỗi tạm thời (quá tải, hết quota tạm thời, timeout, mất kết nối) thì nên thử lại."""
+    return _status_code(error) in _TRANSIENT_STATUS or type(error).__name__ in _TRANSIENT_NAMES
+
+def friendly_error(error: Exception) -> str:
+    """Thông báo lỗi dễ hiểu cho người dùng thay vì nguyên văn exception."""
+    name, code = type(error).__name__, _status_code(error)
+    if code == 429 or name in ("ResourceExhausted", "TooManyRequests"):
+        return "Hệ thống AI đang quá tải hoặc đã hết hạn mức sử dụng. Vui lòng thử lại sau ít phút."
+    if is_transient(error):
+        return "Dịch vụ AI tạm thời không phản hồi. Vui lòng thử lại."
+    if code in (401, 403) or name in ("PermissionDenied", "Unauthenticated"):
+        return "Không thể xác thực với dịch vụ AI. Vui lòng kiểm tra GEMINI_API_KEY."
+    if name in ("InvalidArgument", "BlockedPromptException", "StopCandidateException"):
+        return "Yêu cầu không được mô hình AI chấp nhận (nội dung quá dài hoặc bị chặn)."
+    return "Đã xảy ra lỗi khi gọi mô hình AI. Vui lòng thử lại."
+
+class _TokenBucket:
+    """Giới hạn số token mỗi phút. `tokens_per_minute` = 0 nghĩa là không giới hạn."""
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: int):
+        """Chờ tới khi đủ `amount` token rồi trừ đi."""
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def debit(self, amount: int):
+        """Trừ thêm token đã dùng (vd: phần phản hồi), có thể âm -> các lời gọi sau phải chờ."""
+        if not self.capacity:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+class _Flight:
+    """Một lời gọi đang chạy; các yêu cầu trùng prompt đọc lại các phần kết quả của nó."""
+    def __init__(self):
+        self.parts: list[Generation] = []
+        self.done = False
+        self.error: Exception | None = None
+        # Số người đang đọc; khi tất cả đã ngừng đọc trước khi xong, lời gọi gốc được dừng sớm.
+        self.readers = 0
+        self.cancelled = False
+        self._cond = threading.Condition()
+
+    def append(self, part: Generation):
+        with self._cond:
+            self.parts.append(part)
+            self._cond.notify_all()
+
+    def finish(self, error: Exception | None = None):
+        with self._cond:
+            self.done, self.error = True, error
+            self._cond.notify_all()
+
+    def follow(self) -> Iterator[Generation]:
+        """Trả về lần lượt các phần kết quả (chờ khi chưa có), ném lại lỗi của lời gọi gốc nếu có."""
+        with self._cond:
+            self.readers += 1
+        index = 0
+        try:
+            while True:
+                with self._cond:
+                    while index >= len(self.parts) and not self.done:
+                        self._cond.wait()
+                    if index < len(self.parts):
+                        part = self.parts[index]
+                    elif self.error:
+                        raise self.error
+                    else:
+                        return
+                index += 1
+                yield part
+        finally:
+            with self._cond:
+                self.readers -= 1
+                if not self.readers and not self.done:
+                    self.cancelled = True
+
+class LLMScheduler:
+    """Điều phối mọi lời gọi sinh văn bản tới một LLMBackend."""
+    def __init__(self, backend: LLMBackend, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 per_course_concurrency: int = LLM_MAX_CONCURRENCY_PER_COURSE,
+                 tokens_per_minute: int = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES,
+                 backoff: float = LLM_RETRY_BACKOFF_SECONDS, background_concurrency: int = LLM_BACKGROUND_MAX_CONCURRENCY,
+                 background_token_fraction: float = LLM_BACKGROUND_TOKEN_FRACTION):
+        self.backend = backend
+        self.per_course_concurrency = per_course_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._courses: dict[str, threading.BoundedSemaphore] = {}
+        background_tokens = int(tokens_per_minute * background_token_fraction)
+        self._bucket = _TokenBucket(tokens_per_minute - background_tokens)
+        self._background = threading.BoundedSemaphore(background_concurrency)
+        self._background_bucket = _TokenBucket(background_tokens)
+        self._in_flight: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        # Số lời gọi tương tác đang chạy hoặc đang chờ; lời gọi nền chỉ bắt đầu khi bằng 0.
+        self._interactive = 0
+        self._interactive_idle = threading.Condition(self._lock)
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "retries": 0, "background_calls": 0}
+
+    def _course_semaphore(self, course_id: str | None) -> threading.BoundedSemaphore | None:
+        if course_id is None:
+            return None
+        with self._lock:
+            return self._courses.setdefault(course_id, threading.BoundedSemaphore(self.per_course_concurrency))
+
+    def _join_or_lead(self, prompt: str) -> tuple[str, _Flight, bool]:
+        """Trả về (key, flight, có phải lời gọi gốc hay không) cho prompt."""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            self.stats["requests"] += 1
+            flight = self._in_flight.get(key)
+            if flight is not None and not flight.cancelled:
+                self.stats["coalesced"] += 1
+                return key, flight, False
+            flight = self._in_flight[key] = _Flight()
+            return key, flight, True
+
+    def _release(self, key: str, flight: _Flight):
+        with self._lock:
+            # Flight đã bị hủy có thể đã được thay bằng một lời gọi mới cho cùng prompt.
+            if self._in_flight.get(key) is flight:
+                del self._in_flight[key]
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def _acquire_background(self):
+        """Chờ slot nền và tới khi không còn lời gọi tương tác nào đang chạy / đang chờ."""
+        self._background.acquire()
+        with self._interactive_idle:
+            while self._interactive:
+                self._interactive_idle.wait()
+        self._global.acquire()
+
+    def _run(self, prompt: str, course_id: str | None, call: Callable[[int], Iterator[Generation]],
+             background: bool = False) -> Iterator[Generation]:
+        """
+        Chạy `call` trong giới hạn đồng thời và token/phút, thử lại khi gặp lỗi tạm thời
+        (chỉ khi chưa trả về phần nào, để người nhận không thấy nội dung lặp lại).
+        Với `background`, lời gọi đi làn ưu tiên thấp (xem ghi chú đầu file).
+        """
+        if background:
+            yield from self._run_background(prompt, call)
+            return
+        with self._lock:
+            self._interactive += 1
+        try:
+            yield from self._attempts(prompt, call, self._course_semaphore(course_id), self._global.acquire,
+                                      self._global.release, self._bucket)
+        finally:
+            with self._interactive_idle:
+                self._interactive -= 1
+                if not self._interactive:
+                    self._interactive_idle.notify_all()
+
+    def _run_background(self, prompt: str, call: Callable[[int], Iterator[Generation]]) -> Iterator[Generation]:
+        def release():
+            self._global.release()
+            self._background.release()
+        with self._lock:
+            self.stats["background_calls"] += 1
+        yield from self._attempts(prompt, call, None, self._acquire_background, release, self._background_bucket)
+
+    def _attempts(self, prompt: str, call: Callable[[int], Iterator[Generation]],
+                  course_semaphore: threading.BoundedSemaphore | None, acquire: Callable[[], None],
+                  release: Callable[[], None], bucket: _TokenBucket) -> Iterator[Generation]:
+        attempt = 0
+        while True:
+            if course_semaphore: course_semaphore.acquire()
+            acquire()
+            yielded = False
+            response_tokens = None
+            try:
+                bucket.acquire(count_tokens(prompt))
+                with self._lock:
+                    self.stats["upstream_calls"] += 1
+                for part in call(attempt):
+                    yielded = True
+                    # Khi streaming, số token phản hồi của mỗi phần là lũy kế (hoặc lặp lại): chỉ giữ
+                    # giá trị mới nhất và trừ một lần khi lời gọi kết thúc.
+                    response_tokens = part.response_tokens or response_tokens
+                    yield part
+                return
+            except Exception as e:
+                if yielded or attempt >= self.max_retries or not is_transient(e):
+                    raise
+            finally:
+                if response_tokens:
+                    bucket.debit(response_tokens)
+                release()
+                if course_semaphore: course_semaphore.release()
+            with self._lock:
+                self.stats["retries"] += 1
+            time.sleep(self._backoff_delay(attempt))
+            attempt += 1
+
+    def stream(self, prompt: str, course_id: str | None = None) -> Iterator[Generation]:
+        """
+        Sinh văn bản dạng streaming; prompt trùng với một lời gọi đang chạy sẽ nhận lại các phần của nó.
+        Lời gọi gốc chạy trong một thread riêng: người đọc chậm hoặc bỏ dở (vd: Streamlit chạy lại
+        trang giữa chừng) không giữ slot đồng thời.
+        """
+        key, flight, leader = self._join_or_lead(prompt)
+        if leader:
+            threading.Thread(target=self._lead_stream, args=(key, flight, prompt, course_id), daemon=True).start()
+        yield from flight.follow()
+
+    def _lead_stream(self, key: str, flight: _Flight, prompt: str, course_id: str | None):
+        parts = self._run(prompt, course_id, lambda attempt: self.backend.stream(prompt))
+        try:
+            for part in parts:
+                if flight.cancelled:
+                    # Không còn ai đọc: dừng lời gọi gốc (đóng generator để trả slot ngay).
+                    parts.close()
+                    flight.finish(RuntimeError("Yêu cầu đã bị hủy."))
+                    return
+                flight.append(part)
+            flight.finish()
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            self._release(key, flight)
+
+    def generate(self, prompt: str, course_id: str | None = None, background: bool = False) -> Generation:
+        """
+        Sinh toàn bộ văn bản; prompt trùng với một lời gọi đang chạy sẽ dùng chung kết quả.
+        `background=True` cho các tác vụ nền, không có người dùng đang chờ (làn ưu tiên thấp).
+        """
+        parts = list(self._coalesced(prompt, course_id, background))
+        last = parts[-1] if parts else Generation("")
+        return Generation("".join(part.text for part in parts), last.prompt_tokens, last.response_tokens)
+
+    def _coalesced(self, prompt: str, course_id: str | None, background: bool) -> Iterator[Generation]:
+        key, flight, leader = self._join_or_lead(prompt)
+        if not leader:
+            yield from flight.follow()
+            return
+        try:
+            for part in self._run(prompt, course_id, lambda attempt: iter([self.backend.generate(prompt)]), background):
+                flight.append(part)
+                yield part
+            flight.finish()
+        except Exception as e:
+            flight.finish(e)
+            raise
+        finally:
+            self._release(key, flight)
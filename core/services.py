@@ -1,6 +1,9 @@
 # Ghi chú: "Bộ não" của ứng dụng. File này chứa toàn bộ logic xử lý dữ liệu và AI.
 # Nó được thiết kế để hoàn toàn độc lập với giao diện người dùng (không import streamlit).
 # Phiên bản này được viết lại để dài hơn, rõ ràng hơn và đầy đủ chức năng hơn.
+# Các dịch vụ (ChromaDB, mô hình Gemini, CourseManager, AIService...) được khởi tạo lười
+# qua các hàm get_*(): import module này không mở database hay gọi API, nên trang đầu
+# tiên hiện ra ngay mà không phải chờ những phần người dùng chưa dùng tới.
 
 # ==============================================================================
 # ĐOẠN CODE BẮT BUỘC ĐỂ SỬA LỖI SQLITE3 TRÊN STREAMLIT CLOUD
@@ -11,106 +14,71 @@ import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 # ==============================================================================
 
-import google.generativeai as genai
-import chromadb
-from pypdf import PdfReader
-import docx
-import requests
-from bs4 import BeautifulSoup
-from youtube_transcript_api import YouTubeTranscriptApi
-import tiktoken
-import time
-import re
 import json
-from unicodedata import normalize
+import time
+import hashlib
+import threading
+from dataclasses import asdict
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TYPE_CHECKING
 from config import (
-    GEMINI_API_KEY, GENERATIVE_MODEL_NAME, TEXT_CHUNK_SIZE,
-    TEXT_CHUNK_OVERLAP, VECTOR_DB_SEARCH_RESULTS, CHROMA_DB_PATH
+    CHROMA_DB_PATH, INGESTION_UPSERT_BATCH_SIZE, RETRIEVAL_TOP_K, SNAPSHOT_IMPORT_BATCH_SIZE, DEDUP_ENABLED
 )
+from core.documents import DocumentProcessor, slugify
+from core.ingestion import IngestionManager
+from core.manifest import SourceManifest, content_hash
+from core.embeddings import Embedder, EmbeddingMismatchError
+from core.llm import LLMBackend, Generation, create_llm_backend
+from core.chunking import TextChunker
+from core.answer_cache import AnswerCache
+from core.summarizer import MapReduceSummarizer
+from core.retrieval import LexicalIndex, HybridRetriever
+from core.context import ContextBuilder, BuiltContext, UsageTracker
+from core.chunking import count_tokens
+from core.catalog import CourseCatalog
+from core.scheduler import LLMScheduler, friendly_error
+from core.artifacts import ArtifactStore
+from core.conversations import ConversationStore
+from core.memory import ConversationMemory, ConversationState
+from core.metrics import Metrics, get_metrics
+from core.snapshot import CourseSnapshot, write_snapshot
+from core.translation import TranslationEngine
+from core.question_bank import QuestionBankBuilder, parse_questions
+from core.dedup import BoilerplateStripper, LSHIndex, minhash
 
-def slugify(value: str) -> str:
-    """
-    Chuyển đổi chuỗi Unicode (bao gồm Tiếng Việt) thành một chuỗi an toàn
-    để dùng làm ID hoặc tên file, tránh lỗi khi tương tác với hệ thống.
-    Đây là một hàm cực kỳ quan trọng để đảm bảo tính ổn định của hệ thống.
+if TYPE_CHECKING:
+    import chromadb
 
-    Args:
-        value (str): Chuỗi đầu vào cần xử lý.
+# --- Các dịch vụ toàn cục, mỗi process một instance, tạo ở lần dùng đầu tiên ---
+_services: dict[str, object] = {}
+_services_lock = threading.RLock()
 
-    Returns:
-        str: Chuỗi an toàn, đã được chuyển thành chữ thường, không dấu,
-             và thay thế khoảng trắng bằng dấu gạch ngang.
-    """
-    value = normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
-    value = re.sub(r'[^\w\s-]', '', value).strip().lower()
-    value = re.sub(r'[-\s]+', '-', value)
-    return value
-
-# --- Khởi tạo các dịch vụ toàn cục mà ứng dụng sẽ sử dụng ---
-# Cấu hình API key cho thư viện của Google.
-genai.configure(api_key=GEMINI_API_KEY)
-# Khởi tạo client kết nối tới ChromaDB, dữ liệu sẽ được lưu trên đĩa.
-chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-# Khởi tạo mô hình ngôn ngữ chính sẽ được sử dụng cho các tác vụ AI.
-generative_model = genai.GenerativeModel(GENERATIVE_MODEL_NAME)
-
-class DocumentProcessor:
-    """
-    Lớp này chịu trách nhiệm duy nhất cho việc trích xuất văn bản thô
-    từ các nguồn khác nhau (PDF, DOCX, URL, YouTube, Text).
-    Mỗi phương thức đều có error handling riêng để đảm bảo sự ổn định.
-    """
-    def extract_text(self, source_type: str, source_data: any) -> tuple[str | None, str]:
-        """
-        Phương thức chính để trích xuất văn bản.
+def _get_or_create(name: str, factory: Callable[[], object]):
+    with _services_lock:
+        if name not in _services:
+            _services[name] = factory()
+        return _services[name]
 
-        Args:
-            source_type (str): Loại nguồn ('pdf', 'docx', 'url', 'text').
-            source_data (any): Dữ liệu nguồn (file object, chuỗi URL, chuỗi văn bản).
+def get_chroma_client() -> "chromadb.ClientAPI":
+    """Client kết nối tới ChromaDB, dữ liệu được lưu trên đĩa."""
+    def create():
+        import chromadb
+        return chromadb.PersistentClient(path=CHROMA_DB_PATH)
+    return _get_or_create("chroma_client", create)
 
-        Returns:
-            tuple[str | None, str]: Một tuple chứa (nội dung văn bản, tên nguồn đã được xử lý).
-                                     Trả về (None, thông báo lỗi) nếu thất bại.
-        """
-        try:
-            if not source_data:
-                return None, "Nguồn dữ liệu rỗng."
-            
-            if source_type == 'pdf':
-                safe_name = slugify(source_data.name)
-                reader = PdfReader(source_data)
-                text = "".join(page.extract_text() + "\n" for page in reader.pages if page.extract_text())
-                return text, safe_name
-            
-            elif source_type == 'docx':
-                safe_name = slugify(source_data.name)
-                doc = docx.Document(source_data)
-                text = "\n".join([para.text for para in doc.paragraphs if para.text])
-                return text, safe_name
-            
-            elif source_type == 'text':
-                return source_data, "pasted-text"
-                
-            elif source_type == 'url':
-                if "youtube.com/watch?v=" in source_data or "youtu.be/" in source_data:
-                    video_id = source_data.split("v=")[-1].split('&')[0]
-                    if "/" in video_id: video_id = video_id.split("/")[-1]
-                    transcript_list = YouTubeTranscriptApi.get_transcript(video_id, languages=['vi', 'en'])
-                    text = " ".join([item['text'] for item in transcript_list])
-                    return text, f"youtube-{video_id}"
-
-                response = requests.get(source_data, headers={'User-Agent': 'Mozilla/5.0'})
-                response.raise_for_status()
-                soup = BeautifulSoup(response.content, 'html.parser')
-                for tag in soup(["script", "style", "nav", "footer", "header", "aside"]):
-                    tag.decompose()
-                text = ' '.join(t.get_text(separator=' ', strip=True) for t in soup.find_all(text=True))
-                title = slugify(soup.title.string.strip() if soup.title else source_data)
-                return text, title
-                
-        except Exception as e:
-            return None, f"Lỗi khi xử lý nguồn: {str(e)}"
-        return None, "Loại nguồn không được hỗ trợ."
+def get_llm_backend() -> LLMBackend:
+    """Backend mô hình (sinh văn bản + embedding) được chọn qua PNOTE_LLM_BACKEND."""
+    return _get_or_create("llm_backend", create_llm_backend)
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Bộ điều phối lời gọi mô hình, dùng chung cho mọi phiên trong process."""
+    return _get_or_create("llm_scheduler", lambda: LLMScheduler(get_llm_backend()))
+
+def _batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Chia một iterable (kể cả generator) thành các lô có tối đa `size` phần tử."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 class CourseManager:
     """
@@ -118,149 +86,911 @@ class CourseManager:
     Nó xử lý việc tạo, xóa, thêm tài liệu, và liệt kê các khóa học.
     Đây là lớp trừu tượng hóa việc giao tiếp với cơ sở dữ liệu.
     """
-    def __init__(self, client: chromadb.Client):
+    def __init__(self, client: "chromadb.ClientAPI", manifest: SourceManifest | None = None,
+                 embedder: Embedder | None = None, chunker: TextChunker | None = None,
+                 lexical_index: LexicalIndex | None = None, catalog: CourseCatalog | None = None,
+                 metrics: Metrics | None = None, dedup: bool = DEDUP_ENABLED):
         self.client = client
+        self.manifest = manifest or SourceManifest()
+        self.embedder = embedder or Embedder()
+        self.chunker = chunker or TextChunker()
+        self.lexical_index = lexical_index or LexicalIndex()
+        self.catalog = catalog or CourseCatalog(client, self.manifest)
+        self.metrics = metrics or get_metrics()
+        # Lọc header/footer lặp lại và chunk gần trùng trong cùng tài liệu khi nạp (core/dedup.py).
+        self.dedup = dedup
+        self._change_listeners: list[Callable[[str], None]] = [self.catalog.refresh]
+        # Phiên bản manifest đã biết của từng khóa học, để nhận ra thay đổi do process khác ghi.
+        self._seen_versions: dict[str, str] = {}
+        # Các khóa học đã được xác nhận dùng cùng mô hình embedding với embedder hiện tại.
+        self._embeddings_checked: set[str] = set()
+
+    def add_change_listener(self, listener: Callable[[str], None]):
+        """Đăng ký hàm được gọi (với course_id) mỗi khi nội dung của một khóa học thay đổi."""
+        self._change_listeners.append(listener)
+
+    def _notify_changed(self, course_id: str):
+        self._seen_versions[course_id] = self.manifest.version(course_id)
+        for listener in self._change_listeners:
+            listener(course_id)
+
+    def check_external_changes(self, course_id: str) -> bool:
+        """
+        Nhận ra thay đổi mà process khác (vd: cli.py) đã ghi vào manifest của khóa học và báo cho
+        các listener như một thay đổi trong process (xóa cache câu trả lời, bộ nhớ hội thoại...).
+        Manifest chỉ được đọc lại khi file trên đĩa đã đổi.
+
+        Returns:
+            bool: True nếu phát hiện thay đổi.
+        """
+        version = self.manifest.version(course_id)
+        if self._seen_versions.setdefault(course_id, version) == version:
+            return False
+        self._notify_changed(course_id)
+        return True
 
     def list_courses(self) -> list[dict]:
-        """Liệt kê tất cả các khóa học, trả về danh sách các dictionary."""
-        collections = self.client.list_collections()
-        course_list = []
-        for col in collections:
-            name = col.metadata.get("display_name", col.name) if col.metadata else col.name
-            course_list.append({"id": col.name, "name": name})
-        return course_list
+        """
+        Liệt kê tất cả các khóa học, trả về danh sách các dictionary gồm id, name và thống kê
+        (chunk_count, source_count, total_tokens, updated_at). Dữ liệu lấy từ catalog trong bộ nhớ.
+        """
+        return [asdict(stats) for stats in self.catalog.list_courses()]
 
     def get_course_details(self, course_id: str) -> dict | None:
         """Lấy chi tiết về một khóa học cụ thể."""
+        stats = self.catalog.get(course_id)
+        if stats is None:
+            return None
+        return {**asdict(stats), "count": stats.chunk_count}
+
+    def count_chunks(self, course_id: str) -> int:
+        """Số chunk của khóa học (từ catalog). Ném ra ValueError nếu khóa học không tồn tại."""
+        stats = self.catalog.get(course_id)
+        if stats is None:
+            raise ValueError(f"Không tìm thấy khóa học {course_id}.")
+        return stats.chunk_count
+
+    def get_or_create_course_collection(self, course_id: str, display_name: str) -> "chromadb.Collection":
+        """
+        Tạo một khóa học mới hoặc lấy khóa học đã có. Khóa học mới lưu tên gốc và mô hình embedding
+        (xem ensure_embeddings) vào metadata; metadata của khóa học đã có được giữ nguyên.
+        """
         try:
             collection = self.client.get_collection(name=course_id)
-            count = collection.count()
-            return {"name": collection.name, "count": count}
         except ValueError:
-            return None
+            collection = self.client.create_collection(
+                name=course_id, metadata={"display_name": display_name, "embedding_model": self.embedder.backend.name})
+        self.catalog.add_course(course_id, display_name)
+        return collection
+
+    def ensure_embeddings(self, course_id: str, collection: "chromadb.Collection", rebuild: bool = False) -> "chromadb.Collection":
+        """
+        Kiểm tra collection được tạo bằng cùng mô hình embedding với embedder hiện tại (metadata
+        "embedding_model"), vì vector của hai mô hình không so sánh được và ChromaDB từ chối vector
+        khác số chiều. Collection rỗng, hoặc collection cũ chưa ghi mô hình nhưng cùng số chiều, được
+        ghi nhận mô hình hiện tại. Khi không khớp: tính lại embedding nếu `rebuild`, ngược lại ném
+        EmbeddingMismatchError với hướng dẫn khắc phục.
 
-    def get_or_create_course_collection(self, course_id: str, display_name: str) -> chromadb.Collection:
-        """Tạo một khóa học mới hoặc lấy khóa học đã có, lưu tên gốc vào metadata."""
-        return self.client.get_or_create_collection(name=course_id, metadata={"display_name": display_name})
+        Returns:
+            chromadb.Collection: Collection dùng được (có thể đã được tạo lại khi tính lại embedding).
+        """
+        if course_id in self._embeddings_checked:
+            return collection
+        name = self.embedder.backend.name
+        metadata = collection.metadata or {}
+        stored = metadata.get("embedding_model")
+        if stored != name:
+            sample = collection.get(limit=1, include=["embeddings"])
+            dimensions = len(sample["embeddings"][0]) if sample["ids"] else None
+            if dimensions is not None and (stored is not None or dimensions != self.embedder.dimensions()):
+                if not rebuild:
+                    raise EmbeddingMismatchError(
+                        f"Khóa học này được tạo bằng mô hình embedding {stored or 'mặc định của ChromaDB'} "
+                        f"({dimensions} chiều), khác với mô hình hiện tại {name} ({self.embedder.dimensions()} chiều). "
+                        f"Hãy thêm một tài liệu vào khóa học (embedding sẽ được tính lại tự động) hoặc chạy: "
+                        f"python cli.py rebuild-embeddings {course_id}")
+                self.rebuild_embeddings(course_id)
+                self._embeddings_checked.add(course_id)
+                return self.client.get_collection(name=course_id)
+            collection.modify(metadata={**metadata, "embedding_model": name})
+        self._embeddings_checked.add(course_id)
+        return collection
     
     def delete_course(self, course_id: str) -> tuple[bool, str]:
         """Xóa một khóa học khỏi database."""
         try:
             self.client.delete_collection(name=course_id)
+            self._embeddings_checked.discard(course_id)
+            self.manifest.remove_course(course_id)
+            self.lexical_index.drop_course(course_id)
+            self.catalog.remove_course(course_id)
+            self._notify_changed(course_id)
             return True, f"Đã xóa thành công khóa học."
         except ValueError:
             return False, f"Lỗi: Không tìm thấy khóa học để xóa."
         except Exception as e:
             return False, f"Lỗi không xác định khi xóa: {e}"
 
-    def add_document(self, course_id: str, document_text: str, source_name: str) -> int:
-        """Thêm một tài liệu đã được xử lý vào một khóa học."""
+    def add_document(self, course_id: str, document: str | Iterable[str | tuple[str, dict]], source_name: str,
+                     source_hash: str | None = None) -> int:
+        """
+        Thêm (hoặc cập nhật) một tài liệu đã được xử lý vào một khóa học.
+        ID của chunk được tính từ hash nội dung nên việc thêm lại là idempotent:
+        - Tài liệu không đổi (cùng hash trong manifest): bỏ qua hoàn toàn.
+        - Tài liệu đã thay đổi: chỉ embed/upsert các chunk mới, xóa các chunk không còn tồn tại
+          và cập nhật metadata (vị trí, trang) của các chunk được giữ lại.
+        Các trang được chia chunk và ghi theo từng lô trong lúc đọc, nên với một generator
+        (vd: iter_pdf_pages) bộ nhớ chỉ phụ thuộc vào một cửa sổ trang chứ không phải cả tài liệu.
+
+        Args:
+            document (str | Iterable): Toàn bộ văn bản, hoặc các trang văn bản (list hoặc generator);
+                                       mỗi trang có thể kèm metadata dưới dạng (văn bản, dict).
+            source_hash (str | None): Hash của nguồn gốc (vd: bytes của file) nếu đã biết trước,
+                                      giúp bỏ qua tài liệu không đổi mà không cần trích xuất.
+
+        Returns:
+            int: Số chunk hiện có của tài liệu trong khóa học.
+        """
+        with self.metrics.timer("ingest.document", course=course_id):
+            return self._add_document(course_id, document, source_name, source_hash)
+
+    def _add_document(self, course_id: str, document: str | Iterable[str | tuple[str, dict]], source_name: str,
+                      source_hash: str | None) -> int:
         collection = self.client.get_collection(name=course_id)
-        chunks = self._split_text(document_text)
-        if not chunks: return 0
-        doc_ids = [f"{course_id}-{source_name}-{i}-{int(time.time() * 1000)}" for i in range(len(chunks))]
-        collection.add(documents=chunks, ids=doc_ids)
-        return len(chunks)
-
-    def _split_text(self, text: str) -> list[str]:
-        """Hàm nội bộ để chia nhỏ văn bản thành các chunks."""
-        tokenizer = tiktoken.get_encoding("cl100k_base")
-        tokens = tokenizer.encode(text)
-        chunks = []
-        for i in range(0, len(tokens), TEXT_CHUNK_SIZE - TEXT_CHUNK_OVERLAP):
-            chunks.append(tokenizer.decode(tokens[i:i + TEXT_CHUNK_SIZE]))
-        return chunks
+        previous = self.manifest.get(course_id, source_name)
+        if previous and source_hash and previous["hash"] == source_hash:
+            return previous["chunk_count"]
+        # Collection tạo bằng mô hình embedding khác được tính lại trước khi thêm vector mới.
+        collection = self.ensure_embeddings(course_id, collection, rebuild=True)
+
+        pages = [document] if isinstance(document, str) else document
+        hasher = hashlib.sha256()
+        token_count = 0
+        def hashed_pages():
+            for index, page in enumerate(pages):
+                text = page[0] if isinstance(page, tuple) else page
+                hasher.update((("\n" if index else "") + text).encode("utf-8"))
+                yield page
+
+        # Hash được tính trên văn bản gốc; số token tính trên văn bản thực sự được lưu (đã bỏ dòng lặp lại).
+        stripper = BoilerplateStripper() if self.dedup else None
+        def counted_pages():
+            nonlocal token_count
+            for page in stripper.strip(hashed_pages()) if stripper else hashed_pages():
+                token_count += count_tokens(page[0] if isinstance(page, tuple) else page)
+                yield page
+
+        old_ids = set(previous["chunk_ids"]) if previous else set()
+        chunk_ids: dict[str, None] = {}
+        kept: list[tuple[str, dict]] = []
+        inserted: list[str] = []
+        # Chữ ký MinHash của các chunk thuộc phiên bản mới của tài liệu này (chỉ so trong cùng tài liệu).
+        local = LSHIndex()
+        duplicates = 0
+        try:
+            # Thời gian chia chunk (với generator: gồm cả thời gian đọc trang).
+            chunks = self.metrics.timed_iter(self.chunker.iter_chunks(counted_pages(), source_name), "ingest.chunk", course=course_id)
+            for batch in _batched(chunks, INGESTION_UPSERT_BATCH_SIZE):
+                new_chunks = {}
+                for chunk in batch:
+                    chunk_id = self._chunk_id(source_name, chunk.text)
+                    # Bỏ qua chunk trùng lặp trong cùng tài liệu (giữ lần xuất hiện đầu tiên).
+                    if chunk_id in chunk_ids: continue
+                    chunk_ids[chunk_id] = None
+                    if self.dedup:
+                        # Chunk gần trùng với một chunk đứng trước trong tài liệu thì không lưu.
+                        signature = minhash(chunk.text)
+                        if local.find(signature):
+                            del chunk_ids[chunk_id]
+                            duplicates += 1
+                            continue
+                        local.add(chunk_id, signature)
+                    if chunk_id in old_ids:
+                        kept.append((chunk_id, chunk.metadata))
+                        continue
+                    new_chunks[chunk_id] = chunk
+                if new_chunks:
+                    texts = [chunk.text for chunk in new_chunks.values()]
+                    metadatas = [chunk.metadata for chunk in new_chunks.values()]
+                    with self.metrics.timer("embed.documents", course=course_id):
+                        embeddings = self.embedder.embed_documents(texts)
+                    with self.metrics.timer("chroma.upsert", course=course_id):
+                        collection.upsert(
+                            ids=list(new_chunks),
+                            documents=texts,
+                            metadatas=metadatas,
+                            embeddings=embeddings,
+                        )
+                    inserted.extend(new_chunks)
+                    with self.metrics.timer("bm25.add", course=course_id):
+                        self.lexical_index.add(course_id, list(new_chunks), texts, metadatas)
+        except Exception:
+            # Dọn các chunk đã ghi dở, để không để lại dữ liệu mồ côi ngoài manifest.
+            if inserted:
+                collection.delete(ids=inserted)
+                self.lexical_index.delete(course_id, inserted)
+            raise
+
+        document_hash = source_hash or hasher.hexdigest()
+        # Nội dung không đổi và cùng các chunk như lần trước: không có gì để ghi. Nếu cách chia chunk
+        # (hoặc lọc trùng lặp) đã đổi thì vẫn phải ghi nhận các chunk mới, nếu không chúng thành mồ côi.
+        if previous and previous["hash"] == document_hash and not inserted and chunk_ids.keys() == old_ids:
+            return previous["chunk_count"]
+        # Tài liệu mới rỗng thì không ghi nhận; phiên bản mới rỗng của một tài liệu đã có vẫn phải
+        # xóa các chunk cũ và ghi nhận lại nguồn (0 chunk), nếu không chunk cũ vẫn được tìm thấy.
+        if not chunk_ids and not previous: return 0
+        # Metadata của các chunk giữ lại chỉ được cập nhật khi tài liệu thực sự thay đổi.
+        for batch in _batched(kept, INGESTION_UPSERT_BATCH_SIZE):
+            collection.update(ids=[chunk_id for chunk_id, _ in batch], metadatas=[metadata for _, metadata in batch])
+            self.lexical_index.update_metadata(course_id, [chunk_id for chunk_id, _ in batch], [metadata for _, metadata in batch])
+        stale_ids = list(old_ids - chunk_ids.keys())
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            self.lexical_index.delete(course_id, stale_ids)
+        self.manifest.record(course_id, source_name, document_hash, list(chunk_ids), token_count)
+        self.metrics.increment("chunks.added", len(inserted), course=course_id)
+        self.metrics.increment("chunks.reused", len(kept), course=course_id)
+        if stripper:
+            self.metrics.increment("chunks.near_duplicates_skipped", duplicates, course=course_id)
+            self.metrics.increment("boilerplate.lines_removed", stripper.lines_removed, course=course_id)
+            self.metrics.increment("boilerplate.pages_removed", stripper.pages_removed, course=course_id)
+        self.metrics.increment("tokens.ingested", token_count, course=course_id)
+        self._notify_changed(course_id)
+        return len(chunk_ids)
+
+    def rebuild_embeddings(self, course_id: str, batch_size: int = INGESTION_UPSERT_BATCH_SIZE) -> int:
+        """
+        Tính lại embedding của mọi chunk trong khóa học bằng embedder hiện tại (vd: sau khi đổi
+        mô hình hoặc backend). Nếu số chiều thay đổi, collection được tạo lại với cùng dữ liệu.
+        Mô hình hiện tại được ghi vào metadata của collection.
+
+        Returns:
+            int: Số chunk đã được tính lại embedding.
+        """
+        collection = self.client.get_collection(name=course_id)
+        sample = collection.get(limit=1, include=["embeddings"])
+        old_dimensions = len(sample["embeddings"][0]) if sample["ids"] else None
+        batches = []
+        for offset in range(0, collection.count(), batch_size):
+            page = collection.get(offset=offset, limit=batch_size, include=["documents", "metadatas"])
+            batches.append((page["ids"], page["documents"], page["metadatas"], self.embedder.embed_documents(page["documents"])))
+        metadata = {**(collection.metadata or {}), "embedding_model": self.embedder.backend.name}
+        self._embeddings_checked.discard(course_id)
+        if not batches:
+            collection.modify(metadata=metadata)
+            return 0
+        if len(batches[0][3][0]) == old_dimensions:
+            for ids, _, _, embeddings in batches:
+                collection.update(ids=ids, embeddings=embeddings)
+            collection.modify(metadata=metadata)
+        else:
+            # ChromaDB cố định số chiều của một collection: phải xóa và tạo lại.
+            self.client.delete_collection(name=course_id)
+            collection = self.client.create_collection(name=course_id, metadata=metadata)
+            for ids, documents, metadatas, embeddings in batches:
+                collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+        self._notify_changed(course_id)
+        return sum(len(ids) for ids, *_ in batches)
+
+    def compact_course(self, course_id: str, batch_size: int = INGESTION_UPSERT_BATCH_SIZE) -> dict:
+        """
+        Dọn dẹp một khóa học: xóa các chunk mồ côi (chunk của một nguồn có trong manifest nhưng không
+        thuộc phiên bản đã ghi nhận, vd: process bị dừng giữa chừng), xóa các chunk gần trùng trong
+        cùng nguồn (khi bật lọc nội dung lặp lại), đồng bộ chỉ mục BM25 với ChromaDB, gộp chỉ mục và tính lại thống
+        kê. Chunk của nguồn không có trong manifest (vd: process khác đang nạp, hoặc khóa học cũ chưa
+        có manifest) không bao giờ bị xóa, chỉ được đếm.
+
+        Returns:
+            dict: Số chunk mồ côi đã xóa / giữ lại, số chunk gần trùng và số token đã xóa, số chunk
+                  được thêm vào / xóa khỏi chỉ mục BM25 và số chunk còn lại.
+        """
+        collection = self.client.get_collection(name=course_id)
+        chunk_ids = set(collection.get(include=[])["ids"])
+        # Manifest được đọc lại từ đĩa (có thể vừa được CLI / ứng dụng khác cập nhật).
+        sources = self.manifest.load(course_id)
+        unrecorded = chunk_ids - {chunk_id for entry in sources.values() for chunk_id in entry["chunk_ids"]}
+        orphans, unknown = set(), set()
+        for batch in _batched(unrecorded, batch_size):
+            page = collection.get(ids=batch, include=["metadatas"])
+            for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                (orphans if (metadata or {}).get("source") in sources else unknown).add(chunk_id)
+        for batch in _batched(orphans, batch_size):
+            collection.delete(ids=batch)
+        chunk_ids -= orphans
+        duplicates = self._remove_near_duplicates(course_id, collection, sources, chunk_ids - unknown, batch_size) if self.dedup else {}
+        chunk_ids -= duplicates.keys()
+
+        indexed = self.lexical_index.chunk_ids(course_id)
+        missing, extra = chunk_ids - indexed, indexed - chunk_ids
+        for batch in _batched(missing, batch_size):
+            page = collection.get(ids=batch, include=["documents", "metadatas"])
+            self.lexical_index.add(course_id, page["ids"], page["documents"], [metadata or {} for metadata in page["metadatas"]])
+        if extra:
+            self.lexical_index.delete(course_id, list(extra))
+        self.lexical_index.optimize(course_id)
+        self._notify_changed(course_id)
+        return {"orphans_removed": len(orphans), "orphans_kept": len(unknown), "near_duplicates_removed": len(duplicates),
+                "tokens_removed": sum(duplicates.values()), "lexical_added": len(missing), "lexical_removed": len(extra),
+                "chunks": len(chunk_ids)}
+
+    def _remove_near_duplicates(self, course_id: str, collection, sources: dict[str, dict], chunk_ids: set[str],
+                                batch_size: int) -> dict[str, int]:
+        """
+        Với từng nguồn trong manifest, tính chữ ký MinHash của các chunk (theo thứ tự trong nguồn) và
+        xóa các chunk gần trùng với một chunk đứng trước của cùng nguồn (như khi nạp tài liệu).
+        Trả về {ID chunk đã xóa: số token}.
+        """
+        removed = {}
+        for entry in sources.values():
+            index = LSHIndex()
+            for batch in _batched([chunk_id for chunk_id in entry["chunk_ids"] if chunk_id in chunk_ids], batch_size):
+                page = collection.get(ids=batch, include=["documents"])
+                texts = dict(zip(page["ids"], page["documents"]))
+                for chunk_id in batch:
+                    signature = minhash(texts[chunk_id])
+                    if index.find(signature):
+                        removed[chunk_id] = count_tokens(texts[chunk_id])
+                    else:
+                        index.add(chunk_id, signature)
+        for batch in _batched(removed, batch_size):
+            collection.delete(ids=batch)
+        if removed:
+            self.manifest.remove_chunks(course_id, removed)
+        return removed
+
+    def export_course(self, course_id: str, path: str, batch_size: int = SNAPSHOT_IMPORT_BATCH_SIZE) -> int:
+        """
+        Xuất khóa học (chunk, metadata, embedding, manifest, tên hiển thị) ra một file snapshot
+        (core/snapshot.py) để nhập lại ở instance khác hoặc nhân bản thành khóa học mới.
+
+        Returns:
+            int: Số chunk đã xuất.
+        """
+        collection = self.client.get_collection(name=course_id)
+        stats = self.catalog.get(course_id)
+
+        def batches():
+            for offset in range(0, collection.count(), batch_size):
+                page = collection.get(offset=offset, limit=batch_size, include=["documents", "metadatas", "embeddings"])
+                yield page["ids"], page["documents"], page["metadatas"], page["embeddings"]
+
+        header = {
+            "course_id": course_id,
+            "display_name": stats.name if stats else course_id,
+            "embedding_model": self.embedder.backend.name,
+            "sources": self.manifest.load(course_id),
+        }
+        return write_snapshot(path, header, batches())
+
+    def import_course(self, path: str, course_id: str | None = None, display_name: str | None = None,
+                      batch_size: int = SNAPSHOT_IMPORT_BATCH_SIZE) -> dict:
+        """
+        Nhập một snapshot thành khóa học mới bằng các lô ghi lớn, dùng lại embedding có sẵn.
+        Chỉ khi snapshot được tạo bằng mô hình embedding khác thì các chunk mới được embed lại.
+
+        Args:
+            path (str): File snapshot.
+            course_id (str | None): ID khóa học mới (mặc định: ID trong snapshot).
+            display_name (str | None): Tên hiển thị (mặc định: tên trong snapshot).
+            batch_size (int): Số chunk mỗi lô ghi.
+
+        Returns:
+            dict: ID và tên khóa học, số chunk đã nhập, và có phải embed lại hay không.
+        """
+        with CourseSnapshot(path) as snapshot:
+            header = snapshot.header
+            course_id = course_id or header["course_id"]
+            display_name = display_name or header["display_name"]
+            if self.catalog.get(course_id) is not None and self.count_chunks(course_id) > 0:
+                raise ValueError(f"Khóa học {course_id} đã tồn tại và có dữ liệu.")
+            # Embedding của mô hình khác không so sánh được với embedding câu hỏi hiện tại.
+            reembed = header["embedding_model"] != self.embedder.backend.name
+            collection = self.get_or_create_course_collection(course_id, display_name)
+            try:
+                for start in range(0, snapshot.count, batch_size):
+                    stop = min(start + batch_size, snapshot.count)
+                    ids, documents = header["ids"][start:stop], header["documents"][start:stop]
+                    metadatas = header["metadatas"][start:stop]
+                    embeddings = self.embedder.embed_documents(documents) if reembed else snapshot.embeddings(start, stop)
+                    collection.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+                    self.lexical_index.add(course_id, ids, documents, [metadata or {} for metadata in metadatas])
+                self.manifest.restore(course_id, header["sources"])
+            except Exception:
+                # Không để lại một khóa học nhập dở (có dữ liệu nhưng thiếu manifest), để có thể nhập lại.
+                self.delete_course(course_id)
+                raise
+        self._notify_changed(course_id)
+        return {"course_id": course_id, "name": display_name, "chunks": snapshot.count, "reembedded": reembed}
+
+    def source_text(self, course_id: str, source_name: str) -> str:
+        """Ghép lại văn bản của một nguồn từ các chunk (bỏ phần chồng lấn giữa các chunk liên tiếp)."""
+        entry = self.manifest.get(course_id, source_name)
+        if entry is None:
+            raise ValueError(f"Không tìm thấy nguồn {source_name} trong khóa học {course_id}.")
+        collection = self.client.get_collection(name=course_id)
+        rows = []
+        for batch in _batched(entry["chunk_ids"], 500):
+            page = collection.get(ids=batch, include=["documents", "metadatas"])
+            rows.extend(zip([metadata or {} for metadata in page["metadatas"]], page["documents"]))
+        rows.sort(key=lambda row: row[0].get("chunk_index", 0))
+        parts, end = [], None
+        for metadata, document in rows:
+            start = metadata.get("char_start")
+            if start is None or end is None:
+                parts.append(document if not parts else "\n\n" + document)
+            elif start < end:
+                parts.append(document[end - start:])
+            else:
+                parts.append(document)
+            end = metadata.get("char_end")
+        return "".join(parts)
+
+    @staticmethod
+    def _chunk_id(source_name: str, chunk: str) -> str:
+        """ID ổn định của chunk: tên nguồn + hash nội dung (không phụ thuộc thời điểm thêm)."""
+        return f"{source_name}-{content_hash(chunk)[:20]}"
 
 class AIService:
     """
     Lớp này chứa tất cả các logic nghiệp vụ liên quan đến AI.
     Mỗi chức năng là một phương thức riêng biệt với prompt được thiết kế cẩn thận.
     """
-    def __init__(self, course_manager: CourseManager):
+    def __init__(self, course_manager: CourseManager, answer_cache: AnswerCache | None = None,
+                 context_builder: ContextBuilder | None = None, llm: LLMBackend | None = None,
+                 scheduler: LLMScheduler | None = None, artifacts: ArtifactStore | None = None,
+                 memory: ConversationMemory | None = None, translator: TranslationEngine | None = None,
+                 question_bank: QuestionBankBuilder | None = None):
         self.course_manager = course_manager
+        self.metrics = course_manager.metrics
+        self.llm = llm or get_llm_backend()
+        # Mọi lời gọi mô hình đi qua bộ điều phối dùng chung (giới hạn đồng thời, thử lại, gộp prompt trùng).
+        self.scheduler = scheduler or (LLMScheduler(self.llm) if llm else get_llm_scheduler())
+        self.answer_cache = answer_cache or AnswerCache()
+        course_manager.add_change_listener(self.answer_cache.invalidate)
+        self.usage = UsageTracker()
+        self.context_builder = context_builder or ContextBuilder(usage=self.usage)
+        self.summarizer = MapReduceSummarizer(
+            course_manager, lambda prompt, course_id: self._generate(prompt, task="digest", course_id=course_id))
+        self.retriever = HybridRetriever(course_manager.lexical_index, metrics=course_manager.metrics)
+        # Kết quả tóm tắt / quiz / từ khóa được lưu lại và dùng chung cho tới khi tài liệu của khóa học thay đổi.
+        self.artifacts = artifacts or ArtifactStore()
+        course_manager.add_change_listener(self._prune_artifacts)
+        # Bộ nhớ hội thoại: hiểu câu hỏi nối tiếp và dùng lại các chunk vừa truy xuất.
+        self.memory = memory or ConversationMemory()
+        course_manager.add_change_listener(self.memory.forget_chunks)
+        # Văn bản dài được dịch theo từng đoạn song song, bản dịch từng đoạn được lưu lại để dùng chung.
+        self.translator = translator or TranslationEngine(
+            lambda prompt, course_id: self._generate(prompt, task="translation", course_id=course_id), metrics=self.metrics)
+        # Ngân hàng câu hỏi tạo sẵn ở chế độ nền: tạo quiz chỉ là lấy mẫu, không gọi mô hình.
+        # Lời gọi tạo câu hỏi đi làn ưu tiên thấp của bộ điều phối, không làm chậm chat / tóm tắt.
+        self.question_bank = question_bank or QuestionBankBuilder(
+            course_manager, lambda prompt, course_id: self._generate(prompt, task="question_bank", course_id=course_id,
+                                                                     background=True),
+            metrics=self.metrics)
+        course_manager.add_change_listener(self.question_bank.course_changed)
+
+    def _prune_artifacts(self, course_id: str):
+        self.artifacts.prune(course_id, self.course_manager.manifest.version(course_id))
 
-    def _get_full_context(self, course_id: str, max_chunks: int = 20) -> str | None:
-        """Hàm nội bộ để lấy toàn bộ hoặc một phần lớn ngữ cảnh của khóa học."""
+    def cached_artifact(self, course_id: str, tool: str, **params) -> str | None:
+        """
+        Kết quả (văn bản thô) đã lưu của một công cụ ("summary", "quiz", "keywords") cho nội dung
+        hiện tại của khóa học, hoặc None nếu chưa có / tài liệu đã thay đổi kể từ lúc tạo.
+        """
+        return self.artifacts.get(course_id, self.course_manager.manifest.version(course_id), tool, params)
+
+    def _generate_artifact(self, course_id: str, version: str, tool: str, prompt: str, params: dict | None = None,
+                           valid: Callable[[str], bool] | None = None) -> str:
+        """Gọi mô hình rồi lưu kết quả vào kho (nếu `valid` chấp nhận) theo phiên bản nội dung lúc bắt đầu."""
+        text = self._generate(prompt, task=tool, course_id=course_id)
+        if valid is None or valid(text):
+            self.artifacts.put(course_id, version, tool, text, params)
+        return text
+
+    def _stream_artifact(self, course_id: str, version: str, tool: str, prompt: str, params: dict | None = None,
+                         valid: Callable[[str], bool] | None = None) -> Iterator[str]:
+        """Phiên bản streaming của _generate_artifact: chỉ lưu khi đã nhận đủ phản hồi."""
+        parts = []
+        for part in self._stream_text(prompt, task=tool, course_id=course_id):
+            parts.append(part)
+            yield part
+        text = "".join(parts)
+        if valid is None or valid(text):
+            self.artifacts.put(course_id, version, tool, text, params)
+
+    def _artifact(self, course_id: str, version: str, tool: str, params: dict | None = None) -> str | None:
+        """Tra kho kết quả, đồng thời đếm lượt trúng/trượt."""
+        cached = self.artifacts.get(course_id, version, tool, params)
+        self.metrics.increment("cache.artifact", course=course_id, tool=tool, result="miss" if cached is None else "hit")
+        return cached
+
+    def _failed(self, tool: str, course_id: str | None, error: Exception) -> str:
+        """Đếm lỗi của công cụ và trả về thông báo lỗi dễ hiểu cho người dùng."""
+        self.metrics.increment("errors", course=course_id, tool=tool, error=type(error).__name__)
+        return friendly_error(error)
+
+    def _record_usage(self, task: str, prompt: str, response_text: str, generation: Generation | None,
+                      course_id: str | None = None):
+        """Ghi số token prompt/phản hồi (ưu tiên số liệu do backend trả về, nếu không thì tự đếm)."""
+        prompt_tokens = (generation and generation.prompt_tokens) or count_tokens(prompt)
+        response_tokens = (generation and generation.response_tokens) or count_tokens(response_text)
+        self.usage.record(task, prompt_tokens, response_tokens)
+        self.metrics.increment("tokens.prompt", prompt_tokens, course=course_id, tool=task)
+        self.metrics.increment("tokens.response", response_tokens, course=course_id, tool=task)
+
+    def _generate(self, prompt: str, task: str = "default", course_id: str | None = None, background: bool = False) -> str:
+        """Gọi mô hình (qua bộ điều phối) và trả về toàn bộ văn bản phản hồi; `background` cho tác vụ nền."""
+        with self.metrics.timer("llm.generate", course=course_id, tool=task):
+            generation = self.scheduler.generate(prompt, course_id, background)
+        self._record_usage(task, prompt, generation.text, generation, course_id)
+        return generation.text
+
+    def _get_full_context(self, course_id: str, task: str, max_chunks: int = 20) -> BuiltContext | None:
+        """
+        Hàm nội bộ để lấy ngữ cảnh bao quát toàn bộ khóa học: bản cô đọng map-reduce
+        từ mọi nguồn tài liệu. Nếu khóa học chưa có manifest (dữ liệu cũ) hoặc việc tóm tắt
+        thất bại, quay về cách cũ là lấy `max_chunks` chunk đầu tiên (được đếm trong metric
+        "digest.fallback" kèm lý do). Ngữ cảnh được giới hạn theo ngân sách token của `task`.
+        """
         try:
+            digest = self.summarizer.course_digest(course_id)
+            if digest:
+                return self.context_builder.build(digest, task)
+            self.metrics.increment("digest.fallback", course=course_id, tool=task, reason="empty")
+        except Exception as e:
+            self.metrics.increment("digest.fallback", course=course_id, tool=task, reason=type(e).__name__)
+        try:
+            chunk_count = self.course_manager.count_chunks(course_id)
+            if chunk_count == 0: return None
             collection = self.course_manager.client.get_collection(name=course_id)
-            if collection.count() == 0: return None
-            documents = collection.get(limit=min(collection.count(), max_chunks))
-            return "\n---\n".join(documents['documents'])
+            documents = collection.get(limit=min(chunk_count, max_chunks), include=["documents", "metadatas"])
+            return self.context_builder.build(
+                [(text, metadata or {}) for text, metadata in zip(documents['documents'], documents['metadatas'])], task)
         except Exception:
             return None
 
-    def get_chat_answer(self, course_id: str, question: str) -> str:
-        """Hàm trả lời câu hỏi RAG, đã được tối ưu và sửa lỗi logic."""
+    def _stream_text(self, prompt: str, task: str = "default", course_id: str | None = None) -> Iterator[str]:
+        """Gọi mô hình ở chế độ streaming, trả về từng đoạn văn bản ngay khi nhận được."""
+        parts, last = [], None
+        # Đo thời gian tới phần đầu tiên và thời gian sinh, không tính thời gian giao diện hiển thị từng phần.
+        start = time.perf_counter()
+        for part in self.metrics.timed_iter(self.scheduler.stream(prompt, course_id), "llm.stream", course=course_id, tool=task):
+            if last is None:
+                self.metrics.observe("llm.first_token", (time.perf_counter() - start) * 1000, course=course_id, tool=task)
+            last = part
+            if part.text:
+                parts.append(part.text)
+                yield part.text
+        self._record_usage(task, prompt, "".join(parts), last, course_id)
+
+    def _prepare_chat(self, course_id: str, question: str, conversation_id: str | None = None
+                      ) -> tuple[str | None, str | None, list[float] | None, int, ConversationState]:
+        """
+        Chuẩn bị cho một lượt chat. Trả về (câu trả lời có sẵn, prompt, embedding để lưu cache,
+        phiên bản cache, trạng thái hội thoại). Câu trả lời có sẵn là kết quả từ cache hoặc một
+        thông báo (không có tài liệu...); khi đó không cần gọi mô hình. Embedding là None khi
+        câu trả lời không được lưu vào cache (câu hỏi nối tiếp phụ thuộc vào lịch sử hội thoại).
+        Không có `conversation_id` thì câu hỏi được trả lời độc lập, không dùng bộ nhớ hội thoại.
+        """
+        # Tài liệu do CLI thêm/xóa: bỏ câu trả lời đã cache và chunk đã nhớ trước khi dùng chúng.
+        self.course_manager.check_external_changes(course_id)
+        state = self.memory.get(conversation_id, course_id) if conversation_id else ConversationState(course_id)
+        follow_up = self.memory.is_follow_up(state, question)
+        if not follow_up:
+            cached = self.answer_cache.get_exact(course_id, question)
+            if cached is not None:
+                self.metrics.increment("cache.answer", course=course_id, result="hit_exact")
+                return cached, None, None, 0, state
+        cache_version = self.answer_cache.version(course_id)
+
+        if self.course_manager.count_chunks(course_id) == 0:
+            return "Tôi không tìm thấy bất kỳ tài liệu nào trong khóa học này. Vui lòng thêm tài liệu và thử lại.", None, None, 0, state
+
+        # Câu hỏi nối tiếp: dùng lại các chunk vừa truy xuất nếu chúng chứa đủ các từ của câu hỏi mới,
+        # nếu không thì truy xuất với câu hỏi đã ghép câu hỏi trước.
+        query = self.memory.retrieval_query(state, question) if follow_up else question
+        results = self.memory.reusable_chunks(state, question, RETRIEVAL_TOP_K) if follow_up else []
+        query_embedding = None
+        if not results:
+            collection = self.course_manager.ensure_embeddings(course_id, self.course_manager.client.get_collection(name=course_id))
+            with self.metrics.timer("embed.query", course=course_id):
+                query_embedding = self.course_manager.embedder.embed_query(query)
+            if not follow_up:
+                cached = self.answer_cache.get_similar(course_id, query_embedding)
+                self.metrics.increment("cache.answer", course=course_id, result="miss" if cached is None else "hit_similar")
+                if cached is not None:
+                    return cached, None, None, 0, state
+            # Kết hợp tìm kiếm vector với BM25 để không bỏ sót thuật ngữ chính xác, nhờ đó chỉ cần ít chunk hơn.
+            with self.metrics.timer("retrieval", course=course_id):
+                results = self.retriever.retrieve(collection, course_id, query, query_embedding)
+            if follow_up:
+                results = self.memory.merge(state, query, results, RETRIEVAL_TOP_K)
+        else:
+            self.metrics.increment("chunks.reused_from_memory", len(results), course=course_id)
+        if not results:
+            return "Tôi không tìm thấy thông tin liên quan trong tài liệu để trả lời câu hỏi của bạn.", None, None, 0, state
+        self.memory.remember_chunks(state, results)
+
+        context = self.context_builder.build([(result.text, result.metadata) for result in results], "chat")
+        history = self.memory.render(state)
+        history = f"LỊCH SỬ HỘI THOẠI (để hiểu câu hỏi nối tiếp): {history} " if history else ""
+        prompt = f"""Bạn là PNote, trợ lý AI chuyên gia. Trả lời câu hỏi DỰA HOÀN TOÀN vào "NGỮ CẢNH" sau. QUY TẮC: 1. CHỈ dùng thông tin từ "NGỮ CẢNH". Nếu không có, nói: "Tôi không tìm thấy thông tin này trong tài liệu." 2. Trả lời trực tiếp, súc tích, chuyên nghiệp. 3. Không đưa ra ý kiến cá nhân. {history}NGỮ CẢNH: --- {context.text} --- CÂU HỎI: "{question}" """
+        return None, prompt, None if follow_up else query_embedding, cache_version, state
+
+    def get_chat_answer(self, course_id: str, question: str, conversation_id: str | None = None) -> str:
+        """
+        Hàm trả lời câu hỏi RAG. Câu hỏi trùng hoặc gần trùng với một câu đã được trả lời
+        trong khóa học sẽ lấy ngay từ cache, không truy vấn ChromaDB và không gọi mô hình.
+        `conversation_id` xác định cuộc hội thoại chứa câu hỏi (riêng cho từng phiên, không dùng chung
+        giữa các người dùng); không có thì câu hỏi được trả lời độc lập.
+        """
         try:
-            collection = self.course_manager.client.get_collection(name=course_id)
-            if collection.count() == 0:
-                return "Tôi không tìm thấy bất kỳ tài liệu nào trong khóa học này. Vui lòng thêm tài liệu và thử lại."
-            
-            results = collection.query(query_texts=[question], n_results=VECTOR_DB_SEARCH_RESULTS)
-            if not results['documents'] or not results['documents'][0]:
-                return "Tôi không tìm thấy thông tin liên quan trong tài liệu để trả lời câu hỏi của bạn."
-
-            context = "\n---\n".join(results['documents'][0])
-            prompt = f"""Bạn là PNote, trợ lý AI chuyên gia. Trả lời câu hỏi DỰA HOÀN TOÀN vào "NGỮ CẢNH" sau. QUY TẮC: 1. CHỈ dùng thông tin từ "NGỮ CẢNH". Nếu không có, nói: "Tôi không tìm thấy thông tin này trong tài liệu." 2. Trả lời trực tiếp, súc tích, chuyên nghiệp. 3. Không đưa ra ý kiến cá nhân. NGỮ CẢNH: --- {context} --- CÂU HỎI: "{question}" """
-            response = generative_model.generate_content(prompt)
-            return response.text
+            answer, prompt, query_embedding, cache_version, state = self._prepare_chat(course_id, question, conversation_id)
+            if answer is None:
+                answer = self._generate(prompt, task="chat", course_id=course_id)
+                if query_embedding is not None:
+                    self.answer_cache.put(course_id, question, answer, query_embedding, version=cache_version)
+            self.memory.record_turn(state, question, answer)
+            return answer
+        except EmbeddingMismatchError as e:
+            return f"Lỗi: {e}"
         except ValueError:
             return "Lỗi: Không tìm thấy khóa học này. Có thể nó đã bị xóa hoặc chưa được tạo."
         except Exception as e:
-            return f"Đã xảy ra một lỗi không mong muốn khi truy vấn: {str(e)}"
+            return f"Đã xảy ra một lỗi không mong muốn khi truy vấn: {self._failed('chat', course_id, e)}"
+
+    def stream_chat_answer(self, course_id: str, question: str, conversation_id: str | None = None) -> Iterator[str]:
+        """Phiên bản streaming của get_chat_answer: trả về từng phần câu trả lời ngay khi mô hình sinh ra."""
+        try:
+            answer, prompt, query_embedding, cache_version, state = self._prepare_chat(course_id, question, conversation_id)
+            if answer is not None:
+                self.memory.record_turn(state, question, answer)
+                yield answer
+                return
+            parts = []
+            for part in self._stream_text(prompt, task="chat", course_id=course_id):
+                parts.append(part)
+                yield part
+            answer = "".join(parts)
+            if query_embedding is not None:
+                self.answer_cache.put(course_id, question, answer, query_embedding, version=cache_version)
+            self.memory.record_turn(state, question, answer)
+        except EmbeddingMismatchError as e:
+            yield f"Lỗi: {e}"
+        except ValueError:
+            yield "Lỗi: Không tìm thấy khóa học này. Có thể nó đã bị xóa hoặc chưa được tạo."
+        except Exception as e:
+            yield f"Đã xảy ra một lỗi không mong muốn khi truy vấn: {self._failed('chat', course_id, e)}"
+
+    def _summary_prompt(self, course_id: str) -> str | None:
+        context = self._get_full_context(course_id, "summary")
+        if not context: return None
+        return f"""Dựa vào toàn bộ "NGỮ CẢNH" dưới đây, hãy viết một bản tóm tắt súc tích, gãy gọn, và đi vào trọng tâm. Chia câu trả lời thành các gạch đầu dòng với các ý chính. NGỮ CẢNH: --- {context.text} --- TÓM TẮT:"""
 
     def summarize_course(self, course_id: str) -> str:
-        """Tạo bản tóm tắt cho toàn bộ khóa học."""
-        context = self._get_full_context(course_id)
-        if not context:
+        """Tạo bản tóm tắt cho toàn bộ khóa học (dùng lại bản đã lưu nếu tài liệu chưa đổi)."""
+        version = self.course_manager.manifest.version(course_id)
+        cached = self._artifact(course_id, version, "summary")
+        if cached is not None:
+            return cached
+        prompt = self._summary_prompt(course_id)
+        if not prompt:
             return "Không có đủ dữ liệu để tạo tóm tắt. Vui lòng thêm tài liệu."
-        
-        prompt = f"""Dựa vào toàn bộ "NGỮ CẢNH" dưới đây, hãy viết một bản tóm tắt súc tích, gãy gọn, và đi vào trọng tâm. Chia câu trả lời thành các gạch đầu dòng với các ý chính. NGỮ CẢNH: --- {context} --- TÓM TẮT:"""
         try:
-            response = generative_model.generate_content(prompt)
-            return response.text
+            return self._generate_artifact(course_id, version, "summary", prompt)
         except Exception as e:
-            return f"Lỗi khi tóm tắt: {e}"
+            return f"Lỗi khi tóm tắt: {self._failed('summary', course_id, e)}"
 
-    def generate_quiz(self, course_id: str, num_questions: int = 5) -> list | str:
-        """Tạo câu hỏi trắc nghiệm từ nội dung khóa học."""
-        context = self._get_full_context(course_id)
-        if not context:
+    def stream_summary(self, course_id: str) -> Iterator[str]:
+        """Phiên bản streaming của summarize_course."""
+        version = self.course_manager.manifest.version(course_id)
+        cached = self._artifact(course_id, version, "summary")
+        if cached is not None:
+            yield cached
+            return
+        prompt = self._summary_prompt(course_id)
+        if not prompt:
+            yield "Không có đủ dữ liệu để tạo tóm tắt. Vui lòng thêm tài liệu."
+            return
+        try:
+            yield from self._stream_artifact(course_id, version, "summary", prompt)
+        except Exception as e:
+            yield f"Lỗi khi tóm tắt: {self._failed('summary', course_id, e)}"
+
+    def _quiz_prompt(self, course_id: str, num_questions: int) -> str | None:
+        context = self._get_full_context(course_id, "quiz")
+        if not context: return None
+        return f"""Bạn là một chuyên gia tạo câu hỏi thi. Dựa vào "NGỮ CẢNH", hãy tạo ra {num_questions} câu hỏi trắc nghiệm (MCQ) để kiểm tra kiến thức. Trả lời dưới dạng một danh sách JSON. Mỗi đối tượng JSON phải có các key: "question", "options" (một danh sách 4 lựa chọn), và "answer" (đáp án đúng). NGỮ CẢNH: --- {context.text} --- DANH SÁCH JSON:"""
+
+    @staticmethod
+    def parse_quiz(text: str) -> list | str:
+        """Chuyển phản hồi JSON của mô hình thành danh sách câu hỏi hợp lệ, hoặc thông báo lỗi."""
+        return parse_questions(text) or "Rất tiếc, tôi không thể tạo câu hỏi từ tài liệu này. Vui lòng thử lại với tài liệu khác."
+
+    @classmethod
+    def _is_quiz(cls, text: str) -> bool:
+        return isinstance(cls.parse_quiz(text), list)
+
+    def sample_quiz(self, course_id: str, num_questions: int = 5, sources: list[str] | None = None,
+                    topic: str | None = None) -> list[dict] | None:
+        """
+        Lấy ngẫu nhiên câu hỏi từ ngân hàng câu hỏi (không gọi mô hình). Trả về None nếu ngân hàng
+        chưa đủ câu hỏi (khi có bộ lọc: không có câu nào phù hợp); khi đó ngân hàng được xếp lịch làm mới.
+        """
+        with self.metrics.timer("quiz.sample", course=course_id):
+            questions = self.question_bank.sample(course_id, num_questions, sources, topic)
+        if len(questions) >= num_questions or (questions and (sources or topic)):
+            self.metrics.increment("cache.question_bank", course=course_id, result="hit")
+            return questions
+        self.metrics.increment("cache.question_bank", course=course_id, result="miss")
+        if self.question_bank.auto_build:
+            self.question_bank.schedule(course_id)
+        return None
+
+    def generate_quiz(self, course_id: str, num_questions: int = 5, sources: list[str] | None = None,
+                      topic: str | None = None) -> list | str:
+        """
+        Tạo câu hỏi trắc nghiệm: lấy từ ngân hàng câu hỏi nếu có đủ, nếu không thì sinh trực tiếp
+        từ nội dung khóa học (bỏ qua bộ lọc nguồn / chủ đề).
+        """
+        questions = self.sample_quiz(course_id, num_questions, sources, topic)
+        if questions is not None:
+            return questions
+        version = self.course_manager.manifest.version(course_id)
+        cached = self._artifact(course_id, version, "quiz", {"num_questions": num_questions})
+        if cached is not None:
+            return self.parse_quiz(cached)
+        prompt = self._quiz_prompt(course_id, num_questions)
+        if not prompt:
             return "Không có đủ dữ liệu để tạo câu hỏi. Vui lòng thêm tài liệu."
-            
-        prompt = f"""Bạn là một chuyên gia tạo câu hỏi thi. Dựa vào "NGỮ CẢNH", hãy tạo ra {num_questions} câu hỏi trắc nghiệm (MCQ) để kiểm tra kiến thức. Trả lời dưới dạng một danh sách JSON. Mỗi đối tượng JSON phải có các key: "question", "options" (một danh sách 4 lựa chọn), và "answer" (đáp án đúng). NGỮ CẢNH: --- {context} --- DANH SÁCH JSON:"""
         try:
-            response = generative_model.generate_content(prompt)
-            json_string = response.text.strip().replace("```json", "").replace("```", "")
-            return json.loads(json_string)
-        except Exception:
+            return self.parse_quiz(self._generate_artifact(course_id, version, "quiz", prompt, {"num_questions": num_questions},
+                                                           valid=self._is_quiz))
+        except Exception as e:
+            self._failed("quiz", course_id, e)
             return "Rất tiếc, tôi không thể tạo câu hỏi từ tài liệu này. Vui lòng thử lại với tài liệu khác."
 
+    def stream_quiz(self, course_id: str, num_questions: int = 5, sources: list[str] | None = None,
+                    topic: str | None = None) -> Iterator[str]:
+        """
+        Phiên bản streaming của generate_quiz: trả về văn bản JSON thô trong lúc sinh,
+        để hiển thị tiến độ. Người gọi ghép lại và dùng parse_quiz để lấy danh sách câu hỏi.
+        Câu hỏi lấy từ ngân hàng được trả về ngay trong một lần.
+        """
+        questions = self.sample_quiz(course_id, num_questions, sources, topic)
+        if questions is not None:
+            yield json.dumps(questions, ensure_ascii=False)
+            return
+        version = self.course_manager.manifest.version(course_id)
+        cached = self._artifact(course_id, version, "quiz", {"num_questions": num_questions})
+        if cached is not None:
+            yield cached
+            return
+        prompt = self._quiz_prompt(course_id, num_questions)
+        if not prompt:
+            yield "Không có đủ dữ liệu để tạo câu hỏi. Vui lòng thêm tài liệu."
+            return
+        try:
+            yield from self._stream_artifact(course_id, version, "quiz", prompt, {"num_questions": num_questions},
+                                             valid=self._is_quiz)
+        except Exception as e:
+            self._failed("quiz", course_id, e)
+            yield "Rất tiếc, tôi không thể tạo câu hỏi từ tài liệu này. Vui lòng thử lại với tài liệu khác."
+
+    def _keywords_prompt(self, course_id: str, num_keywords: int) -> str | None:
+        context = self._get_full_context(course_id, "keywords")
+        if not context: return None
+        return f"""Dựa vào "NGỮ CẢNH", hãy xác định {num_keywords} từ khóa hoặc khái niệm quan trọng nhất. Liệt kê chúng dưới dạng danh sách, mỗi từ khóa trên một dòng. NGỮ CẢNH: --- {context.text} --- TỪ KHÓA:"""
+
+    @staticmethod
+    def parse_keywords(text: str) -> list[str]:
+        """Tách phản hồi của mô hình (mỗi từ khóa một dòng) thành danh sách từ khóa."""
+        return [line.strip().replace("-", "").strip() for line in text.split("\n") if line.strip()]
+
     def extract_keywords(self, course_id: str, num_keywords: int = 10) -> list | str:
         """Trích xuất các từ khóa/khái niệm quan trọng."""
-        context = self._get_full_context(course_id)
-        if not context:
+        version = self.course_manager.manifest.version(course_id)
+        cached = self._artifact(course_id, version, "keywords", {"num_keywords": num_keywords})
+        if cached is not None:
+            return self.parse_keywords(cached)
+        prompt = self._keywords_prompt(course_id, num_keywords)
+        if not prompt:
             return "Không có đủ dữ liệu để trích xuất từ khóa. Vui lòng thêm tài liệu."
-        
-        prompt = f"""Dựa vào "NGỮ CẢNH", hãy xác định {num_keywords} từ khóa hoặc khái niệm quan trọng nhất. Liệt kê chúng dưới dạng danh sách, mỗi từ khóa trên một dòng. NGỮ CẢNH: --- {context} --- TỪ KHÓA:"""
         try:
-            response = generative_model.generate_content(prompt)
-            keywords = [line.strip().replace("-", "").strip() for line in response.text.split("\n") if line.strip()]
-            return keywords
+            return self.parse_keywords(self._generate_artifact(course_id, version, "keywords", prompt, {"num_keywords": num_keywords}))
         except Exception as e:
-            return f"Lỗi khi trích xuất từ khóa: {e}"
+            return f"Lỗi khi trích xuất từ khóa: {self._failed('keywords', course_id, e)}"
 
-    def translate_text(self, text_to_translate: str, target_language: str = "Tiếng Việt") -> str:
-        """Dịch văn bản bằng Gemini."""
+    def stream_keywords(self, course_id: str, num_keywords: int = 10) -> Iterator[str]:
+        """Phiên bản streaming của extract_keywords (văn bản thô, mỗi từ khóa một dòng)."""
+        version = self.course_manager.manifest.version(course_id)
+        cached = self._artifact(course_id, version, "keywords", {"num_keywords": num_keywords})
+        if cached is not None:
+            yield cached
+            return
+        prompt = self._keywords_prompt(course_id, num_keywords)
+        if not prompt:
+            yield "Không có đủ dữ liệu để trích xuất từ khóa. Vui lòng thêm tài liệu."
+            return
+        try:
+            yield from self._stream_artifact(course_id, version, "keywords", prompt, {"num_keywords": num_keywords})
+        except Exception as e:
+            yield f"Lỗi khi trích xuất từ khóa: {self._failed('keywords', course_id, e)}"
+
+    def translate_text(self, text_to_translate: str, target_language: str = "Tiếng Việt", course_id: str | None = None) -> str:
+        """Dịch văn bản (chia đoạn, dịch song song, dùng lại bản dịch đã có trong bộ nhớ dịch)."""
         if not text_to_translate: return ""
-        prompt = f"Translate the following text to {target_language}. Respond with only the translated text, no additional explanations:\n\n{text_to_translate}"
         try:
-            response = generative_model.generate_content(prompt)
-            return response.text
+            return self.translator.translate(text_to_translate, target_language, course_id)
         except Exception as e:
-            return f"Lỗi dịch thuật: {e}"
+            return f"Lỗi dịch thuật: {self._failed('translation', course_id, e)}"
+
+    def stream_translation(self, text_to_translate: str, target_language: str = "Tiếng Việt",
+                           course_id: str | None = None) -> Iterator[str]:
+        """Phiên bản streaming của translate_text: trả về bản dịch từng đoạn theo thứ tự."""
+        if not text_to_translate: return
+        try:
+            yield from self.translator.stream(text_to_translate, target_language, course_id)
+        except Exception as e:
+            yield f"Lỗi dịch thuật: {self._failed('translation', course_id, e)}"
+
+    def translate_course(self, course_id: str, target_language: str) -> dict:
+        """
+        Dịch trước mọi nguồn của khóa học. Bản dịch của từng nguồn được lưu vào kho kết quả
+        (công cụ "translation", tham số: ngôn ngữ và tên nguồn) và các đoạn vào bộ nhớ dịch, nên
+        lần dịch sau (kể cả sau khi tài liệu đổi một phần) chỉ phải dịch các đoạn mới.
+
+        Returns:
+            dict: Số nguồn đã dịch, số nguồn lấy lại từ kho kết quả và số nguồn bị lỗi.
+        """
+        version = self.course_manager.manifest.version(course_id)
+        report = {"translated": 0, "cached": 0, "failed": 0}
+        for source_name in sorted(self.course_manager.manifest.load(course_id)):
+            params = {"language": target_language, "source": source_name}
+            if self._artifact(course_id, version, "translation", params) is not None:
+                report["cached"] += 1
+                continue
+            try:
+                text = self.course_manager.source_text(course_id, source_name)
+                translation = self.translator.translate(text, target_language, course_id)
+            except Exception as e:
+                self._failed("translation", course_id, e)
+                report["failed"] += 1
+                continue
+            self.artifacts.put(course_id, version, "translation", translation, params)
+            report["translated"] += 1
+        return report
+
+def get_document_processor() -> DocumentProcessor:
+    return _get_or_create("document_processor_service", DocumentProcessor)
+
+def get_course_manager() -> CourseManager:
+    return _get_or_create("course_manager_service",
+                          lambda: CourseManager(get_chroma_client(), embedder=Embedder(get_llm_backend().embedding_backend())))
+
+def get_ai_service() -> AIService:
+    return _get_or_create("ai_service", lambda: AIService(get_course_manager()))
+
+def get_ingestion_service() -> IngestionManager:
+    return _get_or_create("ingestion_service", lambda: IngestionManager(get_course_manager()))
+
+def get_conversation_store() -> ConversationStore:
+    return _get_or_create("conversation_store", ConversationStore)
+
+# Tên cũ của các instance (vd: `from core.services import ai_service`) vẫn dùng được,
+# nhưng chỉ được tạo khi thực sự được truy cập.
+_LAZY_ATTRIBUTES = {
+    "chroma_client": get_chroma_client,
+    "llm_backend": get_llm_backend,
+    "llm_scheduler": get_llm_scheduler,
+    "document_processor_service": get_document_processor,
+    "course_manager_service": get_course_manager,
+    "ai_service": get_ai_service,
+    "ingestion_service": get_ingestion_service,
+    "conversation_store": get_conversation_store,
+}
 
-# Khởi tạo các instance của services để các module khác import
-document_processor_service = DocumentProcessor()
-course_manager_service = CourseManager(chroma_client)
-ai_service = AIService(course_manager_service)
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
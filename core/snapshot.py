@@ -0,0 +1,110 @@
+# Ghi chú: Định dạng snapshot của một khóa học (một file duy nhất) để chuyển khóa học giữa các
+# instance hoặc nhân bản một khóa học mẫu mà không phải nạp lại tài liệu và tính lại embedding.
+# Bố cục file:
+#     [0:64)    phần đầu cố định: magic, phiên bản, vị trí và độ dài của header
+#     [64:H)    embedding của mọi chunk: mảng float32 liên tục (số chunk x số chiều)
+#     [H:...)   header JSON nén zlib: tên khóa học, mô hình embedding, số chiều, manifest các
+#               nguồn, ID / nội dung / metadata của từng chunk (cùng thứ tự với embedding)
+# Phần embedding được ánh xạ bộ nhớ (mmap) khi đọc, nên việc nhập chỉ đọc đúng các lô đang ghi
+# vào ChromaDB, không phải nạp cả khối vector vào RAM.
+
+import os
+import sys
+import json
+import mmap
+import zlib
+import time
+import struct
+from array import array
+from typing import Iterable
+
+SNAPSHOT_MAGIC = b"PNOTESNP"
+SNAPSHOT_VERSION = 1
+# magic, phiên bản, vị trí header, độ dài header (little-endian), đệm tới 64 byte.
+_PREFIX = struct.Struct("<8sIQQ")
+_DATA_OFFSET = 64
+_FLOAT_SIZE = array("f").itemsize
+
+def write_snapshot(path: str, header: dict, batches: Iterable[tuple[list[str], list[str], list[dict], list[list[float]]]]) -> int:
+    """
+    Ghi một snapshot. Embedding được ghi dần theo từng lô; ID, nội dung và metadata được gom vào header.
+    File được ghi ra file tạm rồi đổi tên, nên không bao giờ để lại một snapshot dở dang.
+
+    Args:
+        path (str): Đường dẫn file snapshot.
+        header (dict): Thông tin khóa học (tên, mô hình embedding, manifest...).
+        batches: Các lô (ids, documents, metadatas, embeddings).
+
+    Returns:
+        int: Số chunk đã ghi.
+    """
+    ids, documents, metadatas = [], [], []
+    dimensions = None
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * _DATA_OFFSET)
+        for batch_ids, batch_documents, batch_metadatas, embeddings in batches:
+            for embedding in embeddings:
+                if dimensions is None:
+                    dimensions = len(embedding)
+                elif len(embedding) != dimensions:
+                    raise ValueError("Các embedding trong khóa học không cùng số chiều.")
+                f.write(array("f", embedding).tobytes())
+            ids.extend(batch_ids)
+            documents.extend(batch_documents)
+            metadatas.extend(batch_metadatas)
+        header = {**header, "count": len(ids), "dimensions": dimensions or 0, "byteorder": sys.byteorder,
+                  "created_at": time.time(), "ids": ids, "documents": documents, "metadatas": metadatas}
+        payload = zlib.compress(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+        header_offset = f.tell()
+        f.write(payload)
+        f.seek(0)
+        f.write(_PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, header_offset, len(payload)))
+    os.replace(tmp_path, path)
+    return len(ids)
+
+class CourseSnapshot:
+    """
+    Một snapshot đã mở để đọc. `header` chứa thông tin khóa học và các chunk; `embeddings(start, stop)`
+    đọc một lô vector trực tiếp từ vùng nhớ ánh xạ của file. Dùng trong câu lệnh `with` để đóng file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            magic, version, header_offset, header_length = _PREFIX.unpack(self._file.read(_PREFIX.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} không phải là file snapshot khóa học.")
+            if version > SNAPSHOT_VERSION:
+                raise ValueError(f"Snapshot phiên bản {version} mới hơn phiên bản được hỗ trợ ({SNAPSHOT_VERSION}).")
+            self._file.seek(header_offset)
+            self.header = json.loads(zlib.decompress(self._file.read(header_length)))
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self.count = self.header["count"]
+        self.dimensions = self.header["dimensions"]
+        self._row_bytes = self.dimensions * _FLOAT_SIZE
+        if header_offset - _DATA_OFFSET != self.count * self._row_bytes:
+            self.close()
+            raise ValueError(f"Snapshot {path} bị hỏng: số lượng embedding không khớp với header.")
+
+    def embeddings(self, start: int, stop: int) -> list[list[float]]:
+        """Embedding của các chunk [start, stop)."""
+        values = array("f")
+        values.frombytes(self._mmap[_DATA_OFFSET + start * self._row_bytes:_DATA_OFFSET + stop * self._row_bytes])
+        if self.header["byteorder"] != sys.byteorder:
+            values.byteswap()
+        return [values[i:i + self.dimensions].tolist() for i in range(0, len(values), self.dimensions)]
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "CourseSnapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,191 @@
+# Ghi chú: Bộ tóm tắt map-reduce cho toàn bộ khóa học.
+# Trước đây các công cụ tóm tắt / quiz / từ khóa chỉ thấy ~20 chunk đầu tiên. Giờ:
+# 1. MAP: các chunk của mỗi nguồn được gom thành nhóm (theo số token) và tóm tắt song song.
+# 2. REDUCE: các bản tóm tắt được gom lại và tóm tắt tiếp, đệ quy cho tới khi còn một bản.
+# 3. Bản tóm tắt của từng nguồn được lưu lại theo hash nội dung nguồn (từ manifest), nên
+#    khi thêm một tài liệu mới chỉ cần tính nhánh của tài liệu đó và bước reduce cuối cùng.
+# Các lời gọi mô hình chạy song song nhưng bị giới hạn số luồng và khoảng cách tối thiểu.
+
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from config import (
+    SUMMARY_STORE_DIR, SUMMARY_GROUP_TOKENS, SUMMARY_MAX_CONCURRENCY, SUMMARY_MIN_REQUEST_INTERVAL
+)
+from core.chunking import count_tokens
+
+MAP_PROMPT = """Tóm tắt đoạn tài liệu dưới đây thành các gạch đầu dòng ngắn gọn. Giữ lại đầy đủ các khái niệm, định nghĩa, thuật ngữ, tên riêng, mốc thời gian và số liệu quan trọng. Không thêm thông tin ngoài tài liệu. TÀI LIỆU: --- {text} --- TÓM TẮT:"""
+REDUCE_PROMPT = """Dưới đây là các bản tóm tắt của những phần liên tiếp trong cùng một tài liệu. Hãy hợp nhất chúng thành MỘT bản tóm tắt duy nhất dạng gạch đầu dòng, loại bỏ ý trùng lặp nhưng giữ lại mọi khái niệm, thuật ngữ, tên riêng và số liệu quan trọng. CÁC BẢN TÓM TẮT: --- {text} --- BẢN TÓM TẮT HỢP NHẤT:"""
+
+class _RateLimiter:
+    """Đảm bảo hai lời gọi mô hình liên tiếp cách nhau ít nhất `min_interval` giây."""
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next_time - now)
+            self._next_time = max(now, self._next_time) + self.min_interval
+        if delay:
+            time.sleep(delay)
+
+class SummaryStore:
+    """
+    Lưu các bản tóm tắt trung gian của một khóa học vào file JSON:
+    {"sources": {tên nguồn: {"hash", "summary"}}, "digest": {"key", "text"}}.
+    """
+    def __init__(self, root: str = SUMMARY_STORE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, course_id: str) -> str:
+        return os.path.join(self.root, f"{course_id}.json")
+
+    def load(self, course_id: str) -> dict:
+        try:
+            with open(self._path(course_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"sources": {}, "digest": None}
+
+    def save(self, course_id: str, data: dict):
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = self._path(course_id) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(course_id))
+
+    def remove(self, course_id: str):
+        try:
+            os.remove(self._path(course_id))
+        except FileNotFoundError:
+            pass
+
+def group_by_tokens(texts: list[str], max_tokens: int) -> list[str]:
+    """Gom các đoạn văn liên tiếp thành nhóm có tổng số token không vượt quá `max_tokens`."""
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+class MapReduceSummarizer:
+    """
+    Tính "bản cô đọng" (digest) của một khóa học từ bản tóm tắt của từng nguồn.
+    `generate(prompt, course_id)` gọi mô hình và trả về văn bản (được AIService cung cấp).
+    """
+    def __init__(self, course_manager, generate: Callable[[str, str | None], str], store: SummaryStore | None = None,
+                 group_tokens: int = SUMMARY_GROUP_TOKENS, max_workers: int = SUMMARY_MAX_CONCURRENCY,
+                 min_interval: float = SUMMARY_MIN_REQUEST_INTERVAL):
+        self.course_manager = course_manager
+        self.generate = generate
+        self.store = store or SummaryStore()
+        self.group_tokens = group_tokens
+        self.max_workers = max_workers
+        self._limiter = _RateLimiter(min_interval)
+        # Mỗi khóa học chỉ có một lần tính digest tại một thời điểm.
+        self._course_locks: dict[str, threading.Lock] = {}
+        self._course_locks_guard = threading.Lock()
+        course_manager.add_change_listener(self._on_course_changed)
+
+    def _on_course_changed(self, course_id: str):
+        # Khóa học bị xóa (manifest rỗng) thì xóa luôn các bản tóm tắt đã lưu.
+        if not self.course_manager.manifest.load(course_id):
+            self.store.remove(course_id)
+
+    def _call(self, prompt: str, course_id: str | None) -> str:
+        self._limiter.wait()
+        return self.generate(prompt, course_id).strip()
+
+    def _source_texts(self, course_id: str, chunk_ids: list[str]) -> list[str]:
+        """Lấy nội dung các chunk của một nguồn theo đúng thứ tự trong tài liệu."""
+        collection = self.course_manager.client.get_collection(name=course_id)
+        rows = []
+        for i in range(0, len(chunk_ids), 500):
+            result = collection.get(ids=chunk_ids[i:i + 500], include=["documents", "metadatas"])
+            rows.extend(zip(result["metadatas"], result["documents"]))
+        rows.sort(key=lambda row: (row[0] or {}).get("chunk_index", 0))
+        return [document for _, document in rows]
+
+    def reduce_many(self, groups_by_key: dict[str, list[str]], start_level: int = 0,
+                    course_id: str | None = None) -> dict[str, str]:
+        """
+        Chạy map-reduce cho nhiều nhánh cùng lúc, theo từng tầng: mọi nhóm của mọi nhánh
+        ở cùng một tầng được gửi song song, rồi kết quả được gom lại cho tầng kế tiếp.
+        Tầng đầu dùng MAP_PROMPT, các tầng sau dùng REDUCE_PROMPT (`start_level=1` khi
+        đầu vào đã là các bản tóm tắt). `course_id` được chuyển cho mọi lời gọi mô hình.
+        """
+        results, pending, level = {}, {key: groups for key, groups in groups_by_key.items() if groups}, start_level
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending:
+                template = MAP_PROMPT if level == 0 else REDUCE_PROMPT
+                tasks = [(key, text) for key, groups in pending.items() for text in groups]
+                summaries = list(pool.map(lambda task: self._call(template.format(text=task[1]), course_id), tasks))
+                by_key: dict[str, list[str]] = {}
+                for (key, _), summary in zip(tasks, summaries):
+                    by_key.setdefault(key, []).append(summary)
+                pending = {}
+                for key, parts in by_key.items():
+                    if len(parts) == 1:
+                        results[key] = parts[0]
+                        continue
+                    regrouped = group_by_tokens(parts, self.group_tokens)
+                    if len(regrouped) == len(parts):
+                        # Các bản tóm tắt quá dài để gom theo token: ép gộp từng cặp để chắc chắn hội tụ.
+                        regrouped = ["\n\n".join(parts[i:i + 2]) for i in range(0, len(parts), 2)]
+                    pending[key] = regrouped
+                level += 1
+        return results
+
+    def _course_lock(self, course_id: str) -> threading.Lock:
+        with self._course_locks_guard:
+            return self._course_locks.setdefault(course_id, threading.Lock())
+
+    def course_digest(self, course_id: str) -> str | None:
+        """
+        Trả về bản cô đọng của toàn khóa học (ghép bản tóm tắt của các nguồn, reduce thêm
+        nếu quá dài). Chỉ những nguồn mới hoặc đã thay đổi mới phải tóm tắt lại.
+        Trả về None nếu khóa học chưa có nguồn nào trong manifest.
+        """
+        manifest = self.course_manager.manifest.load(course_id)
+        if not manifest:
+            return None
+        with self._course_lock(course_id):
+            data = self.store.load(course_id)
+            cached = {name: entry for name, entry in data["sources"].items()
+                      if name in manifest and entry["hash"] == manifest[name]["hash"]}
+            stale = [name for name in manifest if name not in cached]
+            if stale:
+                groups = {name: group_by_tokens(self._source_texts(course_id, manifest[name]["chunk_ids"]), self.group_tokens)
+                          for name in stale}
+                for name, summary in self.reduce_many(groups, course_id=course_id).items():
+                    cached[name] = {"hash": manifest[name]["hash"], "summary": summary}
+            changed = cached != data["sources"]
+            data["sources"] = cached
+
+            digest_key = hashlib.sha256(json.dumps(sorted((name, entry["hash"]) for name, entry in cached.items())).encode("utf-8")).hexdigest()
+            if not data.get("digest") or data["digest"]["key"] != digest_key:
+                sections = [f"### {name}\n{entry['summary']}" for name, entry in sorted(cached.items())]
+                digest = "\n\n".join(sections)
+                if count_tokens(digest) > self.group_tokens:
+                    # Bước reduce cuối: gộp bản tóm tắt của các nguồn cho tới khi vừa ngân sách token.
+                    digest = self.reduce_many({"course": group_by_tokens(sections, self.group_tokens)}, start_level=1, course_id=course_id).get("course", digest)
+                data["digest"] = {"key": digest_key, "text": digest}
+                changed = True
+            if changed:
+                self.store.save(course_id, data)
+            return data["digest"]["text"] or None
@@ -0,0 +1,142 @@
+# Ghi chú: Bộ dịch văn bản dài theo từng đoạn, có bộ nhớ dịch (translation memory).
+# Trước đây cả văn bản được gửi trong một prompt: tài liệu dài thì vượt giới hạn của mô hình
+# hoặc chờ rất lâu, và cùng một đoạn bài giảng được dịch lại cho mỗi sinh viên.
+# 1. Văn bản được chia thành các đoạn liên tiếp bằng TextChunker (không chồng lấn, cắt ở ranh
+#    giới đoạn/câu), khoảng trắng đầu/cuối mỗi đoạn được giữ nguyên khi ghép lại.
+# 2. Bản dịch của từng đoạn được lưu vào SQLite theo khóa (hash đoạn, ngôn ngữ đích): văn bản
+#    lặp lại hoặc chỉ sửa một phần thì chỉ các đoạn thay đổi mới phải dịch.
+# 3. Các đoạn chưa có bản dịch được dịch song song (các lời gọi vẫn đi qua LLMScheduler nên
+#    tuân thủ giới hạn đồng thời / token mỗi phút), rồi ghép lại đúng thứ tự.
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+from config import (
+    TRANSLATION_MEMORY_PATH, TRANSLATION_MEMORY_MAX_ENTRIES, TRANSLATION_SEGMENT_TOKENS, TRANSLATION_MAX_CONCURRENCY
+)
+from core.chunking import TextChunker
+from core.manifest import content_hash
+from core.metrics import Metrics, get_metrics
+
+TRANSLATION_PROMPT = "Translate the following text to {language}. Respond with only the translated text, no additional explanations:\n\n{text}"
+
+_EDGES = re.compile(r"^(\s*)(.*?)(\s*)$", re.DOTALL)
+
+class TranslationMemory:
+    """
+    Bộ nhớ dịch trên đĩa (SQLite): {(hash đoạn, ngôn ngữ): bản dịch}. Mỗi lần đọc trúng cập nhật
+    `last_used`; khi vượt quá `max_entries`, các bản dịch lâu không dùng nhất bị xóa (LRU).
+    """
+    def __init__(self, path: str = TRANSLATION_MEMORY_PATH, max_entries: int = TRANSLATION_MEMORY_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations (segment_hash TEXT NOT NULL, language TEXT NOT NULL, "
+                "translation TEXT NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (segment_hash, language))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+        return self._conn
+
+    def get_many(self, hashes: list[str], language: str) -> dict[str, str]:
+        """Lấy các bản dịch đã có, trả về {hash đoạn: bản dịch}."""
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(conn.execute(
+                    f"SELECT segment_hash, translation FROM translations WHERE language = ? AND segment_hash IN ({placeholders})",
+                    [language, *batch],
+                ))
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE translations SET last_used = ? WHERE segment_hash = ? AND language = ?",
+                                 [(now, segment_hash, language) for segment_hash in found])
+                conn.commit()
+        return found
+
+    def put_many(self, items: dict[str, str], language: str):
+        """Lưu các bản dịch mới và dọn bớt nếu vượt quá giới hạn."""
+        if not items: return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO translations (segment_hash, language, translation, last_used) VALUES (?, ?, ?, ?)",
+                [(segment_hash, language, translation, now) for segment_hash, translation in items.items()],
+            )
+            count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            if count > self.max_entries:
+                # Xóa dư ra 10% để không phải dọn dẹp ở mỗi lần ghi.
+                excess = count - int(self.max_entries * 0.9)
+                conn.execute("DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY last_used LIMIT ?)", (excess,))
+            conn.commit()
+
+class TranslationEngine:
+    """
+    Dịch văn bản dài theo từng đoạn. `generate(prompt, course_id)` gọi mô hình và trả về văn bản
+    (được AIService cung cấp, đi qua bộ điều phối lời gọi).
+    """
+    def __init__(self, generate: Callable[[str, str | None], str], memory: TranslationMemory | None = None,
+                 segment_tokens: int = TRANSLATION_SEGMENT_TOKENS, max_workers: int = TRANSLATION_MAX_CONCURRENCY,
+                 metrics: Metrics | None = None):
+        self.generate = generate
+        self.memory = memory or TranslationMemory()
+        # Không chồng lấn, để các đoạn ghép lại đúng bằng văn bản gốc.
+        self.chunker = TextChunker(chunk_size=segment_tokens, overlap=0, snap_to_boundaries=True)
+        self.max_workers = max_workers
+        self.metrics = metrics or get_metrics()
+
+    def segments(self, text: str) -> list[str]:
+        """Chia văn bản thành các đoạn liên tiếp, ghép lại ("".join) đúng bằng văn bản gốc."""
+        starts = [start for start, _ in self.chunker.spans(text)] or [0]
+        starts[0] = 0
+        return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+    def _translate_one(self, segment: str, language: str, course_id: str | None) -> str:
+        return self.generate(TRANSLATION_PROMPT.format(language=language, text=segment), course_id).strip()
+
+    def stream(self, text: str, language: str, course_id: str | None = None) -> Iterator[str]:
+        """
+        Dịch `text` sang `language`, trả về bản dịch của từng đoạn theo đúng thứ tự ngay khi
+        đoạn đó (và mọi đoạn trước nó) đã xong. Đoạn trùng nhau chỉ được dịch một lần.
+        """
+        parts = [_EDGES.match(segment).groups() for segment in self.segments(text)]
+        hashes = [content_hash(core) for _, core, _ in parts]
+        known = self.memory.get_many(list({h for h, (_, core, _) in zip(hashes, parts) if core}), language)
+        missing = {h: core for h, (_, core, _) in zip(hashes, parts) if core and h not in known}
+        self.metrics.increment("cache.translation", len(known), course=course_id, result="hit")
+        self.metrics.increment("cache.translation", len(missing), course=course_id, result="miss")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {h: pool.submit(self._translate_one, core, language, course_id) for h, core in missing.items()}
+            try:
+                for h, (leading, core, trailing) in zip(hashes, parts):
+                    if not core:
+                        yield leading + trailing
+                        continue
+                    if h not in known:
+                        known[h] = futures[h].result()
+                        # Lưu ngay từng đoạn, để bản dịch đã xong không mất nếu một đoạn sau bị lỗi.
+                        self.memory.put_many({h: known[h]}, language)
+                    yield leading + known[h] + trailing
+            finally:
+                for future in futures.values():
+                    future.cancel()
+
+    def translate(self, text: str, language: str, course_id: str | None = None) -> str:
+        """Dịch toàn bộ `text` sang `language`."""
+        return "".join(self.stream(text, language, course_id))
@@ -0,0 +1,145 @@
+# Ghi chú: Lấy transcript YouTube có cache và hỗ trợ xử lý theo lô (cả playlist).
+# - Transcript được lưu trên đĩa theo (video ID, ngôn ngữ), nên thêm lại một video
+#   hay cả một loạt bài giảng không phải tải lại từ YouTube.
+# - Nhiều video được tải song song, giới hạn bởi YOUTUBE_MAX_CONCURRENCY.
+# - Các đoạn (segment) giữ lại mốc thời gian để ghi vào metadata của chunk.
+# - Bộ tải transcript (TranscriptFetcher) có thể thay bằng một bản giả lập khi kiểm thử.
+
+import os
+import re
+import json
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, Future
+from urllib.parse import urlparse, parse_qs
+from config import YOUTUBE_TRANSCRIPT_DIR, YOUTUBE_LANGUAGES, YOUTUBE_MAX_CONCURRENCY
+from core.fetcher import get_fetcher
+
+_VIDEO_ID = re.compile(r"^[\w-]{11}$")
+_PLAYLIST_VIDEO_ID = re.compile(r'"videoId":"([\w-]{11})"')
+
+def parse_video_id(url: str) -> str | None:
+    """Lấy video ID từ các dạng URL YouTube (watch?v=, youtu.be/, shorts/, embed/, live/)."""
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or "").lower()
+    if host.endswith("youtu.be"):
+        candidate = parsed.path.lstrip("/").split("/")[0]
+    elif host.endswith("youtube.com"):
+        candidate = parse_qs(parsed.query).get("v", [""])[0]
+        parts = parsed.path.strip("/").split("/")
+        if not candidate and len(parts) >= 2 and parts[0] in ("shorts", "embed", "live"):
+            candidate = parts[1]
+    else:
+        return None
+    return candidate if _VIDEO_ID.match(candidate) else None
+
+def parse_playlist_id(url: str) -> str | None:
+    """Lấy playlist ID (tham số `list=`) từ URL YouTube, nếu có."""
+    parsed = urlparse(url.strip())
+    if not (parsed.hostname or "").lower().endswith(("youtube.com", "youtu.be")):
+        return None
+    return parse_qs(parsed.query).get("list", [None])[0]
+
+class TranscriptFetcher(ABC):
+    """Giao diện tải transcript: trả về (danh sách segment {text, start, duration}, mã ngôn ngữ)."""
+    @abstractmethod
+    def fetch(self, video_id: str, languages: list[str]) -> tuple[list[dict], str]:
+        """Tải transcript của video theo thứ tự ưu tiên ngôn ngữ."""
+
+class YouTubeApiFetcher(TranscriptFetcher):
+    """Tải transcript qua youtube_transcript_api (hỗ trợ cả API cũ lẫn API từ bản 1.0)."""
+    def fetch(self, video_id: str, languages: list[str]) -> tuple[list[dict], str]:
+        from youtube_transcript_api import YouTubeTranscriptApi
+        if hasattr(YouTubeTranscriptApi, "list_transcripts"):
+            transcript = YouTubeTranscriptApi.list_transcripts(video_id).find_transcript(languages)
+        else:
+            transcript = YouTubeTranscriptApi().list(video_id).find_transcript(languages)
+        data = transcript.fetch()
+        segments = data.to_raw_data() if hasattr(data, "to_raw_data") else data
+        return [{"text": s["text"], "start": s["start"], "duration": s.get("duration", 0.0)} for s in segments], transcript.language_code
+
+class TranscriptStore:
+    """Lưu transcript thành file JSON: <thư mục>/<video_id>.<ngôn ngữ>.json."""
+    def __init__(self, root: str = YOUTUBE_TRANSCRIPT_DIR):
+        self.root = root
+
+    def _path(self, video_id: str, language: str) -> str:
+        return os.path.join(self.root, f"{video_id}.{language}.json")
+
+    def get(self, video_id: str, language: str) -> list[dict] | None:
+        try:
+            with open(self._path(video_id, language), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, video_id: str, language: str, segments: list[dict]):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(video_id, language)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(segments, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+class TranscriptService:
+    """
+    Điểm truy cập transcript cho toàn ứng dụng: tra cache trước, chỉ tải từ YouTube khi
+    chưa có. Việc tải được chạy trong một thread pool có giới hạn số luồng đồng thời.
+    """
+    def __init__(self, store: TranscriptStore | None = None, fetcher: TranscriptFetcher | None = None,
+                 max_concurrency: int = YOUTUBE_MAX_CONCURRENCY, languages: list[str] = YOUTUBE_LANGUAGES):
+        self.store = store or TranscriptStore()
+        self.fetcher = fetcher or YouTubeApiFetcher()
+        self.languages = languages
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="pnote-youtube")
+
+    def get(self, video_id: str, languages: list[str] | None = None) -> list[dict]:
+        """Lấy transcript của một video, theo thứ tự ưu tiên ngôn ngữ."""
+        languages = languages or self.languages
+        for language in languages:
+            segments = self.store.get(video_id, language)
+            if segments is not None:
+                return segments
+        segments, language = self.fetcher.fetch(video_id, languages)
+        self.store.put(video_id, language, segments)
+        return segments
+
+    def submit(self, video_id: str, languages: list[str] | None = None) -> Future:
+        """Đưa một video vào hàng đợi tải, trả về Future chứa danh sách segment."""
+        return self._executor.submit(self.get, video_id, languages)
+
+    def get_many(self, video_ids: list[str], languages: list[str] | None = None) -> list[list[dict] | Exception]:
+        """Lấy transcript của nhiều video song song. Video lỗi trả về Exception, theo đúng thứ tự đầu vào."""
+        futures = [self.submit(video_id, languages) for video_id in video_ids]
+        return [future.exception() or future.result() for future in futures]
+
+def playlist_video_ids(playlist_id: str) -> list[str]:
+    """Lấy danh sách video ID của một playlist công khai (từ trang playlist, theo thứ tự)."""
+    result = get_fetcher().fetch(f"https://www.youtube.com/playlist?list={playlist_id}")
+    html = result.content.decode("utf-8", errors="ignore")
+    return list(dict.fromkeys(_PLAYLIST_VIDEO_ID.findall(html)))
+
+def expand_playlist_urls(urls: list[str]) -> list[str]:
+    """Thay mỗi URL playlist (không kèm video cụ thể) bằng URL của từng video trong playlist."""
+    expanded = []
+    for url in urls:
+        playlist_id = parse_playlist_id(url)
+        if playlist_id and not parse_video_id(url):
+            expanded.extend(f"https://www.youtube.com/watch?v={video_id}" for video_id in playlist_video_ids(playlist_id))
+        else:
+            expanded.append(url)
+    return list(dict.fromkeys(expanded))
+
+def segments_to_pages(segments: list[dict]) -> list[tuple[str, dict]]:
+    """Chuyển các segment transcript thành "trang" cho chunker, giữ mốc thời gian (giây) làm metadata."""
+    return [(s["text"], {"start": round(float(s["start"]), 1)}) for s in segments if s["text"].strip()]
+
+_default_service: TranscriptService | None = None
+_default_service_lock = threading.Lock()
+
+def get_transcript_service() -> TranscriptService:
+    """TranscriptService dùng chung cho toàn process."""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = TranscriptService()
+        return _default_service
@@ -0,0 +1,91 @@
+import streamlit as st
+from core.metrics import get_metrics
+from utils.resources import get_ai_service, get_course_manager
+
+# ==============================================================================
+# TRANG HIỆU NĂNG (quản trị)
+# Ghi chú: Hiển thị số liệu đo đạc của process (core/metrics.py): độ trễ từng bước theo
+# khóa học / công cụ, số token, số chunk, tỉ lệ trúng cache và số lỗi, cùng thống kê của
+# bộ điều phối mô hình. Số liệu chỉ nằm trong bộ nhớ; có thể xuất ra file để phân tích sau.
+# ==============================================================================
+
+st.set_page_config(page_title="PNote - Hiệu năng", page_icon="📈", layout="wide")
+
+with open("styles.css") as f:
+    st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+
+metrics = get_metrics()
+course_names = {course.id: course.name for course in get_course_manager().catalog.list_courses()}
+
+def _labels(labels: dict) -> dict:
+    """Đổi ID khóa học thành tên hiển thị cho dễ đọc."""
+    if "course" in labels:
+        labels = {**labels, "course": course_names.get(labels["course"], labels["course"])}
+    return labels
+
+st.title("📈 Hiệu Năng", anchor=False)
+
+# --- Điều khiển ---
+col_toggle, col_export, col_reset, col_back = st.columns(4)
+with col_toggle:
+    metrics.enabled = st.toggle("Ghi số liệu", value=metrics.enabled,
+                                help="Tắt để bỏ qua hoàn toàn việc đo đạc (chỉ áp dụng cho process hiện tại).")
+with col_export:
+    if st.button("💾 Xuất ra file", use_container_width=True):
+        st.toast(f"Đã ghi snapshot vào {metrics.export()}", icon="✅")
+with col_reset:
+    if st.button("🗑️ Xóa số liệu", use_container_width=True):
+        metrics.reset()
+        st.rerun()
+with col_back:
+    if st.button("Trở về Dashboard", use_container_width=True):
+        st.switch_page("app.py")
+
+snapshot = metrics.snapshot()
+counters = snapshot["counters"]
+st.caption(f"Số liệu trong {snapshot['uptime_seconds'] / 60:.0f} phút gần nhất (từ lúc khởi động hoặc lần xóa gần nhất).")
+
+# --- Tỉ lệ trúng cache ---
+st.subheader("Cache", anchor=False, divider="gray")
+cache_cols = st.columns(2)
+for col, (name, label) in zip(cache_cols, (("cache.answer", "Câu trả lời chat"), ("cache.artifact", "Kết quả công cụ"))):
+    hits = sum(c["value"] for c in counters if c["name"] == name and c["labels"].get("result", "").startswith("hit"))
+    total = sum(c["value"] for c in counters if c["name"] == name)
+    col.metric(label, f"{hits / total:.0%}" if total else "—", help=f"{hits:.0f} / {total:.0f} lượt trúng cache")
+
+# --- Độ trễ ---
+st.subheader("Độ trễ (ms)", anchor=False, divider="gray")
+if snapshot["latencies"]:
+    st.dataframe([{
+        "Bước": m["name"], **_labels(m["labels"]), "Số lần": m["count"], "Trung bình": round(m["mean_ms"], 1),
+        "p50": m["p50_ms"], "p95": m["p95_ms"], "p99": m["p99_ms"], "Lớn nhất": round(m["max_ms"], 1),
+    } for m in snapshot["latencies"]], use_container_width=True, hide_index=True)
+else:
+    st.info("Chưa có số liệu độ trễ.")
+
+# --- Bộ đếm: token, chunk, cache, lỗi ---
+st.subheader("Bộ đếm", anchor=False, divider="gray")
+errors = [c for c in counters if c["name"] == "errors"]
+if errors:
+    st.warning(f"Có {sum(c['value'] for c in errors):.0f} lỗi được ghi nhận.")
+if counters:
+    st.dataframe([{"Số liệu": c["name"], **_labels(c["labels"]), "Giá trị": c["value"]} for c in counters],
+                 use_container_width=True, hide_index=True)
+else:
+    st.info("Chưa có số liệu.")
+
+# --- Mô hình ---
+st.subheader("Mô hình", anchor=False, divider="gray")
+ai_service = get_ai_service()
+scheduler_col, usage_col = st.columns([1, 2])
+with scheduler_col:
+    st.caption("Bộ điều phối lời gọi")
+    st.dataframe([{"Số liệu": key, "Giá trị": value} for key, value in ai_service.scheduler.stats.items()],
+                 use_container_width=True, hide_index=True)
+with usage_col:
+    st.caption("Token theo tác vụ")
+    usage = ai_service.usage.summary()
+    if usage:
+        st.dataframe([{"Tác vụ": task, **stats} for task, stats in usage.items()], use_container_width=True, hide_index=True)
+    else:
+        st.info("Chưa có lời gọi mô hình nào.")
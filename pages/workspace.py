@@ -1,7 +1,8 @@
 import streamlit as st
-from config import GEMINI_API_KEY
+from config import GEMINI_API_KEY, CHAT_HISTORY_PAGE_SIZE
 from ui.sidebar import display_sidebar
-from core.services import ai_service, course_manager_service
+from utils.resources import get_ai_service, get_course_manager, get_conversation_store
+from utils.state import get_session_id
 
 # ==============================================================================
 # TRANG WORKSPACE
@@ -25,7 +26,7 @@ with open("styles.css") as f:
 # Khởi tạo state toàn cục một cách an toàn.
 # Điều này đảm bảo app không bị lỗi khi người dùng refresh trang workspace.
 if "courses" not in st.session_state:
-    st.session_state.courses = course_manager_service.list_courses()
+    st.session_state.courses = get_course_manager().list_courses()
 if "current_course_id" not in st.session_state:
     st.session_state.current_course_id = None
 if "current_course_name" not in st.session_state:
@@ -46,12 +47,18 @@ display_sidebar()
 course_id = st.session_state.current_course_id
 course_name = st.session_state.current_course_name
 
-# Khởi tạo các state dành riêng cho workspace này nếu chưa có.
-# Dùng key động để mỗi khóa học có một lịch sử chat và ghi chú riêng.
-if f"messages_{course_id}" not in st.session_state:
-    st.session_state[f"messages_{course_id}"] = [{"role": "assistant", "content": f"Xin chào! Bắt đầu cuộc trò chuyện về **{course_name}**."}]
-if f"notes_{course_id}" not in st.session_state:
-    st.session_state[f"notes_{course_id}"] = f"# Ghi chú cho {course_name}\n\n"
+# Lịch sử chat và ghi chú được lưu bền vững (core/conversations.py), không mất khi tải lại trang,
+# và thuộc riêng phiên làm việc này. Session state chỉ giữ số tin nhắn đang hiển thị của mỗi khóa học.
+conversations = get_conversation_store()
+session_id = get_session_id()
+window_key = f"chat_window_{course_id}"
+if window_key not in st.session_state:
+    st.session_state[window_key] = CHAT_HISTORY_PAGE_SIZE
+
+def _save_notes():
+    """Tự động lưu ghi chú khi có thay đổi (việc ghi xuống đĩa được trì hoãn và gộp lại)."""
+    conversations.save_notes(course_id, session_id, st.session_state[f"notes_input_{course_id}"])
+    st.toast("Đã lưu ghi chú!", icon="✅")
 
 # Cấu trúc 2 cột chính: Chat và Ghi chú.
 chat_col, note_col = st.columns([3, 2])
@@ -61,35 +68,44 @@ with chat_col:
     # Khung chứa tin nhắn, đặt chiều cao cố định để có thanh cuộn.
     chat_container = st.container(height=600, border=False)
     with chat_container:
-        for message in st.session_state[f"messages_{course_id}"]:
+        # Chỉ vẽ phần cuối của cuộc trò chuyện; tin nhắn cũ hơn được tải thêm khi người dùng yêu cầu.
+        messages = conversations.recent_messages(course_id, session_id, limit=st.session_state[window_key])
+        if messages and conversations.count_messages(course_id, session_id) > len(messages):
+            if st.button("⬆️ Xem tin nhắn cũ hơn", use_container_width=True, key=f"older_messages_{course_id}"):
+                st.session_state[window_key] += CHAT_HISTORY_PAGE_SIZE
+                st.rerun()
+        if not messages:
+            with st.chat_message("assistant"):
+                st.markdown(f"Xin chào! Bắt đầu cuộc trò chuyện về **{course_name}**.")
+        for message in messages:
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
     
     # Khung nhập liệu nằm bên dưới.
     if prompt := st.chat_input("Hỏi PNote điều gì đó..."):
-        # Thêm tin nhắn của người dùng vào state và hiển thị ngay lập tức.
-        st.session_state[f"messages_{course_id}"].append({"role": "user", "content": prompt})
+        # Lưu tin nhắn của người dùng và hiển thị ngay lập tức.
+        conversations.append_message(course_id, session_id, "user", prompt)
         with chat_container:
             with st.chat_message("user"): st.markdown(prompt)
         
         # Xử lý và nhận câu trả lời từ bot.
         with chat_container:
             with st.chat_message("assistant"):
-                with st.spinner("PNote đang suy nghĩ..."):
-                    response = ai_service.get_chat_answer(course_id, prompt)
-                    st.markdown(response)
-        # Lưu câu trả lời của bot vào state.
-        st.session_state[f"messages_{course_id}"].append({"role": "assistant", "content": response})
+                # Hiển thị câu trả lời dần dần ngay khi mô hình sinh ra từng phần.
+                # Bộ nhớ hội thoại (hiểu câu hỏi nối tiếp) là riêng của phiên này trong khóa học này.
+                response = st.write_stream(get_ai_service().stream_chat_answer(
+                    course_id, prompt, conversation_id=f"{session_id}/{course_id}"))
+        # Lưu câu trả lời của bot.
+        conversations.append_message(course_id, session_id, "assistant", response)
 
 with note_col:
     st.header("🗒️ Ghi Chú Cá Nhân", anchor=False, divider="gray")
-    note_content = st.text_area(
+    notes = conversations.get_notes(course_id, session_id)
+    st.text_area(
         "Ghi chú cá nhân của bạn...",
-        value=st.session_state[f"notes_{course_id}"],
+        value=notes if notes is not None else f"# Ghi chú cho {course_name}\n\n",
         height=650, 
-        label_visibility="collapsed"
+        label_visibility="collapsed",
+        key=f"notes_input_{course_id}",
+        on_change=_save_notes,
     )
-    # Tự động lưu ghi chú khi có thay đổi.
-    if note_content != st.session_state[f"notes_{course_id}"]:
-        st.session_state[f"notes_{course_id}"].append(note_content)
-        st.toast("Đã lưu ghi chú!", icon="✅")
@@ -1,6 +1,42 @@
 import streamlit as st
 import time
-from core.services import course_manager_service, document_processor_service, ai_service, slugify
+from utils.resources import get_course_manager, get_ai_service, get_ingestion_service, get_conversation_store
+from core.youtube import expand_playlist_urls
+
+# Nhãn hiển thị cho trạng thái của từng nguồn trong job xử lý nền.
+SOURCE_STATUS_LABELS = {
+    "pending": "🕓 Đang chờ",
+    "extracting": "📖 Đang trích xuất",
+    "indexing": "🧩 Đang lưu vào khóa học",
+    "done": "✅ Hoàn tất",
+    "failed": "❌ Lỗi",
+}
+
+def _display_ingestion_jobs(course_id: str):
+    """
+    Hiển thị tiến độ các job xử lý tài liệu của khóa học. Khi còn job đang chạy,
+    phần này được vẽ trong một fragment tự làm mới mỗi 2 giây mà không rerun cả trang.
+    """
+    def render():
+        jobs = get_ingestion_service().jobs_for_course(course_id)
+        if run_every and not get_ingestion_service().has_active_jobs(course_id):
+            # Vừa xử lý xong: rerun cả trang để ngừng tự làm mới.
+            st.rerun()
+        for job in jobs:
+            done_count = sum(s.status in ("done", "failed") for s in job.sources)
+            st.progress(job.progress, text=f"Job {job.job_id}: {done_count}/{len(job.sources)} nguồn")
+            for source in job.sources:
+                detail = f" — {source.chunks} đoạn" if source.status == "done" else ""
+                st.caption(f"{SOURCE_STATUS_LABELS.get(source.status, source.status)}: {source.label}{detail}")
+                if source.error:
+                    st.caption(f"↳ {source.error}")
+        if jobs and all(j.done for j in jobs):
+            if st.button("Ẩn các job đã xong", use_container_width=True, key="clear_ingestion_jobs"):
+                get_ingestion_service().clear_finished(course_id)
+                st.rerun()
+
+    run_every = 2 if get_ingestion_service().has_active_jobs(course_id) else None
+    st.fragment(render, run_every=run_every)()
 
 def display_sidebar():
     """Vẽ sidebar chứa các công cụ AI và quản lý tài liệu cho Workspace."""
@@ -21,28 +57,31 @@ def display_sidebar():
         # --- Thêm tài liệu ---
         with st.expander("➕ Thêm tài liệu vào khóa học", expanded=True):
             uploaded_files = st.file_uploader("1. Tải file (PDF, DOCX)", type=["pdf", "docx"], accept_multiple_files=True)
-            url_input = st.text_input("2. Nhập URL (bài báo, YouTube)", placeholder="https://...")
+            url_input = st.text_area("2. Nhập URL (bài báo, video/playlist YouTube) — mỗi dòng một URL", placeholder="https://...", height=80)
             pasted_text = st.text_area("3. Dán văn bản vào đây", placeholder="Dán nội dung từ clipboard...")
             
             if st.button("Xử lý và Thêm", use_container_width=True):
-                with st.spinner("⏳ Đang xử lý tài liệu..."):
-                    processed_count = 0
-                    sources = []
-                    if uploaded_files: sources.extend([('pdf' if f.name.endswith('.pdf') else 'docx', f) for f in uploaded_files])
-                    if url_input: sources.append(('url', url_input))
-                    if pasted_text: sources.append(('text', pasted_text))
-                    
-                    if not sources:
-                        st.warning("Không có tài liệu nào được cung cấp để xử lý.")
-                    else:
-                        for source_type, source_data in sources:
-                            text, source_name = document_processor_service.extract_text(source_type, source_data)
-                            if text:
-                                course_manager_service.add_document(st.session_state.current_course_id, text, source_name)
-                                processed_count += 1
-                        st.success(f"Hoàn tất! Đã xử lý {processed_count} nguồn tài liệu.")
-                        st.info("Hệ thống đã sẵn sàng để chat.")
-                        time.sleep(1)
+                sources = []
+                # File được đọc thành bytes để có thể gửi sang process xử lý nền.
+                if uploaded_files: sources.extend([('pdf' if f.name.endswith('.pdf') else 'docx', f.name, f.getvalue()) for f in uploaded_files])
+                # Mỗi URL là một nguồn riêng, được tải song song trong các worker xử lý nền.
+                urls = list(dict.fromkeys(line.strip() for line in url_input.splitlines() if line.strip()))
+                if urls:
+                    try:
+                        # URL playlist YouTube được thay bằng từng video trong playlist.
+                        urls = expand_playlist_urls(urls)
+                    except Exception as e:
+                        st.error(f"Không thể đọc danh sách video của playlist: {e}")
+                sources.extend(('url', url, url) for url in urls)
+                if pasted_text: sources.append(('text', "Văn bản dán", pasted_text))
+
+                if not sources:
+                    st.warning("Không có tài liệu nào được cung cấp để xử lý.")
+                else:
+                    get_ingestion_service().submit(st.session_state.current_course_id, sources)
+                    st.toast(f"Đã đưa {len(sources)} nguồn tài liệu vào hàng đợi xử lý.", icon="⏳")
+
+            _display_ingestion_jobs(st.session_state.current_course_id)
 
         # --- Công cụ AI ---
         st.markdown("---")
@@ -51,38 +90,85 @@ def display_sidebar():
         # Công cụ tóm tắt
         with st.expander("📄 Tóm tắt Khóa học"):
             if st.button("Tạo Tóm Tắt", use_container_width=True, key="summarize_btn"):
-                with st.spinner("AI đang đọc và tóm tắt toàn bộ tài liệu..."):
-                    summary = ai_service.summarize_course(st.session_state.current_course_id)
-                    st.session_state[f"summary_{st.session_state.current_course_id}"] = summary
+                # Hiển thị bản tóm tắt trong lúc đang sinh, sau đó thay bằng ô kết quả bên dưới.
+                stream_placeholder = st.empty()
+                with stream_placeholder.container():
+                    summary = st.write_stream(get_ai_service().stream_summary(st.session_state.current_course_id))
+                stream_placeholder.empty()
+                st.session_state[f"summary_{st.session_state.current_course_id}"] = summary
             
+            # Kết quả đã lưu cho nội dung hiện tại của khóa học (từ bất kỳ phiên nào) được hiển thị ngay.
             summary_key = f"summary_{st.session_state.current_course_id}"
-            if summary_key in st.session_state:
-                st.text_area("Bản tóm tắt:", value=st.session_state[summary_key], height=200, key=f"summary_output_{st.session_state.current_course_id}")
+            summary = get_ai_service().cached_artifact(st.session_state.current_course_id, "summary") or st.session_state.get(summary_key)
+            if summary:
+                st.text_area("Bản tóm tắt:", value=summary, height=200, key=f"summary_output_{st.session_state.current_course_id}")
 
         # Công cụ tạo Quiz
         with st.expander("❓ Tạo Câu Hỏi Ôn Tập"):
             num_questions = st.slider("Số lượng câu hỏi:", 3, 10, 5, key="quiz_slider")
+            # Câu hỏi được lấy ngay từ ngân hàng câu hỏi tạo sẵn của khóa học (có thể lọc theo nguồn / chủ đề).
+            bank_counts = get_ai_service().question_bank.count(st.session_state.current_course_id)
+            quiz_sources = st.multiselect("Chỉ lấy câu hỏi từ:", sorted(bank_counts), key="quiz_sources",
+                                          placeholder="Tất cả tài liệu")
+            quiz_topic = st.text_input("Chủ đề (tùy chọn):", key="quiz_topic")
+            if get_ai_service().question_bank.is_building(st.session_state.current_course_id):
+                st.caption(f"Ngân hàng câu hỏi đang được cập nhật ({sum(bank_counts.values())} câu hỏi).")
+            elif bank_counts:
+                st.caption(f"Ngân hàng câu hỏi: {sum(bank_counts.values())} câu hỏi.")
             if st.button("Bắt đầu Tạo Quiz", use_container_width=True, key="quiz_btn"):
-                 with st.spinner("AI đang soạn câu hỏi cho bạn..."):
-                    quiz = ai_service.generate_quiz(st.session_state.current_course_id, num_questions)
-                    st.session_state[f"quiz_{st.session_state.current_course_id}"] = quiz
+                # Quiz cần JSON hoàn chỉnh: hiển thị tiến độ dạng thô, ghép lại rồi mới phân tích.
+                stream_placeholder = st.empty()
+                with stream_placeholder.container():
+                    with st.status("AI đang soạn câu hỏi cho bạn...") as status:
+                        raw_quiz = st.write_stream(get_ai_service().stream_quiz(
+                            st.session_state.current_course_id, num_questions, quiz_sources, quiz_topic.strip() or None))
+                        status.update(state="complete")
+                stream_placeholder.empty()
+                quiz = get_ai_service().parse_quiz(raw_quiz)
+                st.session_state[f"quiz_{st.session_state.current_course_id}"] = quiz
+                if isinstance(quiz, str):
+                    st.warning(quiz)
             
             quiz_key = f"quiz_{st.session_state.current_course_id}"
-            if quiz_key in st.session_state and isinstance(st.session_state[quiz_key], list):
-                for i, q in enumerate(st.session_state[quiz_key]):
+            # Mỗi lần tạo là một bộ câu hỏi mới, nên ưu tiên bộ vừa tạo trong phiên này.
+            quiz = st.session_state.get(quiz_key)
+            if quiz is None:
+                cached_quiz = get_ai_service().cached_artifact(st.session_state.current_course_id, "quiz", num_questions=num_questions)
+                quiz = get_ai_service().parse_quiz(cached_quiz) if cached_quiz else None
+            if isinstance(quiz, list):
+                for i, q in enumerate(quiz):
                     st.write(f"**Câu {i+1}:** {q['question']}")
                     st.radio("Chọn đáp án:", options=q['options'], key=f"q_{st.session_state.current_course_id}_{i}")
 
         # Công cụ trích xuất từ khóa
         with st.expander("🔑 Trích Xuất Từ Khóa"):
             if st.button("Tìm Từ Khóa Chính", use_container_width=True, key="keyword_btn"):
-                with st.spinner("AI đang phân tích các khái niệm..."):
-                    keywords = ai_service.extract_keywords(st.session_state.current_course_id)
-                    st.session_state[f"keywords_{st.session_state.current_course_id}"] = keywords
+                stream_placeholder = st.empty()
+                with stream_placeholder.container():
+                    raw_keywords = st.write_stream(get_ai_service().stream_keywords(st.session_state.current_course_id))
+                stream_placeholder.empty()
+                st.session_state[f"keywords_{st.session_state.current_course_id}"] = get_ai_service().parse_keywords(raw_keywords)
             
             keyword_key = f"keywords_{st.session_state.current_course_id}"
-            if keyword_key in st.session_state and st.session_state[keyword_key]:
-                st.info(", ".join(st.session_state[keyword_key]))
+            cached_keywords = get_ai_service().cached_artifact(st.session_state.current_course_id, "keywords", num_keywords=10)
+            keywords = get_ai_service().parse_keywords(cached_keywords) if cached_keywords else st.session_state.get(keyword_key)
+            if keywords:
+                st.info(", ".join(keywords))
+
+        # Công cụ dịch thuật
+        with st.expander("🌐 Dịch Văn Bản"):
+            text_to_translate = st.text_area("Văn bản cần dịch:", key="translate_input", height=120)
+            target_language = st.selectbox("Dịch sang:", ["Tiếng Việt", "English", "日本語", "한국어", "Français", "中文"], key="translate_language")
+            if st.button("Dịch", use_container_width=True, key="translate_btn"):
+                stream_placeholder = st.empty()
+                with stream_placeholder.container():
+                    translation = st.write_stream(get_ai_service().stream_translation(text_to_translate, target_language, st.session_state.current_course_id))
+                stream_placeholder.empty()
+                st.session_state[f"translation_{st.session_state.current_course_id}"] = translation
+
+            translation_key = f"translation_{st.session_state.current_course_id}"
+            if st.session_state.get(translation_key):
+                st.text_area("Bản dịch:", value=st.session_state[translation_key], height=200, key=f"translation_output_{st.session_state.current_course_id}")
 
         # --- Tùy chọn Nâng cao và Điều hướng ---
         st.markdown("<hr style='margin: 1rem 0;'>", unsafe_allow_html=True)
@@ -92,8 +178,9 @@ def display_sidebar():
                 course_to_delete_id = st.session_state.current_course_id
                 course_to_delete_name = st.session_state.current_course_name
                 with st.spinner(f"Đang xóa khóa học '{course_to_delete_name}'..."):
-                    success, message = course_manager_service.delete_course(course_to_delete_id)
+                    success, message = get_course_manager().delete_course(course_to_delete_id)
                     if success:
+                        get_conversation_store().remove_course(course_to_delete_id)
                         st.session_state.courses = [c for c in st.session_state.courses if c['id'] != course_to_delete_id]
                         st.success(message)
                         time.sleep(1); st.switch_page("app.py")
@@ -0,0 +1,21 @@
+# Ghi chú: Truy cập các dịch vụ của core/services.py từ giao diện Streamlit.
+# Mỗi dịch vụ chỉ được tạo khi một trang thực sự cần đến nó, và được dùng chung cho mọi
+# phiên/người dùng trong process nhờ st.cache_resource (kể cả khi Streamlit nạp lại module).
+import streamlit as st
+from core import services
+
+@st.cache_resource(show_spinner=False)
+def get_course_manager() -> services.CourseManager:
+    return services.get_course_manager()
+
+@st.cache_resource(show_spinner=False)
+def get_ai_service() -> services.AIService:
+    return services.get_ai_service()
+
+@st.cache_resource(show_spinner=False)
+def get_ingestion_service() -> services.IngestionManager:
+    return services.get_ingestion_service()
+
+@st.cache_resource(show_spinner=False)
+def get_conversation_store() -> services.ConversationStore:
+    return services.get_conversation_store()
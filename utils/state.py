@@ -1,11 +1,12 @@
 # Ghi chú: Quản lý trạng thái của ứng dụng một cách tập trung.
+import uuid
 import streamlit as st
-from core.services import course_manager_service
+from utils.resources import get_course_manager
 
 def initialize_session_state():
     """Khởi tạo tất cả các biến cần thiết trong st.session_state."""
     if "courses" not in st.session_state:
-        st.session_state.courses = course_manager_service.list_courses()
+        st.session_state.courses = get_course_manager().list_courses()
     
     if "current_course" not in st.session_state:
         st.session_state.current_course = st.session_state.courses[0] if st.session_state.courses else None
@@ -14,4 +15,14 @@ def initialize_session_state():
         st.session_state.messages = {}
         
     if "notes" not in st.session_state:
-        st.session_state.notes = {} 
\ No newline at end of file
+        st.session_state.notes = {} 
+
+def get_session_id() -> str:
+    """
+    ID của phiên làm việc hiện tại, dùng để tách lịch sử chat, ghi chú và bộ nhớ hội thoại giữa các
+    phiên/người dùng. ID được giữ trong URL (?session=...) nên không mất khi tải lại trang.
+    """
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+    return st.session_state.session_id